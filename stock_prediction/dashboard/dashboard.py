@@ -22,6 +22,9 @@ server = app.server
 
 DEFAULT_SYMBOLS = ["SPY", "QQQ"]
 
+# Suffixes of the columns of the prediction intervals of each symbol
+INTERVAL_SUFFIXES = ("_lower", "_upper")
+
 
 # Load initial data
 def fetch_predictions_from_s3():
@@ -68,9 +71,16 @@ colors_list_faint = [
 GIT_REPO = "https://github.com/marcoopsampaio/aws_ml_eng_project_stock_prediction"
 
 
-list_dict_symbols = [
-    {"value": symbol, "label": symbol} for symbol in df_results.columns
-]
+def get_symbol_options(df):
+    # The other columns are the flag of the predicted rows and the intervals
+    return [
+        {"value": symbol, "label": symbol}
+        for symbol in df.columns
+        if symbol != "is_predicted" and not symbol.endswith(INTERVAL_SUFFIXES)
+    ]
+
+
+list_dict_symbols = get_symbol_options(df_results)
 
 
 app.layout = html.Div(
@@ -161,9 +171,7 @@ app.layout = html.Div(
 def refresh_data(n_intervals):
     global df_results, list_dict_symbols
     df_results = fetch_predictions_from_s3()
-    list_dict_symbols = [
-        {"value": symbol, "label": symbol} for symbol in df_results.columns
-    ]
+    list_dict_symbols = get_symbol_options(df_results)
     return list_dict_symbols
 
 
@@ -246,6 +254,22 @@ def timeline_symbols_filtered_by_keys(results_filtered, n_xzoom=None):
             line=dict(color=color_faint, width=2, dash="dash"),
         )
         trace_list.append(trace1)
+        # Plot the prediction interval, if any
+        if f"{symbol}_lower" in df_results.columns:
+            for suffix, fill in zip(INTERVAL_SUFFIXES, ["none", "tonexty"]):
+                trace_list.append(
+                    go.Scatter(
+                        x=x_vals2,
+                        y=df_results[f"{symbol}{suffix}"].values[-20:],
+                        mode="lines",
+                        name="Interval",
+                        showlegend=False,
+                        fill=fill,
+                        fillcolor=color_faint,
+                        opacity=0.3,
+                        line=dict(width=0),
+                    )
+                )
         # Plot history
         if n_xzoom:
             x_vals = results_filtered[symbol].index.values[-n_xzoom:-20]
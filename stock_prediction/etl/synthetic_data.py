@@ -0,0 +1,279 @@
+"""
+Generator of synthetic panels of daily returns, to run the pipeline offline and at
+any scale.
+
+The returns follow a factor model: every symbol loads on a market factor and on
+one sector factor, plus an idiosyncratic return. The factor and idiosyncratic
+returns have Student-t innovations (fat tails) scaled by GARCH(1, 1) volatilities
+(volatility clustering). The leveraged ETFs of LEVERAGED_ETFS whose underlying is
+also generated are daily rebalanced multiples of it, net of fees. Some symbols
+start later than the others, with missing returns before their start, as in the
+extracted data.
+
+The symbols are those of the symbols csv (e.g. top_etfs.csv) first, followed by
+generated names if more symbols are requested. The panels are written in the
+format of the extracted data csv, which load_cleaned_dataset reads.
+"""
+import argparse
+from pathlib import Path
+from typing import Optional, Sequence
+
+import numpy as np
+import pandas as pd
+
+from stock_prediction.commons import (
+    DEFAULT_DATA_EXTRACTION_OUTPUT_PATH,
+    DEFAULT_SYMBOLS_CSV_PATH,
+)
+from stock_prediction.helpers.logging.log_config import get_logger
+
+logger = get_logger()
+
+# Underlying symbol and daily leverage of the leveraged ETFs of the top ETFs. The
+# 3x ETFs of indices with only a 2x ETF in the list are 1.5x that ETF
+LEVERAGED_ETFS = {
+    "TQQQ": ("QQQ", 3.0),
+    "QLD": ("QQQ", 2.0),
+    "UPRO": ("SPY", 3.0),
+    "SSO": ("SPY", 2.0),
+    "SOXL": ("SMH", 3.0),
+    "USD": ("SMH", 2.0),
+    "TECL": ("IGM", 3.0),
+    "ROM": ("IGM", 2.0),
+    "CURE": ("IHI", 3.0),
+    "RXL": ("IHI", 2.0),
+    "BIB": ("IBB", 2.0),
+    "UMDD": ("MVV", 1.5),
+    "MIDU": ("MVV", 1.5),
+    "URTY": ("UWM", 1.5),
+    "TNA": ("UWM", 1.5),
+}
+
+# Annual expense ratio of the leveraged ETFs
+LEVERAGED_ETF_FEE = 0.0095
+
+N_DAYS_PER_YEAR = 252
+
+
+def get_synthetic_symbols(
+    n_symbols: int, symbols_csv_path: Optional[Path] = DEFAULT_SYMBOLS_CSV_PATH
+) -> list[str]:
+    """
+    Gets the symbols of a synthetic panel.
+
+    Parameters
+    ----------
+    n_symbols : int
+        The number of symbols.
+    symbols_csv_path : Path, optional
+        The csv with the real symbols in its fund_symbol column, which are used
+        first. If None, all the symbols are generated names.
+
+    Returns
+    -------
+    list[str]
+        The real symbols followed by the names SYN00000, SYN00001, ...
+    """
+    symbols = []
+    if symbols_csv_path is not None:
+        symbols = list(pd.read_csv(symbols_csv_path)["fund_symbol"])[:n_symbols]
+
+    return symbols + [f"SYN{i:05d}" for i in range(n_symbols - len(symbols))]
+
+
+def simulate_garch(
+    rng: np.random.Generator,
+    n_days: int,
+    volatilities: np.ndarray,
+    tail_dof: float = 4.0,
+    alpha: float = 0.08,
+    beta: float = 0.9,
+) -> np.ndarray:
+    """
+    Simulates independent GARCH(1, 1) series with standardized Student-t
+    innovations.
+
+    Parameters
+    ----------
+    rng : np.random.Generator
+        The random generator.
+    n_days : int
+        The number of days.
+    volatilities : np.ndarray
+        The unconditional daily volatility of each series, of shape (n_series,).
+    tail_dof : float, optional
+        The degrees of freedom of the innovations, lower means fatter tails. Must
+        be greater than 2. Default is 4.
+    alpha, beta : float, optional
+        The GARCH coefficients of the last squared return and of the last
+        variance. Their sum, below 1, sets the persistence of the volatility.
+        Default is 0.08 and 0.9.
+
+    Returns
+    -------
+    np.ndarray
+        The returns of shape (n_days, n_series).
+    """
+    innovations = rng.standard_t(tail_dof, size=(n_days, len(volatilities)))
+    innovations *= np.sqrt((tail_dof - 2) / tail_dof)
+
+    variances = volatilities**2
+    omega = variances * (1 - alpha - beta)
+
+    # The recursion runs over the days, vectorized over the series
+    returns = np.empty_like(innovations)
+    variance = variances.copy()
+    for t in range(n_days):
+        returns[t] = np.sqrt(variance) * innovations[t]
+        variance = omega + alpha * returns[t] ** 2 + beta * variance
+
+    return returns
+
+
+def generate_synthetic_returns(
+    n_symbols: int = 100,
+    n_days: int = 10 * N_DAYS_PER_YEAR,
+    n_sectors: int = 10,
+    start_date: str = "2005-01-03",
+    late_start_fraction: float = 0.3,
+    max_late_start_fraction: float = 0.1,
+    tail_dof: float = 4.0,
+    symbols: Optional[Sequence[str]] = None,
+    seed: int = 0,
+) -> pd.DataFrame:
+    """
+    Generates a synthetic panel of daily returns.
+
+    Parameters
+    ----------
+    n_symbols : int, optional
+        The number of symbols. Default is 100.
+    n_days : int, optional
+        The number of business days. Default is 10 years.
+    n_sectors : int, optional
+        The number of sector factors. Default is 10.
+    start_date : str, optional
+        The first date. Default is "2005-01-03".
+    late_start_fraction : float, optional
+        The fraction of symbols starting after the first day. Default is 0.3.
+    max_late_start_fraction : float, optional
+        The late symbols start at a uniformly random day of this fraction of the
+        first days. Default is 0.1, so that the cleaned dataset, which starts when
+        all the symbols have started, keeps at least 90% of the days.
+    tail_dof : float, optional
+        The degrees of freedom of the Student-t innovations. Default is 4.
+    symbols : Sequence[str], optional
+        The symbols. Default is get_synthetic_symbols(n_symbols).
+    seed : int, optional
+        The random seed. Default is 0.
+
+    Returns
+    -------
+    pd.DataFrame
+        The returns, indexed by business days in a Date index, with one column per
+        symbol and missing values before the start of each symbol.
+    """
+    rng = np.random.default_rng(seed)
+    symbols = list(symbols) if symbols is not None else get_synthetic_symbols(n_symbols)
+    n_symbols = len(symbols)
+
+    # Market and sector factors, and the loadings of each symbol on them
+    factors = simulate_garch(
+        rng, n_days, np.r_[0.011, np.full(n_sectors, 0.006)], tail_dof=tail_dof
+    )
+    market_betas = rng.normal(1.0, 0.25, size=n_symbols)
+    sectors = rng.integers(n_sectors, size=n_symbols)
+    sector_betas = rng.normal(0.8, 0.2, size=n_symbols)
+
+    returns = simulate_garch(
+        rng, n_days, rng.uniform(0.004, 0.015, size=n_symbols), tail_dof=tail_dof
+    )
+    returns += factors[:, :1] * market_betas
+    returns += factors[:, 1 + sectors] * sector_betas
+    returns += rng.normal(0.0003, 0.0002, size=n_symbols)
+
+    # Daily rebalanced multiples of the underlyings, with some tracking noise
+    symbol_indices = {symbol: i for i, symbol in enumerate(symbols)}
+    for symbol, (underlying, leverage) in LEVERAGED_ETFS.items():
+        if symbol in symbol_indices and underlying in symbol_indices:
+            returns[:, symbol_indices[symbol]] = (
+                leverage * returns[:, symbol_indices[underlying]]
+                - LEVERAGED_ETF_FEE / N_DAYS_PER_YEAR
+                + rng.normal(0, 0.0005, size=n_days)
+            )
+    np.maximum(returns, -0.95, out=returns)
+
+    starts = np.zeros(n_symbols, dtype=np.int64)
+    is_late = rng.random(n_symbols) < late_start_fraction
+    starts[is_late] = rng.integers(
+        1, max(2, int(max_late_start_fraction * n_days)), size=is_late.sum()
+    )
+    for symbol, (underlying, _) in LEVERAGED_ETFS.items():
+        if symbol in symbol_indices and underlying in symbol_indices:
+            i, i_underlying = symbol_indices[symbol], symbol_indices[underlying]
+            starts[i] = max(starts[i], starts[i_underlying])
+    returns[np.arange(n_days)[:, np.newaxis] < starts] = np.nan
+
+    return pd.DataFrame(
+        returns,
+        index=pd.bdate_range(start_date, periods=n_days, name="Date"),
+        columns=symbols,
+    )
+
+
+def write_synthetic_dataset(
+    path: Path = DEFAULT_DATA_EXTRACTION_OUTPUT_PATH, **kwargs
+) -> pd.DataFrame:
+    """
+    Writes a synthetic panel in the format of the extracted data csv.
+
+    Parameters
+    ----------
+    path : Path, optional
+        The path of the csv. Default is the extracted data path, so that
+        load_cleaned_dataset reads it by default.
+    **kwargs
+        The arguments of generate_synthetic_returns.
+
+    Returns
+    -------
+    pd.DataFrame
+        The content of the csv, as read by extract_ticker_data, i.e. with a Date
+        column.
+    """
+    df_returns = generate_synthetic_returns(**kwargs)
+
+    path.parent.mkdir(parents=True, exist_ok=True)
+    df_returns.to_csv(path)
+    logger.info(
+        f"Synthetic dataset with {df_returns.shape[1]} symbols and "
+        f"{df_returns.shape[0]} days written to {path}."
+    )
+
+    return df_returns.reset_index()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Writes a synthetic dataset of returns in the extracted format"
+    )
+    parser.add_argument("--n_symbols", type=int, default=100, help="Number of symbols")
+    parser.add_argument(
+        "--n_years", type=float, default=10, help="Number of years of business days"
+    )
+    parser.add_argument("--seed", type=int, default=0, help="Random seed")
+    parser.add_argument(
+        "--output",
+        type=Path,
+        default=DEFAULT_DATA_EXTRACTION_OUTPUT_PATH,
+        help="Path of the csv",
+    )
+
+    args = parser.parse_args()
+
+    write_synthetic_dataset(
+        args.output,
+        n_symbols=args.n_symbols,
+        n_days=int(args.n_years * N_DAYS_PER_YEAR),
+        seed=args.seed,
+    )
@@ -2,6 +2,11 @@ import matplotlib.pyplot as plt
 import numpy as np
 import pandas as pd
 
+from stock_prediction.evaluation.metrics import (
+    get_origin_errors,
+    summarize_origin_errors,
+)
+
 
 def summary_analysis(
     df: pd.DataFrame,
@@ -14,6 +19,59 @@ def summary_analysis(
     figsize: tuple = (15, 5),
     bins: int = 20,
     alpha: float = 0.5,
+    plot: bool = True,
+) -> pd.Series:
+    """
+    Summarizes the mean percentage errors over the horizons of each origin.
+
+    The errors are computed by the metrics module, and are then plotted and printed
+    unless plot is False, e.g. when running in batch.
+
+    Returns
+    -------
+    pd.Series
+        The median and mean of the median errors of the symbols, and the mean of
+        their mean errors.
+    """
+    # Get the prediction errors
+    df_pred_errors = pd.DataFrame(
+        get_origin_errors(predictions, actuals),
+        columns=df.columns,
+        index=df.index[index_start:index_end],
+    )
+    ser_errors = summarize_origin_errors(df_pred_errors.to_numpy())
+
+    if plot:
+        plot_summary(
+            df,
+            n_predict,
+            predictions,
+            actuals,
+            index_start,
+            index_end,
+            df_pred_errors,
+            symbol=symbol,
+            figsize=figsize,
+            bins=bins,
+            alpha=alpha,
+        )
+        print(ser_errors)
+
+    return ser_errors
+
+
+def plot_summary(
+    df: pd.DataFrame,
+    n_predict: int,
+    predictions: np.ndarray,
+    actuals: np.ndarray,
+    index_start: int,
+    index_end: int,
+    df_pred_errors: pd.DataFrame,
+    symbol: str = "SPY",
+    figsize: tuple = (15, 5),
+    bins: int = 20,
+    alpha: float = 0.5,
 ):
     df_cumprod = (1 + df).cumprod()
 
@@ -37,13 +95,6 @@ def summary_analysis(
         plt.legend([f"Prediction (n = {pos})", "Actual"])
         plt.show()
 
-    # Get the prediction errors
-    df_pred_errors = pd.DataFrame(
-        np.mean(np.abs(actuals - predictions) / actuals, axis=2),
-        columns=df.columns,
-        index=df.index[index_start:index_end],
-    )
-
     # Show summary plots of average prediction errors around the actual series
     plt.figure(figsize=figsize)
     y = df_cumprod[symbol].iloc[index_start:index_end]
@@ -76,21 +127,3 @@ def summary_analysis(
     plt.title("Histogram of Median Percent Prediction Errors")
     plt.show()
     print(df_pred_errors_stats.loc["50%"].describe())
-
-    # Median of median errors
-    median_of_median_errors = df_pred_errors_stats.loc["50%"].describe().loc["50%"]
-    # Mean of median errors
-    mean_of_median_errors = df_pred_errors_stats.loc["50%"].mean()
-    # Overall mean of mean errors
-    mean_of_mean_errors = df_pred_errors.mean().mean()
-
-    # Make a dataframe with the 3 errors and print
-    ser_errors = pd.Series(
-        {
-            "Median of Median Errors": median_of_median_errors,
-            "Mean of Median Errors": mean_of_median_errors,
-            "Mean of Mean Errors": mean_of_mean_errors,
-        }
-    )
-    print(ser_errors)
-    return ser_errors
@@ -0,0 +1,289 @@
+"""
+Walk-forward backtests of any ForecastModel.
+
+The origins of the backtest are split into folds of consecutive origins. The model
+of each fold is fit on the data before its first origin, and then predicts all the
+origins of the fold, each from the data up to it. The folds are independent, so
+they run in parallel worker processes, which read the panel of returns from shared
+memory instead of receiving a copy of it with every fold. The predictions of each
+fold are written to the output tensor as soon as the fold finishes, together with
+its metrics.
+"""
+import copy
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from multiprocessing.shared_memory import SharedMemory
+from typing import Optional
+
+import numpy as np
+import pandas as pd
+
+from stock_prediction.evaluation.metrics import MetricsAccumulator
+from stock_prediction.helpers.logging.log_config import get_logger
+from stock_prediction.modeling.forecast_model import ForecastModel
+from stock_prediction.utils.series import get_normalized_nsteps_ahead_predictions_array
+
+logger = get_logger()
+
+# Panel of returns shared by the folds run in a worker process
+_df_panel: Optional[pd.DataFrame] = None
+_shared_memory: Optional[SharedMemory] = None
+
+
+def walk_forward_schedule(
+    index_start: int,
+    index_end: int,
+    refit_every: Optional[int] = None,
+    train_size: Optional[int] = None,
+) -> list[tuple[int, int, int]]:
+    """
+    Splits a range of origins into walk-forward folds.
+
+    Parameters
+    ----------
+    index_start : int
+        The first origin.
+    index_end : int
+        The origin after the last one.
+    refit_every : int, optional
+        The number of origins of each fold, i.e. the model is refit every
+        refit_every origins. If None, the model is fit once, before the first
+        origin.
+    train_size : int, optional
+        The number of rows the model of each fold is fit on (a rolling window). If
+        None, it is fit on all the rows before the fold (an expanding window).
+
+    Returns
+    -------
+    list[tuple[int, int, int]]
+        The folds (train_start, origin_start, origin_end), in chronological order.
+        The model of each fold is fit on the rows train_start to origin_start - 1
+        and predicts the origins origin_start to origin_end - 1.
+    """
+    if index_start <= 0 or index_end <= index_start:
+        raise ValueError(
+            f"Invalid range of origins ({index_start}, {index_end}), the models need "
+            "at least one row to be fit on."
+        )
+
+    refit_every = refit_every or index_end - index_start
+    folds = []
+    for origin_start in range(index_start, index_end, refit_every):
+        train_start = 0 if train_size is None else max(0, origin_start - train_size)
+        folds.append(
+            (train_start, origin_start, min(origin_start + refit_every, index_end))
+        )
+
+    return folds
+
+
+def _init_worker(
+    name: str,
+    shape: tuple[int, int],
+    dtype: np.dtype,
+    index: pd.Index,
+    columns: pd.Index,
+):
+    global _df_panel, _shared_memory
+    _shared_memory = SharedMemory(name=name)
+    values = np.ndarray(shape, dtype=dtype, buffer=_shared_memory.buf)
+    values.flags.writeable = False
+    _df_panel = pd.DataFrame(values, index=index, columns=columns, copy=False)
+
+
+def _run_fold(
+    model: ForecastModel,
+    fold: tuple[int, int, int],
+    n_steps_predict: int,
+    df: Optional[pd.DataFrame] = None,
+) -> np.ndarray:
+    if df is None:
+        if _df_panel is None:
+            raise RuntimeError("The worker process was not initialized with a panel.")
+        df = _df_panel
+
+    train_start, origin_start, origin_end = fold
+    # Both the fit and the predictions use rows relative to train_start
+    df = df.iloc[train_start:]
+    model.fit(df.iloc[: origin_start - train_start])
+
+    return model.predict(
+        df,
+        n_steps_predict=n_steps_predict,
+        index_start=origin_start - train_start,
+        index_end=origin_end - train_start,
+    )
+
+
+class WalkForwardBacktest:
+    def __init__(
+        self,
+        model: ForecastModel,
+        n_steps_predict: int = 20,
+        refit_every: Optional[int] = None,
+        train_size: Optional[int] = None,
+        n_jobs: int = 1,
+    ):
+        """
+        Initialize the backtest.
+
+        Parameters
+        ----------
+        model : ForecastModel
+            The model to backtest. It is not modified, each fold fits a copy of it.
+        n_steps_predict : int, optional
+            The number of steps ahead to predict. Default is 20.
+        refit_every : int, optional
+            The number of origins between refits of the model. If None, the model
+            is fit once, before the first origin. See walk_forward_schedule.
+        train_size : int, optional
+            The number of rows of the rolling training window. If None, the
+            training window expands. See walk_forward_schedule.
+        n_jobs : int, optional
+            The number of worker processes running the folds. If 1, the folds run
+            in the current process. Default is 1.
+
+        Attributes
+        ----------
+        folds : list[tuple[int, int, int]]
+            The folds of the last run.
+        predictions : np.ndarray
+            The predictions of the last run, of shape
+            (n_origins, n_symbols, n_steps_predict).
+        actuals : np.ndarray, optional
+            The actual cumulative returns of the last run, with the shape of the
+            predictions, if they were kept (see run).
+        metrics : MetricsAccumulator
+            The metrics of the last run, with the folds as periods.
+        fold_metrics : pd.DataFrame
+            The folds of the last run and their metrics.
+        """
+        self.model = model
+        self.n_steps_predict = n_steps_predict
+        self.refit_every = refit_every
+        self.train_size = train_size
+        self.n_jobs = n_jobs
+        self.folds: list[tuple[int, int, int]] = []
+        self.predictions: Optional[np.ndarray] = None
+        self.actuals: Optional[np.ndarray] = None
+        self.metrics: Optional[MetricsAccumulator] = None
+        self.fold_metrics: Optional[pd.DataFrame] = None
+
+    def run(
+        self,
+        df: pd.DataFrame,
+        index_start: int,
+        index_end: Optional[int] = None,
+        out: Optional[np.ndarray] = None,
+        actuals_out: Optional[np.ndarray] = None,
+    ) -> np.ndarray:
+        """
+        Runs the backtest on a dataset of returns.
+
+        Parameters
+        ----------
+        df : pd.DataFrame
+            The dataframe of returns, with one column per symbol.
+        index_start : int
+            The first origin.
+        index_end : int, optional
+            The origin after the last one. If None, defaults to the last origin with
+            actuals for all the horizons, df.shape[0] - n_steps_predict.
+        out : np.ndarray, optional
+            The array of shape (index_end - index_start, n_symbols,
+            n_steps_predict) the predictions are written to, e.g. a TensorStore
+            to which the chunks are written once all their folds finish. If None, a
+            new array is allocated.
+        actuals_out : np.ndarray, optional
+            The array, e.g. a TensorStore, the actual cumulative returns are written
+            to, with the shape of out. The actuals are computed fold by fold, so
+            only those of the running folds are in memory. If None, they are kept
+            in a new array if out is None too, and discarded otherwise.
+
+        Returns
+        -------
+        np.ndarray
+            The predictions of all the origins.
+        """
+        if index_end is None:
+            index_end = df.shape[0] - self.n_steps_predict
+
+        self.folds = walk_forward_schedule(
+            index_start, index_end, self.refit_every, self.train_size
+        )
+        if out is None:
+            out = np.empty((index_end - index_start, df.shape[1], self.n_steps_predict))
+            if actuals_out is None:
+                actuals_out = np.empty_like(out)
+        df_cumulative = (1 + df).cumprod()
+        self.metrics = MetricsAccumulator(df.columns, self.n_steps_predict)
+
+        logger.info(
+            f"Backtesting {type(self.model).__name__} on {index_end - index_start} "
+            f"origins in {len(self.folds)} folds."
+        )
+
+        def store_fold(i_fold: int, predictions: np.ndarray):
+            _, origin_start, origin_end = self.folds[i_fold]
+            rows = slice(origin_start - index_start, origin_end - index_start)
+            actuals = get_normalized_nsteps_ahead_predictions_array(
+                df_cumulative, self.n_steps_predict, origin_start, origin_end
+            )
+            out[rows] = predictions
+            if actuals_out is not None:
+                actuals_out[rows] = actuals
+            self.metrics.update(
+                predictions, actuals, periods=[i_fold] * len(predictions)
+            )
+            logger.info(f"Fold {i_fold} done.")
+
+        if self.n_jobs == 1:
+            for i_fold, fold in enumerate(self.folds):
+                store_fold(
+                    i_fold,
+                    _run_fold(
+                        copy.deepcopy(self.model), fold, self.n_steps_predict, df
+                    ),
+                )
+        else:
+            self._run_parallel(df, store_fold)
+
+        self.predictions = out
+        self.actuals = actuals_out
+        self.fold_metrics = pd.DataFrame(
+            self.folds, columns=["train_start", "origin_start", "origin_end"]
+        ).join(self.metrics.get_metrics(by="period").sort_index())
+
+        return out
+
+    def _run_parallel(self, df: pd.DataFrame, store_fold):
+        values = df.to_numpy(dtype=np.float64)
+        shared_memory = SharedMemory(create=True, size=max(values.nbytes, 1))
+        try:
+            np.ndarray(values.shape, dtype=values.dtype, buffer=shared_memory.buf)[
+                :
+            ] = values
+            del values
+
+            with ProcessPoolExecutor(
+                max_workers=self.n_jobs,
+                initializer=_init_worker,
+                initargs=(
+                    shared_memory.name,
+                    df.shape,
+                    np.dtype(np.float64),
+                    df.index,
+                    df.columns,
+                ),
+            ) as executor:
+                futures = {
+                    executor.submit(
+                        _run_fold, self.model, fold, self.n_steps_predict
+                    ): i_fold
+                    for i_fold, fold in enumerate(self.folds)
+                }
+                # Store the folds in the order they finish
+                for future in as_completed(futures):
+                    store_fold(futures[future], future.result())
+        finally:
+            shared_memory.close()
+            shared_memory.unlink()
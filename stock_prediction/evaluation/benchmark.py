@@ -0,0 +1,598 @@
+"""
+Benchmarks of the wall time, peak memory and throughput of the models and of the
+data preparation stages, on synthetic panels of returns of several sizes.
+
+Every model is benchmarked on its fit and on its predictions over a range of
+origins, and every stage (ETL cleaning, features, actuals and metrics) on a run
+over the whole panel. Each stage runs in a fresh worker process, so that the peak
+resident memory (RSS) of the process is the one of the stage. The predict stage
+also fits the model it predicts with, so its peak RSS includes the peak of a
+single fit. The wall time is the best of a few repeats, and the peak memory
+allocated by python and numpy is measured with tracemalloc on a separate run, so
+that tracing does not slow down the timed runs.
+
+The results are saved to a json file, which can be compared with the results of a
+previous run (e.g. before a change) to find regressions. The stages that fail are
+kept in the results with their error, and a case of the previous run that fails or
+is missing is a regression.
+"""
+import argparse
+import inspect
+import itertools
+import json
+import platform
+import resource
+import sys
+import time
+import tracemalloc
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from multiprocessing import get_context
+from pathlib import Path
+from typing import Callable, Optional, Sequence
+
+import numpy as np
+import pandas as pd
+from sklearn.linear_model import Ridge
+
+from stock_prediction.etl.synthetic_data import (
+    N_DAYS_PER_YEAR,
+    generate_synthetic_returns,
+)
+from stock_prediction.evaluation.metrics import MetricsAccumulator
+from stock_prediction.helpers.logging.log_config import get_logger
+from stock_prediction.modeling.arima import UnivariateARIMAs
+from stock_prediction.modeling.autoregressive import UnivariateARs
+from stock_prediction.modeling.baselines import (
+    EWMADrift,
+    NoReturnForecast,
+    RollingGeometricAverage,
+    RollingMedianDrift,
+    SeasonalNaive,
+    VolatilityScaledDrift,
+)
+from stock_prediction.modeling.forecast_model import ForecastModel
+from stock_prediction.modeling.lightgbm_model import (
+    MultivariateLightGBM,
+    UnivariateLightGBMs,
+)
+from stock_prediction.modeling.rls import UnivariateRLS
+from stock_prediction.modeling.sklearn_api_based import (
+    MultivariateSklearnAPIBased,
+    UnivariateSklearnAPIBased,
+)
+from stock_prediction.modeling.statsforecast_models import (
+    UnivariateAutoARIMAs,
+    UnivariateAutoETS,
+    UnivariateThetas,
+)
+from stock_prediction.utils.series import get_normalized_nsteps_ahead_predictions_array
+
+logger = get_logger()
+
+CASE_COLUMNS = [
+    "name",
+    "stage",
+    "n_symbols",
+    "n_years",
+    "n_steps_predict",
+    "n_origins",
+]
+MEASURE_COLUMNS = ["wall_time", "peak_traced_mb", "peak_rss_mb"]
+
+
+# Classes and keyword arguments of the benchmarked models
+BENCHMARK_MODELS: dict[str, tuple[type, dict]] = {
+    "NoReturnForecast": (NoReturnForecast, {}),
+    "RollingGeometricAverage": (RollingGeometricAverage, {}),
+    "EWMADrift": (EWMADrift, {}),
+    "RollingMedianDrift": (RollingMedianDrift, {}),
+    "VolatilityScaledDrift": (VolatilityScaledDrift, {}),
+    "SeasonalNaive": (SeasonalNaive, {}),
+    "UnivariateARs": (UnivariateARs, {}),
+    "UnivariateRLS": (UnivariateRLS, {}),
+    "UnivariateThetas": (UnivariateThetas, {}),
+    "UnivariateAutoETS": (UnivariateAutoETS, {}),
+    "UnivariateAutoARIMAs": (
+        UnivariateAutoARIMAs,
+        {"max_p": 2, "max_q": 2, "seasonal": False},
+    ),
+    "UnivariateARIMAs": (UnivariateARIMAs, {"p": 1, "d": 0, "q": 1}),
+    "UnivariateSklearnRidge": (UnivariateSklearnAPIBased, {"model_class_type": Ridge}),
+    "MultivariateSklearnRidge": (
+        MultivariateSklearnAPIBased,
+        {"model_class_type": Ridge},
+    ),
+    "UnivariateLightGBMs": (
+        UnivariateLightGBMs,
+        {"lgbm_hpts": {"num_iterations": 50, "verbosity": -1}},
+    ),
+    "MultivariateLightGBM": (
+        MultivariateLightGBM,
+        {"lgbm_hpts": {"num_iterations": 50, "verbosity": -1}},
+    ),
+}
+
+BENCHMARK_STAGES = ("etl", "features", "actuals", "metrics")
+
+
+def make_benchmark_panel(
+    n_symbols: int, n_years: float, staggered_starts: bool = False, seed: int = 0
+) -> pd.DataFrame:
+    """
+    Makes a synthetic panel of daily returns, see generate_synthetic_returns.
+
+    Parameters
+    ----------
+    n_symbols : int
+        The number of symbols.
+    n_years : float
+        The number of years of business days.
+    staggered_starts : bool, optional
+        Whether some of the symbols start after the first day, as in the raw
+        extracted data. Otherwise, there are no missing values, as in the cleaned
+        dataset the models are trained on. Default is False.
+    seed : int, optional
+        The random seed. Default is 0.
+
+    Returns
+    -------
+    pd.DataFrame
+        The returns, indexed by date, with the symbols SYM0, SYM1, ..., so that
+        the results do not depend on the symbols csv.
+    """
+    return generate_synthetic_returns(
+        symbols=[f"SYM{i}" for i in range(n_symbols)],
+        n_days=int(n_years * N_DAYS_PER_YEAR),
+        start_date="2000-01-03",
+        late_start_fraction=0.25 if staggered_starts else 0.0,
+        seed=seed,
+    )
+
+
+def measure(
+    run: Callable[..., object],
+    setup: Callable[[], tuple],
+    n_repeats: int = 3,
+    trace_memory: bool = True,
+) -> dict:
+    """
+    Measures the wall time and peak traced memory of a function.
+
+    Parameters
+    ----------
+    run : Callable
+        The measured function.
+    setup : Callable
+        Returns the arguments of run. It is called before every run and is not
+        measured, e.g. to create a new model before each fit.
+    n_repeats : int, optional
+        The number of timed runs. Default is 3.
+    trace_memory : bool, optional
+        Whether to measure the peak memory with tracemalloc, on an extra run.
+        Default is True.
+
+    Returns
+    -------
+    dict
+        The best and mean wall times in seconds and the peak traced memory in MB
+        (NaN if not traced).
+    """
+    wall_times = []
+    for _ in range(n_repeats):
+        args = setup()
+        start = time.perf_counter()
+        run(*args)
+        wall_times.append(time.perf_counter() - start)
+
+    peak_traced_mb = np.nan
+    if trace_memory:
+        args = setup()
+        tracemalloc.start()
+        try:
+            run(*args)
+            peak_traced_mb = tracemalloc.get_traced_memory()[1] / 2**20
+        finally:
+            tracemalloc.stop()
+
+    return {
+        "wall_time": min(wall_times),
+        "mean_wall_time": float(np.mean(wall_times)),
+        "peak_traced_mb": peak_traced_mb,
+    }
+
+
+def make_benchmark_model(name: str, n_steps_predict: int) -> ForecastModel:
+    model_class, kwargs = BENCHMARK_MODELS[name]
+    # Subclasses may only forward *args and **kwargs to the __init__ of their base
+    if any(
+        "n_steps_predict" in inspect.signature(cls.__init__).parameters
+        for cls in model_class.__mro__
+        if "__init__" in vars(cls)
+    ):
+        kwargs = dict(kwargs, n_steps_predict=n_steps_predict)
+
+    return model_class(**kwargs)
+
+
+def get_stage_names(name: str) -> tuple[str, ...]:
+    return ("fit", "predict") if name in BENCHMARK_MODELS else (name,)
+
+
+def get_model_stages(
+    name: str,
+    df: pd.DataFrame,
+    n_steps_predict: int,
+    n_origins: int,
+) -> list[tuple[str, Callable, Callable, int]]:
+    index_end = df.shape[0] - n_steps_predict
+    index_start = index_end - n_origins
+    df_train = df.iloc[:index_start]
+
+    def fit(model: ForecastModel):
+        model.fit(df_train)
+
+    def setup_predict() -> tuple:
+        model = make_benchmark_model(name, n_steps_predict)
+        model.fit(df_train)
+        return (model,)
+
+    def predict(model: ForecastModel):
+        model.predict(df, n_steps_predict, index_start, index_end)
+
+    return [
+        (
+            "fit",
+            lambda: (make_benchmark_model(name, n_steps_predict),),
+            fit,
+            df_train.size,
+        ),
+        ("predict", setup_predict, predict, n_origins * df.shape[1]),
+    ]
+
+
+def get_stage(
+    stage: str, df: pd.DataFrame, n_steps_predict: int, n_origins: int
+) -> tuple[str, Callable, Callable, int]:
+    """
+    Gets the setup, the run and the number of items processed by a stage.
+    """
+    if stage == "etl":
+        # Imported here as the ETL module needs the data download dependencies
+        from stock_prediction.etl.ticker_data_extractors import load_cleaned_dataset
+
+        # Same format as the extracted csv
+        df_raw = make_benchmark_panel(
+            df.shape[1], df.shape[0] / N_DAYS_PER_YEAR, staggered_starts=True
+        ).reset_index()
+        df_raw["Date"] = df_raw["Date"].dt.strftime("%Y-%m-%d")
+        return stage, lambda: (df_raw.copy(),), load_cleaned_dataset, df.size
+    if stage == "features":
+        model = UnivariateSklearnAPIBased(Ridge, n_steps_predict=n_steps_predict)
+
+        def make_features(df: pd.DataFrame):
+            for symbol in df.columns:
+                model.preprocess(df[symbol])
+
+        return stage, lambda: (df,), make_features, df.size
+    if stage == "actuals":
+        df_cumulative = (1 + df).cumprod()
+        index_end = df.shape[0] - n_steps_predict
+        return (
+            stage,
+            lambda: (df_cumulative, n_steps_predict, index_end - n_origins, index_end),
+            get_normalized_nsteps_ahead_predictions_array,
+            n_origins * df.shape[1],
+        )
+    if stage == "metrics":
+        index_end = df.shape[0] - n_steps_predict
+        actuals = get_normalized_nsteps_ahead_predictions_array(
+            (1 + df).cumprod(), n_steps_predict, index_end - n_origins, index_end
+        )
+        predictions = np.ones_like(actuals)
+
+        def update_metrics():
+            MetricsAccumulator(df.columns, n_steps_predict).update(predictions, actuals)
+
+        return stage, lambda: (), update_metrics, actuals.shape[0] * df.shape[1]
+
+    raise ValueError(f"Unknown stage {stage}, expected one of {BENCHMARK_STAGES}.")
+
+
+def get_n_origins(n_years: float, n_steps_predict: int, n_origins: int) -> int:
+    # The first origin must have a day to fit on
+    return min(n_origins, int(n_years * N_DAYS_PER_YEAR) - n_steps_predict - 1)
+
+
+def run_case(
+    name: str,
+    n_symbols: int,
+    n_years: float,
+    n_steps_predict: int = 20,
+    n_origins: int = 250,
+    n_repeats: int = 3,
+    trace_memory: bool = True,
+    seed: int = 0,
+    stages: Optional[Sequence[str]] = None,
+) -> list[dict]:
+    """
+    Runs the benchmark of a model (its fit and predict stages) or of a stage.
+
+    Parameters
+    ----------
+    name : str
+        A key of BENCHMARK_MODELS or one of BENCHMARK_STAGES.
+    n_symbols, n_years : int, float
+        The size of the synthetic panel, see make_benchmark_panel.
+    n_steps_predict : int, optional
+        The number of steps ahead predicted. Default is 20.
+    n_origins : int, optional
+        The number of origins predicted, the last ones with actuals. The models
+        are fit on the days before them. Default is 250.
+    n_repeats, trace_memory : optional
+        See measure.
+    seed : int, optional
+        The random seed of the panel. Default is 0.
+    stages : Sequence[str], optional
+        The stages run, e.g. ["predict"] to run only the predictions of a model.
+        If None, all the stages of name are run, see get_stage_names.
+
+    Returns
+    -------
+    list[dict]
+        One result per stage, with the case, the measures, the throughput in items
+        (panel values for the fits, predicted symbol origins otherwise) per second
+        and a None error.
+    """
+    df = make_benchmark_panel(n_symbols, n_years, seed=seed)
+    n_origins = get_n_origins(n_years, n_steps_predict, n_origins)
+
+    if name in BENCHMARK_MODELS:
+        case_stages = get_model_stages(name, df, n_steps_predict, n_origins)
+    else:
+        case_stages = [get_stage(name, df, n_steps_predict, n_origins)]
+
+    results = []
+    for stage, setup, run, n_items in case_stages:
+        if stages is not None and stage not in stages:
+            continue
+        logger.info(f"Benchmarking {name} {stage} on {n_symbols} x {n_years} years.")
+        measures = measure(run, setup, n_repeats=n_repeats, trace_memory=trace_memory)
+        results.append(
+            dict(
+                name=name,
+                stage=stage,
+                n_symbols=n_symbols,
+                n_years=n_years,
+                n_steps_predict=n_steps_predict,
+                n_origins=n_origins,
+                **measures,
+                peak_rss_mb=get_peak_rss_mb(),
+                throughput=n_items / measures["wall_time"],
+                error=None,
+            )
+        )
+
+    return results
+
+
+def get_peak_rss_mb() -> float:
+    # ru_maxrss is in bytes on macOS and in kilobytes on linux
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return max_rss / 2**20 if sys.platform == "darwin" else max_rss / 2**10
+
+
+def get_environment() -> dict:
+    return {
+        "date": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "pandas": pd.__version__,
+        "platform": platform.platform(),
+        "processor": platform.processor(),
+    }
+
+
+def run_benchmarks(
+    names: list[str],
+    sizes: list[tuple[int, float]],
+    n_steps_predict: int = 20,
+    n_origins: int = 250,
+    n_repeats: int = 3,
+    trace_memory: bool = True,
+    isolate: bool = True,
+) -> pd.DataFrame:
+    """
+    Runs the benchmarks of some models and stages on panels of several sizes.
+
+    Parameters
+    ----------
+    names : list[str]
+        The keys of BENCHMARK_MODELS or BENCHMARK_STAGES to benchmark.
+    sizes : list[tuple[int, float]]
+        The (n_symbols, n_years) of the panels.
+    n_steps_predict, n_origins, n_repeats, trace_memory : optional
+        See run_case.
+    isolate : bool, optional
+        Whether to run each stage of each case in a fresh process, so that its peak
+        RSS is not the one of the previous stages. Default is True.
+
+    Returns
+    -------
+    pd.DataFrame
+        One row per case and stage, see run_case. The stages that failed have NaN
+        measures and the message of their exception in the error column.
+    """
+    results = []
+    for name, (n_symbols, n_years) in itertools.product(names, sizes):
+        case_kwargs = dict(
+            name=name,
+            n_symbols=n_symbols,
+            n_years=n_years,
+            n_steps_predict=n_steps_predict,
+            n_origins=n_origins,
+            n_repeats=n_repeats,
+            trace_memory=trace_memory,
+        )
+        for stage in get_stage_names(name):
+            try:
+                if isolate:
+                    with ProcessPoolExecutor(
+                        max_workers=1, mp_context=get_context("spawn")
+                    ) as executor:
+                        results.extend(
+                            executor.submit(
+                                run_case, **case_kwargs, stages=[stage]
+                            ).result()
+                        )
+                else:
+                    results.extend(run_case(**case_kwargs, stages=[stage]))
+            except Exception as e:
+                # A broken model should not stop the benchmarks of the others, but
+                # its failure is kept in the results to be compared
+                logger.exception(
+                    f"Benchmark of {name} {stage} on {n_symbols} symbols failed."
+                )
+                results.append(
+                    dict(
+                        name=name,
+                        stage=stage,
+                        n_symbols=n_symbols,
+                        n_years=n_years,
+                        n_steps_predict=n_steps_predict,
+                        n_origins=get_n_origins(n_years, n_steps_predict, n_origins),
+                        error=f"{type(e).__name__}: {e}",
+                    )
+                )
+
+    return pd.DataFrame(results)
+
+
+def save_results(df_results: pd.DataFrame, path: Path):
+    with open(path, "w") as f:
+        json.dump(
+            {
+                "environment": get_environment(),
+                "results": json.loads(df_results.to_json(orient="records")),
+            },
+            f,
+            indent=2,
+        )
+
+
+def load_results(path: Path) -> pd.DataFrame:
+    with open(path) as f:
+        return pd.DataFrame(json.load(f)["results"])
+
+
+def compare_results(
+    df_results: pd.DataFrame, df_baseline: pd.DataFrame, tolerance: float = 0.2
+) -> pd.DataFrame:
+    """
+    Compares benchmark results with the results of a baseline run.
+
+    Parameters
+    ----------
+    df_results, df_baseline : pd.DataFrame
+        The results, see run_benchmarks. The cases of the baseline that are missing
+        from the results or that failed in them are regressions, and the cases that
+        are only in the results are not compared.
+    tolerance : float, optional
+        The relative increase of a measure above which it is a regression. Default
+        is 0.2, i.e. 20% slower or hungrier.
+
+    Returns
+    -------
+    pd.DataFrame
+        The cases of the baseline with the ratio of each measure to its baseline,
+        the error of the case in the results (if missing or failed) and whether it
+        is a regression.
+    """
+    # Results saved before the error column was added have no failed cases
+    df_comparison = df_baseline[CASE_COLUMNS + MEASURE_COLUMNS].merge(
+        df_results.reindex(columns=CASE_COLUMNS + MEASURE_COLUMNS + ["error"]),
+        how="left",
+        on=CASE_COLUMNS,
+        suffixes=("_baseline", ""),
+        indicator=True,
+    )
+    df_comparison["error"] = df_comparison["error"].where(
+        df_comparison["_merge"] == "both", "Missing from the results"
+    )
+    ratio_columns = []
+    for column in MEASURE_COLUMNS:
+        df_comparison[f"{column}_ratio"] = (
+            df_comparison[column] / df_comparison[f"{column}_baseline"]
+        )
+        ratio_columns.append(f"{column}_ratio")
+
+    df_comparison["regression"] = (df_comparison[ratio_columns] > 1 + tolerance).any(
+        axis=1
+    ) | df_comparison["error"].notna()
+
+    return df_comparison[CASE_COLUMNS + ratio_columns + ["error", "regression"]]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Benchmarks the models and data stages on synthetic panels"
+    )
+    parser.add_argument(
+        "--names",
+        nargs="+",
+        default=list(BENCHMARK_MODELS) + list(BENCHMARK_STAGES),
+        help="Models and stages to benchmark",
+    )
+    parser.add_argument(
+        "--n_symbols", type=int, nargs="+", default=[20], help="Numbers of symbols"
+    )
+    parser.add_argument(
+        "--n_years", type=float, nargs="+", default=[5], help="Numbers of years"
+    )
+    parser.add_argument(
+        "--n_steps_predict", type=int, default=20, help="Number of days to predict"
+    )
+    parser.add_argument(
+        "--n_origins", type=int, default=250, help="Number of origins predicted"
+    )
+    parser.add_argument("--n_repeats", type=int, default=3, help="Timed runs")
+    parser.add_argument(
+        "--no_trace_memory", action="store_true", help="Skip the tracemalloc runs"
+    )
+    parser.add_argument(
+        "--output",
+        type=Path,
+        default=Path("benchmark_results.json"),
+        help="Path of the json file with the results",
+    )
+    parser.add_argument(
+        "--baseline",
+        type=Path,
+        default=None,
+        help="Json file with the results to compare with",
+    )
+    parser.add_argument(
+        "--tolerance", type=float, default=0.2, help="Relative regression threshold"
+    )
+
+    args = parser.parse_args()
+
+    df_results = run_benchmarks(
+        args.names,
+        list(itertools.product(args.n_symbols, args.n_years)),
+        n_steps_predict=args.n_steps_predict,
+        n_origins=args.n_origins,
+        n_repeats=args.n_repeats,
+        trace_memory=not args.no_trace_memory,
+    )
+    save_results(df_results, args.output)
+    print(df_results.to_string())
+    logger.info(f"Benchmark results saved to {args.output}")
+
+    if args.baseline is not None:
+        df_comparison = compare_results(
+            df_results, load_results(args.baseline), tolerance=args.tolerance
+        )
+        print(df_comparison.to_string())
+        if df_comparison["regression"].any():
+            sys.exit(1)
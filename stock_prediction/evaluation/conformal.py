@@ -0,0 +1,311 @@
+"""
+Split-conformal prediction intervals of the predicted cumulative returns, per
+symbol and horizon, computed from the residuals of past predictions instead of
+training extra (e.g. quantile) models.
+
+The residual of a prediction is its relative error actuals / predictions - 1. Its
+distribution per symbol and horizon is kept in a histogram, which is updated
+incrementally with the residuals of new origins, e.g. the walk-forward predictions
+of a backtest stored in a TensorStore, then every day the predictions whose
+horizons have all been observed. The histograms can decay, so that recent
+residuals weigh more. The intervals of new predictions are the predictions scaled
+by the conformal quantiles of the residuals.
+"""
+from pathlib import Path
+from typing import Optional, Sequence, Union
+
+import numpy as np
+import pandas as pd
+
+from stock_prediction.evaluation.metrics import get_histogram_quantiles
+from stock_prediction.evaluation.tensor_store import TensorStore
+from stock_prediction.helpers.logging.log_config import get_logger
+from stock_prediction.utils.series import get_normalized_nsteps_ahead_predictions_array
+
+logger = get_logger()
+
+
+class ConformalIntervals:
+    def __init__(
+        self,
+        symbols: Sequence[str],
+        n_steps_predict: int,
+        coverage: float = 0.9,
+        half_life: Optional[float] = None,
+        n_bins: int = 1000,
+        max_residual: float = 1.0,
+    ):
+        """
+        Initialize the intervals, without residuals.
+
+        Parameters
+        ----------
+        symbols : Sequence[str]
+            The symbols of the second axis of the predictions.
+        n_steps_predict : int
+            The number of horizons of the third axis of the predictions.
+        coverage : float, optional
+            The probability of the actual cumulative returns to be in their
+            intervals. Default is 0.9.
+        half_life : float, optional
+            The number of origins after which the weight of a residual is halved.
+            If None, all the residuals weigh the same. Default is None.
+        n_bins : int, optional
+            The number of bins of the histograms of the residuals. Default is 1000.
+        max_residual : float, optional
+            The histograms cover the residuals from -max_residual to max_residual,
+            larger residuals are counted in the first or last bin. Default is 1.0,
+            so the quantiles are exact to 0.002.
+
+        Attributes
+        ----------
+        histograms : np.ndarray
+            The weights of the residuals per symbol, horizon and bin.
+        pending_dates : pd.DatetimeIndex
+            The dates of the origins of the predictions whose actuals are not all
+            known yet.
+        pending_predictions : np.ndarray
+            Their predictions, of shape (n_pending, n_symbols, n_steps_predict).
+        """
+        self.symbols = list(symbols)
+        self.n_steps_predict = n_steps_predict
+        self.coverage = coverage
+        self.set_half_life(half_life)
+        self.n_bins = n_bins
+        self.max_residual = max_residual
+        self.histograms = np.zeros((len(self.symbols), n_steps_predict, n_bins))
+        self.pending_dates = pd.DatetimeIndex([])
+        self.pending_predictions = np.zeros((0, len(self.symbols), n_steps_predict))
+
+    def set_half_life(self, half_life: Optional[float]):
+        """
+        Sets the decay of the residuals of the next updates, e.g. to change the
+        half-life of loaded intervals. The weights of the residuals already added
+        are not changed.
+        """
+        self.decay = 1.0 if half_life is None else 0.5 ** (1 / half_life)
+
+    @property
+    def bin_edges(self) -> np.ndarray:
+        return np.linspace(-self.max_residual, self.max_residual, self.n_bins + 1)
+
+    def update(self, predictions: np.ndarray, actuals: np.ndarray):
+        """
+        Adds the residuals of a chunk of origins.
+
+        Parameters
+        ----------
+        predictions, actuals : np.ndarray
+            The predicted and actual cumulative returns of the chunk, of shape
+            (n_origins, n_symbols, n_steps_predict), with the origins in
+            chronological order after those already added.
+        """
+        n_origins = predictions.shape[0]
+        with np.errstate(invalid="ignore", divide="ignore"):
+            residuals = actuals / predictions - 1
+        is_valid = np.isfinite(residuals)
+        bins = np.clip(
+            np.floor(
+                (residuals[is_valid] + self.max_residual)
+                / (2 * self.max_residual)
+                * self.n_bins
+            ).astype(np.int64),
+            0,
+            self.n_bins - 1,
+        )
+
+        # Weights of the origins after the chunk, the last origin weighing 1
+        i_origin, i_symbol, i_horizon = np.nonzero(is_valid)
+        weights = self.decay ** np.arange(n_origins - 1, -1, -1, dtype=np.float64)
+        self.histograms *= self.decay**n_origins
+        # Add in place to the flat view, without a dense array of all the bins
+        np.add.at(
+            self.histograms.reshape(-1),
+            (i_symbol * self.n_steps_predict + i_horizon) * self.n_bins + bins,
+            weights[i_origin],
+        )
+
+    def get_residual_quantiles(self) -> np.ndarray:
+        """
+        Gets the conformal quantiles of the residuals.
+
+        The quantiles of the lower and upper bounds are (1 - coverage) / 2 and
+        (1 + coverage) / 2, corrected for the finite number of residuals n, i.e.
+        the upper one is (1 + coverage) / 2 * (n + 1) / n, with the total weight
+        of the residuals as n.
+
+        Returns
+        -------
+        np.ndarray
+            The lower and upper quantiles of shape (n_symbols, n_steps_predict, 2).
+            NaN if there are too few residuals for the coverage.
+        """
+        n_residuals = self.histograms.sum(axis=2, keepdims=True)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            upper = (1 + self.coverage) / 2 * (n_residuals + 1) / n_residuals
+        levels = np.concatenate([1 - upper, upper], axis=2)
+
+        quantiles = get_histogram_quantiles(
+            self.histograms, np.clip(levels, 0.0, 1.0), self.bin_edges
+        )
+        return np.where(upper <= 1, quantiles, np.nan)
+
+    def get_intervals(self, predictions: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Gets the intervals of predictions.
+
+        Parameters
+        ----------
+        predictions : np.ndarray
+            The predicted cumulative returns, or prices, of shape
+            (..., n_symbols, n_steps_predict).
+
+        Returns
+        -------
+        tuple[np.ndarray, np.ndarray]
+            The lower and upper bounds, of the shape of the predictions.
+        """
+        quantiles = self.get_residual_quantiles()
+        return (
+            predictions * (1 + quantiles[..., 0]),
+            predictions * (1 + quantiles[..., 1]),
+        )
+
+    def add_pending(self, date: pd.Timestamp, predictions: np.ndarray):
+        """
+        Adds the predictions of an origin, whose residuals are added by
+        update_pending once its actuals are known.
+
+        Parameters
+        ----------
+        date : pd.Timestamp
+            The date of the origin.
+        predictions : np.ndarray
+            The predicted cumulative returns, of shape (n_symbols, n_steps_predict).
+        """
+        self.pending_dates = self.pending_dates.append(pd.DatetimeIndex([date]))
+        self.pending_predictions = np.concatenate(
+            [self.pending_predictions, predictions[np.newaxis]]
+        )
+
+    def update_pending(self, df: pd.DataFrame):
+        """
+        Adds the residuals of the pending predictions whose horizons have all been
+        observed.
+
+        Parameters
+        ----------
+        df : pd.DataFrame
+            The returns of the symbols, indexed by date.
+        """
+        positions = df.index.get_indexer(self.pending_dates)
+        is_unknown = positions < 0
+        if is_unknown.any():
+            logger.warning(
+                f"Dropping {is_unknown.sum()} pending predictions of dates not in "
+                "the returns."
+            )
+        is_observed = ~is_unknown & (positions + self.n_steps_predict < len(df))
+
+        # The observed origins in chronological order, as update expects
+        observed = np.flatnonzero(is_observed)
+        observed = observed[np.argsort(positions[observed], kind="stable")]
+        df_cumulative = (1 + df.reindex(columns=self.symbols)).cumprod()
+        actuals = np.empty((len(observed), len(self.symbols), self.n_steps_predict))
+        for i, position in enumerate(positions[observed]):
+            get_normalized_nsteps_ahead_predictions_array(
+                df_cumulative,
+                self.n_steps_predict,
+                position,
+                position + 1,
+                out=actuals[i : i + 1],
+            )
+        self.update(self.pending_predictions[observed], actuals)
+        logger.info(f"Added the residuals of {is_observed.sum()} pending predictions.")
+
+        is_kept = ~is_unknown & ~is_observed
+        self.pending_dates = self.pending_dates[is_kept]
+        self.pending_predictions = self.pending_predictions[is_kept]
+
+    def align(self, symbols: Sequence[str]):
+        """
+        Changes the symbols, keeping the residuals of the symbols in both. The new
+        symbols have no residuals, so no intervals until they have enough.
+        """
+        symbols = list(symbols)
+        indices = pd.Index(self.symbols).get_indexer(symbols)
+        is_known = indices >= 0
+
+        histograms = np.zeros((len(symbols),) + self.histograms.shape[1:])
+        histograms[is_known] = self.histograms[indices[is_known]]
+        pending_predictions = np.full(
+            (len(self.pending_predictions), len(symbols), self.n_steps_predict), np.nan
+        )
+        pending_predictions[:, is_known] = self.pending_predictions[
+            :, indices[is_known]
+        ]
+
+        self.symbols = symbols
+        self.histograms = histograms
+        self.pending_predictions = pending_predictions
+
+    def get_state(self) -> dict[str, np.ndarray]:
+        return {
+            "symbols": np.array(self.symbols, dtype=str),
+            "settings": np.array([self.decay, self.max_residual], dtype=np.float64),
+            "histograms": self.histograms,
+            "pending_dates": self.pending_dates.to_numpy(dtype="datetime64[ns]"),
+            "pending_predictions": self.pending_predictions,
+        }
+
+    def save(self, path: Path):
+        np.savez_compressed(path, **self.get_state())
+
+    def load(self, path: Path):
+        """
+        Loads the residuals and pending predictions saved by save. The coverage
+        is not saved, so it can change between runs.
+        """
+        with np.load(path) as state:
+            self.symbols = state["symbols"].tolist()
+            self.decay, self.max_residual = state["settings"].tolist()
+            self.histograms = state["histograms"]
+            self.pending_dates = pd.DatetimeIndex(state["pending_dates"])
+            self.pending_predictions = state["pending_predictions"]
+
+        self.n_steps_predict, self.n_bins = self.histograms.shape[1:]
+
+
+def calibrate_intervals(
+    predictions: Union[np.ndarray, TensorStore],
+    actuals: Union[np.ndarray, TensorStore],
+    symbols: Sequence[str],
+    chunk_size: int = 256,
+    **kwargs,
+) -> ConformalIntervals:
+    """
+    Computes the intervals from the residuals of a walk-forward backtest.
+
+    Parameters
+    ----------
+    predictions, actuals : np.ndarray or TensorStore
+        The predicted and actual cumulative returns of the backtest, of shape
+        (n_origins, n_symbols, n_steps_predict), read chunk_size origins at a time.
+    symbols : Sequence[str]
+        The symbols of the second axis of the arrays.
+    chunk_size : int, optional
+        The number of origins read at a time. Default is 256.
+    **kwargs
+        The other arguments of ConformalIntervals.
+
+    Returns
+    -------
+    ConformalIntervals
+        The intervals with the residuals of all the origins.
+    """
+    intervals = ConformalIntervals(symbols, predictions.shape[2], **kwargs)
+    for chunk_start in range(0, predictions.shape[0], chunk_size):
+        chunk = slice(chunk_start, chunk_start + chunk_size)
+        intervals.update(np.asarray(predictions[chunk]), np.asarray(actuals[chunk]))
+
+    return intervals
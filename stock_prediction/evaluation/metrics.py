@@ -0,0 +1,462 @@
+"""
+Metrics of predicted cumulative returns, computed from the prediction and actual
+arrays of shape (n_origins, n_symbols, n_steps_predict), without plotting.
+
+MetricsAccumulator computes them in a streaming way: chunks of origins are added
+one at a time, and only sums and histograms of the errors are kept, so the metrics
+of backtests larger than memory can be computed from chunks read one by one (and
+the accumulators of parallel chunks can be merged). The metrics are the mean
+absolute error (mae), the mean absolute percentage error (mape), the directional
+accuracy and quantiles of the relative errors, per symbol, horizon and period.
+"""
+import warnings
+from typing import Optional, Sequence
+
+import numpy as np
+import pandas as pd
+
+from stock_prediction.helpers.logging.log_config import get_logger
+
+logger = get_logger()
+
+METRIC_NAMES = ("mae", "mape", "directional_accuracy")
+SUM_NAMES = ("count", "absolute_error", "absolute_percentage_error", "direction_hits")
+GROUPINGS = ("overall", "symbol", "horizon", "symbol_horizon", "period")
+
+
+def get_error_arrays(
+    predictions: np.ndarray, actuals: np.ndarray
+) -> dict[str, np.ndarray]:
+    """
+    Gets the element-wise errors of predicted cumulative returns.
+
+    Parameters
+    ----------
+    predictions, actuals : np.ndarray
+        The predicted and actual cumulative returns, of shape
+        (n_origins, n_symbols, n_steps_predict).
+
+    Returns
+    -------
+    dict[str, np.ndarray]
+        The arrays in SUM_NAMES, with the shape of the predictions. The errors of
+        missing predictions or actuals are 0 and are not counted.
+    """
+    is_valid = np.isfinite(predictions) & np.isfinite(actuals)
+    actuals = np.where(is_valid, actuals, 1.0)
+    absolute_errors = np.where(is_valid, np.abs(predictions - actuals), 0.0)
+
+    return {
+        "count": is_valid.astype(np.float64),
+        "absolute_error": absolute_errors,
+        "absolute_percentage_error": absolute_errors / actuals,
+        "direction_hits": (
+            is_valid & (np.sign(predictions - 1) == np.sign(actuals - 1))
+        ).astype(np.float64),
+    }
+
+
+def get_origin_errors(predictions: np.ndarray, actuals: np.ndarray) -> np.ndarray:
+    """
+    Gets the mean percentage error over the horizons of each origin and symbol.
+
+    Returns
+    -------
+    np.ndarray
+        The errors of shape (n_origins, n_symbols), NaN if any horizon is missing.
+    """
+    return np.mean(np.abs(actuals - predictions) / actuals, axis=2)
+
+
+def summarize_origin_errors(origin_errors: np.ndarray) -> pd.Series:
+    """
+    Summarizes the errors of each origin and symbol, ignoring the missing ones.
+
+    Parameters
+    ----------
+    origin_errors : np.ndarray
+        The errors of shape (n_origins, n_symbols), see get_origin_errors.
+
+    Returns
+    -------
+    pd.Series
+        The median and mean over the symbols of the median error of each symbol,
+        and the mean over the symbols of the mean error of each symbol.
+    """
+    # All-NaN symbols have NaN errors, which warns
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", RuntimeWarning)
+        median_errors = np.nanmedian(origin_errors, axis=0)
+        mean_errors = np.nanmean(origin_errors, axis=0)
+
+        return pd.Series(
+            {
+                "Median of Median Errors": np.nanmedian(median_errors),
+                "Mean of Median Errors": np.nanmean(median_errors),
+                "Mean of Mean Errors": np.nanmean(mean_errors),
+            }
+        )
+
+
+def search_sorted_rows(
+    sorted_rows: np.ndarray, values: np.ndarray, max_block_size: int = 2**22
+) -> np.ndarray:
+    """
+    Finds the number of elements of each sorted row below each of its values.
+
+    The rows are offset to disjoint ranges and flattened, so that a single
+    np.searchsorted call searches a block of rows, instead of comparing every
+    value with every element of its row.
+
+    Parameters
+    ----------
+    sorted_rows : np.ndarray
+        The rows of shape (n_rows, n_columns), sorted in ascending order.
+    values : np.ndarray
+        The values searched in each row, of shape (n_rows, n_values).
+    max_block_size : int, optional
+        The maximum number of elements of the offset rows searched at once, which
+        bounds the memory of their copy. Default is 2**22.
+
+    Returns
+    -------
+    np.ndarray
+        The number of elements of each row strictly below each value, of shape
+        (n_rows, n_values), as (sorted_rows[:, None, :] < values[..., None]).sum(-1).
+    """
+    n_rows, n_columns = sorted_rows.shape
+    positions = np.zeros(values.shape, dtype=np.int64)
+    if sorted_rows.size == 0 or values.size == 0:
+        return positions
+
+    # The values beyond the rows, or NaN (below no element), are clipped to
+    # [-m, m], so that the row r of a block covers [r * scale - m, r * scale + m].
+    # The integer offsets keep the comparisons of integer counts exact
+    magnitude = np.ceil(max(-sorted_rows.min(), sorted_rows.max())) + 1
+    values = np.clip(np.nan_to_num(values, nan=-np.inf), -magnitude, magnitude)
+    n_block_rows = max(1, max_block_size // n_columns)
+    for block_start in range(0, n_rows, n_block_rows):
+        block = slice(block_start, block_start + n_block_rows)
+        n_rows_block = len(sorted_rows[block])
+        offsets = np.arange(n_rows_block, dtype=np.float64)[:, np.newaxis] * (
+            2 * magnitude + 1
+        )
+        positions[block] = np.searchsorted(
+            (sorted_rows[block] + offsets).ravel(),
+            (values[block] + offsets).ravel(),
+            side="left",
+        ).reshape(n_rows_block, -1) - (
+            np.arange(n_rows_block)[:, np.newaxis] * n_columns
+        )
+
+    return positions
+
+
+def get_histogram_quantiles(
+    histograms: np.ndarray, quantiles: np.ndarray, bin_edges: np.ndarray
+) -> np.ndarray:
+    """
+    Estimates quantiles from histograms with the same bins.
+
+    Parameters
+    ----------
+    histograms : np.ndarray
+        The counts, or weights, of each bin in the last axis, of shape
+        (..., n_bins).
+    quantiles : np.ndarray
+        The quantiles to estimate, broadcastable to (..., n_quantiles), e.g. of
+        shape (n_quantiles,) for the same quantiles of all the histograms.
+    bin_edges : np.ndarray
+        The edges of the bins, of shape (n_bins + 1,).
+
+    Returns
+    -------
+    np.ndarray
+        The quantiles of shape (..., n_quantiles), interpolated linearly within the
+        bins. NaN if a histogram is empty.
+    """
+    n_bins = histograms.shape[-1]
+    cumulative_counts = np.cumsum(histograms, axis=-1)
+    n_errors = cumulative_counts[..., -1:]
+    targets = quantiles * n_errors
+    targets = np.broadcast_to(targets, histograms.shape[:-1] + targets.shape[-1:])
+
+    # Bin of each quantile and the fraction of its counts below the quantile
+    i_bins = np.minimum(
+        search_sorted_rows(
+            cumulative_counts.reshape(-1, n_bins),
+            targets.reshape(-1, targets.shape[-1]),
+        ).reshape(targets.shape),
+        n_bins - 1,
+    )
+    counts_below = np.where(
+        i_bins > 0,
+        np.take_along_axis(cumulative_counts, np.maximum(i_bins - 1, 0), axis=-1),
+        0,
+    )
+    counts_bin = np.take_along_axis(histograms, i_bins, axis=-1)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        fractions = np.clip((targets - counts_below) / counts_bin, 0.0, 1.0)
+
+    quantiles = bin_edges[i_bins] + np.nan_to_num(fractions) * (
+        bin_edges[1] - bin_edges[0]
+    )
+    return np.where(n_errors > 0, quantiles, np.nan)
+
+
+class MetricsAccumulator:
+    def __init__(
+        self,
+        symbols: Sequence[str],
+        n_steps_predict: int,
+        quantiles: Sequence[float] = (0.05, 0.25, 0.5, 0.75, 0.95),
+        n_bins: int = 1000,
+        max_relative_error: float = 0.5,
+    ):
+        """
+        Initialize the accumulator.
+
+        Parameters
+        ----------
+        symbols : Sequence[str]
+            The symbols of the second axis of the arrays.
+        n_steps_predict : int
+            The number of horizons of the third axis of the arrays.
+        quantiles : Sequence[float], optional
+            The quantiles of the relative errors (predictions / actuals - 1) of the
+            error bands. Default is (0.05, 0.25, 0.5, 0.75, 0.95).
+        n_bins : int, optional
+            The number of bins of the histograms the quantiles are estimated from.
+            Default is 1000.
+        max_relative_error : float, optional
+            The histograms cover the relative errors from -max_relative_error to
+            max_relative_error, larger errors are counted in the first or last bin.
+            Default is 0.5, so the quantiles are exact to 0.001.
+
+        Attributes
+        ----------
+        periods : list
+            The periods seen so far, in order of appearance.
+        sums : dict[str, np.ndarray]
+            The sums of the arrays in SUM_NAMES per period, symbol and horizon, of
+            shape (n_periods, n_symbols, n_steps_predict).
+        histograms : np.ndarray
+            The counts of the relative errors per symbol, horizon and bin.
+        """
+        self.symbols = list(symbols)
+        self.n_steps_predict = n_steps_predict
+        self.quantiles = list(quantiles)
+        self.n_bins = n_bins
+        self.max_relative_error = max_relative_error
+        self.periods: list = []
+        self.sums = {
+            name: np.zeros((0, len(self.symbols), n_steps_predict))
+            for name in SUM_NAMES
+        }
+        # 32 bits count up to 2**31 origins per bin, and halve the memory of the
+        # histograms of many symbols
+        self.histograms = np.zeros(
+            (len(self.symbols), n_steps_predict, n_bins), dtype=np.int32
+        )
+
+    @property
+    def bin_edges(self) -> np.ndarray:
+        return np.linspace(
+            -self.max_relative_error, self.max_relative_error, self.n_bins + 1
+        )
+
+    def get_period_codes(self, periods: Sequence) -> np.ndarray:
+        codes, uniques = pd.factorize(pd.Index(periods))
+        new_periods = [period for period in uniques if period not in self.periods]
+        if new_periods:
+            self.periods.extend(new_periods)
+            self.sums = {
+                name: np.concatenate(
+                    [sums, np.zeros((len(new_periods),) + sums.shape[1:])]
+                )
+                for name, sums in self.sums.items()
+            }
+
+        return pd.Index(self.periods).get_indexer(uniques)[codes]
+
+    def update(
+        self,
+        predictions: np.ndarray,
+        actuals: np.ndarray,
+        periods: Optional[Sequence] = None,
+    ):
+        """
+        Adds a chunk of origins to the metrics.
+
+        Parameters
+        ----------
+        predictions, actuals : np.ndarray
+            The predicted and actual cumulative returns of the chunk, of shape
+            (n_origins, n_symbols, n_steps_predict).
+        periods : Sequence, optional
+            The period of each origin, e.g. its year or month. If None, all the
+            origins belong to a single period "all".
+        """
+        n_origins = predictions.shape[0]
+        if periods is None:
+            periods = ["all"] * n_origins
+        codes = self.get_period_codes(periods)
+
+        # Sum the origins of each period with a matrix product with their one-hot
+        # encoding, which is much faster than np.add.at
+        one_hot = np.zeros((len(self.periods), n_origins))
+        one_hot[codes, np.arange(n_origins)] = 1.0
+        errors = get_error_arrays(predictions, actuals)
+        for name, values in errors.items():
+            self.sums[name] += (one_hot @ values.reshape(n_origins, -1)).reshape(
+                self.sums[name].shape
+            )
+
+        with np.errstate(invalid="ignore", divide="ignore"):
+            relative_errors = predictions / actuals - 1
+        is_valid = errors["count"].astype(bool) & np.isfinite(relative_errors)
+        bins = np.clip(
+            np.floor(
+                (relative_errors[is_valid] + self.max_relative_error)
+                / (2 * self.max_relative_error)
+                * self.n_bins
+            ).astype(np.int64),
+            0,
+            self.n_bins - 1,
+        )
+        _, i_symbol, i_horizon = np.nonzero(is_valid)
+        # Count in place in the flat view, without a dense array of all the bins.
+        # A count of the dtype of the histograms keeps np.add.at on its fast path
+        np.add.at(
+            self.histograms.reshape(-1),
+            (i_symbol * self.n_steps_predict + i_horizon) * self.n_bins + bins,
+            self.histograms.dtype.type(1),
+        )
+
+    def merge(self, other: "MetricsAccumulator"):
+        """
+        Adds the chunks of another accumulator with the same settings.
+        """
+        for i_other, period in enumerate(other.periods):
+            i_period = self.get_period_codes([period])[0]
+            for name in SUM_NAMES:
+                self.sums[name][i_period] += other.sums[name][i_other]
+        self.histograms += other.histograms
+
+    def get_metrics(self, by: str = "symbol") -> pd.DataFrame:
+        """
+        Gets the metrics of the chunks added so far.
+
+        Parameters
+        ----------
+        by : str, optional
+            The grouping of the metrics, one of GROUPINGS. Default is "symbol".
+
+        Returns
+        -------
+        pd.DataFrame
+            The metrics in METRIC_NAMES and the number of predictions (count) of
+            each group.
+        """
+        if by not in GROUPINGS:
+            raise ValueError(f"Unknown grouping {by}, expected one of {GROUPINGS}.")
+
+        # Axes (period, symbol, horizon) summed over by each grouping
+        sum_axes = {
+            "overall": (0, 1, 2),
+            "symbol": (0, 2),
+            "horizon": (0, 1),
+            "symbol_horizon": (0,),
+            "period": (1, 2),
+        }[by]
+        sums = {name: values.sum(axis=sum_axes) for name, values in self.sums.items()}
+
+        with np.errstate(invalid="ignore", divide="ignore"):
+            metrics = {
+                "mae": sums["absolute_error"] / sums["count"],
+                "mape": sums["absolute_percentage_error"] / sums["count"],
+                "directional_accuracy": sums["direction_hits"] / sums["count"],
+                "count": sums["count"].astype(np.int64),
+            }
+
+        if by == "overall":
+            return pd.DataFrame(metrics, index=pd.Index(["overall"]))
+        if by == "symbol_horizon":
+            return pd.DataFrame(
+                {name: values.ravel() for name, values in metrics.items()},
+                index=self.get_symbol_horizon_index(),
+            )
+        index = {
+            "symbol": pd.Index(self.symbols, name="symbol"),
+            "horizon": pd.RangeIndex(1, self.n_steps_predict + 1, name="horizon"),
+            "period": pd.Index(self.periods, name="period"),
+        }[by]
+        return pd.DataFrame(metrics, index=index)
+
+    def get_symbol_horizon_index(self) -> pd.MultiIndex:
+        return pd.MultiIndex.from_product(
+            [self.symbols, range(1, self.n_steps_predict + 1)],
+            names=["symbol", "horizon"],
+        )
+
+    def get_error_quantiles(self) -> np.ndarray:
+        """
+        Estimates the quantiles of the relative errors from the histograms.
+
+        Returns
+        -------
+        np.ndarray
+            The quantiles of shape (n_symbols, n_steps_predict, n_quantiles),
+            interpolated linearly within the bins. NaN if there are no errors.
+        """
+        return get_histogram_quantiles(
+            self.histograms, np.asarray(self.quantiles), self.bin_edges
+        )
+
+    def get_error_bands(self) -> pd.DataFrame:
+        """
+        Gets the quantiles of the relative errors of each symbol and horizon.
+
+        Returns
+        -------
+        pd.DataFrame
+            One column per quantile, indexed by symbol and horizon.
+        """
+        return pd.DataFrame(
+            self.get_error_quantiles().reshape(-1, len(self.quantiles)),
+            index=self.get_symbol_horizon_index(),
+            columns=[f"q{quantile:g}" for quantile in self.quantiles],
+        )
+
+
+def compute_metrics(
+    predictions: np.ndarray,
+    actuals: np.ndarray,
+    symbols: Sequence[str],
+    periods: Optional[Sequence] = None,
+    **kwargs,
+) -> MetricsAccumulator:
+    """
+    Computes the metrics of in-memory prediction and actual arrays.
+
+    Parameters
+    ----------
+    predictions, actuals : np.ndarray
+        The predicted and actual cumulative returns, of shape
+        (n_origins, n_symbols, n_steps_predict).
+    symbols : Sequence[str]
+        The symbols of the second axis of the arrays.
+    periods : Sequence, optional
+        The period of each origin, see MetricsAccumulator.update.
+    **kwargs
+        The other arguments of MetricsAccumulator.
+
+    Returns
+    -------
+    MetricsAccumulator
+        The accumulator with the metrics of all the origins.
+    """
+    accumulator = MetricsAccumulator(symbols, predictions.shape[2], **kwargs)
+    accumulator.update(predictions, actuals, periods)
+
+    return accumulator
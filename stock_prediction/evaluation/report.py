@@ -0,0 +1,441 @@
+"""
+Headless generation of evaluation reports for the whole universe of symbols.
+
+The report is a static bundle: an index.html page with the aggregate figures and
+the table of metrics per symbol, and one png figure per symbol with the same plots
+as summary_analysis (predictions at a few horizons, predicted and actual returns,
+and the band of mean percentage errors around the price). The figures are drawn
+with matplotlib's non-interactive Agg canvas, in parallel worker processes. Each
+worker draws all its symbols on a single figure, whose lines are updated for every
+symbol instead of creating a new figure.
+
+The inputs of every symbol are hashed, and a manifest of the hashes is kept in the
+bundle, so that the figures of the symbols whose inputs did not change since the
+last report are not drawn again, e.g. when a nightly report only adds a few
+symbols.
+"""
+import argparse
+import hashlib
+import html
+import json
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Optional, Sequence, Union
+
+import numpy as np
+import pandas as pd
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.figure import Figure
+
+from stock_prediction.evaluation.metrics import MetricsAccumulator, get_origin_errors
+from stock_prediction.evaluation.tensor_store import TensorStore
+from stock_prediction.helpers.logging.log_config import get_logger
+
+logger = get_logger()
+
+# Changes of the figures must change it, so that all the symbols are drawn again
+REPORT_VERSION = "1"
+
+MANIFEST_FILE = "manifest.json"
+SYMBOLS_DIR = "symbols"
+DEFAULT_BATCH_SIZE = 32
+
+# Figure of the symbols drawn by a worker process, reused for all of them
+_symbol_figure: Optional["SymbolFigure"] = None
+
+
+class SymbolFigure:
+    def __init__(
+        self, positions: Sequence[int], figsize: tuple = (12, 10), dpi: int = 80
+    ):
+        """
+        Initialize the figure of a symbol, with its lines but no data.
+
+        Parameters
+        ----------
+        positions : Sequence[int]
+            The positions of the horizons whose predictions are plotted, as in
+            summary_analysis.
+        figsize : tuple, optional
+            The size of the figure in inches. Default is (12, 10).
+        dpi : int, optional
+            The resolution of the figure. Default is 80.
+        """
+        self.positions = list(positions)
+        self.figsize = tuple(figsize)
+        self.dpi = dpi
+        self.figure = Figure(figsize=figsize, dpi=dpi, layout="constrained")
+        FigureCanvasAgg(self.figure)
+        self.axes = self.figure.subplots(3, 1, sharex=True)
+
+        ax_prices, ax_returns, ax_band = self.axes
+        self.prediction_lines = [
+            ax_prices.plot([], [], label=f"Prediction (n = {pos})")[0]
+            for pos in self.positions
+        ]
+        self.price_line = ax_prices.plot([], [], color="black", label="Actual")[0]
+        ax_prices.set_ylabel("Cumulative Return")
+
+        self.predicted_return_line = ax_returns.plot([], [], label="Prediction")[0]
+        self.actual_return_line = ax_returns.plot([], [], label="Actual")[0]
+        ax_returns.set_ylabel(f"Return at n = {self.positions[-1]}")
+
+        self.band_price_line = ax_band.plot([], [], color="black", label="Actual")[0]
+        self.band = None
+        ax_band.set_ylabel("Price with MAPE band")
+        ax_band.set_xlabel("Date")
+
+        for ax in self.axes:
+            ax.legend(loc="upper left")
+
+    def update(
+        self,
+        symbol: str,
+        dates: pd.Index,
+        prices: np.ndarray,
+        predictions: np.ndarray,
+        actuals: np.ndarray,
+    ):
+        """
+        Draws the data of a symbol on the lines of the figure.
+
+        Parameters
+        ----------
+        symbol : str
+            The symbol, used in the title.
+        dates : pd.Index
+            The dates of the origins.
+        prices : np.ndarray
+            The cumulative returns of the symbol at the origins.
+        predictions, actuals : np.ndarray
+            The predicted and actual cumulative returns of the symbol, of shape
+            (n_origins, n_steps_predict).
+        """
+        for line, pos in zip(self.prediction_lines, self.positions):
+            # The price predicted pos steps after each origin, at its date
+            predicted_prices = np.full(len(prices), np.nan)
+            predicted_prices[pos:] = (prices * predictions[:, pos])[: len(prices) - pos]
+            line.set_data(dates, predicted_prices)
+        self.price_line.set_data(dates, prices)
+
+        self.predicted_return_line.set_data(dates, predictions[:, -1] - 1)
+        self.actual_return_line.set_data(dates, actuals[:, -1] - 1)
+
+        errors = get_origin_errors(predictions[:, np.newaxis], actuals[:, np.newaxis])
+        band_width = errors[:, 0] * prices
+        self.band_price_line.set_data(dates, prices)
+        if self.band is not None:
+            self.band.remove()
+        self.band = self.axes[2].fill_between(
+            dates, prices - band_width, prices + band_width, alpha=0.5, color="C0"
+        )
+
+        for ax in self.axes:
+            ax.relim()
+            ax.autoscale_view()
+        self.figure.suptitle(symbol)
+
+    def save(self, path: Path):
+        self.figure.savefig(path)
+
+
+def get_symbol_hash(*arrays: np.ndarray, settings: Optional[dict] = None) -> str:
+    """
+    Hashes the inputs of the figure of a symbol.
+    """
+    digest = hashlib.blake2b(digest_size=16)
+    digest.update(json.dumps([REPORT_VERSION, settings], sort_keys=True).encode())
+    for array in arrays:
+        array = np.ascontiguousarray(array)
+        digest.update(str((array.dtype.str, array.shape)).encode())
+        digest.update(array.tobytes())
+
+    return digest.hexdigest()
+
+
+def _render_symbols(
+    symbol_inputs: list[tuple[str, np.ndarray, np.ndarray, np.ndarray]],
+    dates: pd.Index,
+    output_dir: Path,
+    positions: list[int],
+    figsize: tuple,
+    dpi: int,
+) -> list[str]:
+    global _symbol_figure
+    if _symbol_figure is None or (
+        _symbol_figure.positions,
+        _symbol_figure.figsize,
+        _symbol_figure.dpi,
+    ) != (positions, tuple(figsize), dpi):
+        _symbol_figure = SymbolFigure(positions, figsize=figsize, dpi=dpi)
+
+    for symbol, prices, predictions, actuals in symbol_inputs:
+        _symbol_figure.update(symbol, dates, prices, predictions, actuals)
+        _symbol_figure.save(output_dir / SYMBOLS_DIR / f"{symbol}.png")
+
+    return [symbol for symbol, *_ in symbol_inputs]
+
+
+class ReportGenerator:
+    def __init__(
+        self,
+        output_dir: Path,
+        n_jobs: int = 1,
+        batch_size: Optional[int] = None,
+        figsize: tuple = (12, 10),
+        dpi: int = 80,
+    ):
+        """
+        Initialize the report generator.
+
+        Parameters
+        ----------
+        output_dir : Path
+            The directory of the report bundle. The figures of a previous report in
+            it are reused when their inputs did not change.
+        n_jobs : int, optional
+            The number of worker processes drawing the symbols. If 1, they are
+            drawn in the current process. Default is 1.
+        batch_size : int, optional
+            The number of symbols read and drawn together. If None, the
+            chunk_symbols of the predictions if they are a TensorStore, so that
+            each chunk is read once, and 32 otherwise. Default is None.
+        figsize : tuple, optional
+            The size of the figures in inches. Default is (12, 10).
+        dpi : int, optional
+            The resolution of the figures. Default is 80.
+        """
+        self.output_dir = Path(output_dir)
+        self.n_jobs = n_jobs
+        self.batch_size = batch_size
+        self.figsize = figsize
+        self.dpi = dpi
+
+    def load_manifest(self) -> dict[str, str]:
+        manifest_path = self.output_dir / MANIFEST_FILE
+        if not manifest_path.exists():
+            return {}
+        with open(manifest_path) as f:
+            return json.load(f)
+
+    def save_manifest(self, manifest: dict[str, str]):
+        with open(self.output_dir / MANIFEST_FILE, "w") as f:
+            json.dump(manifest, f, indent=2, sort_keys=True)
+
+    def generate(
+        self,
+        df: pd.DataFrame,
+        predictions: Union[np.ndarray, TensorStore],
+        actuals: Union[np.ndarray, TensorStore],
+        index_start: int,
+        index_end: int,
+        title: str = "Evaluation report",
+    ) -> Path:
+        """
+        Generates the report of predictions and actuals.
+
+        Parameters
+        ----------
+        df : pd.DataFrame
+            The dataframe of returns the predictions were made on.
+        predictions, actuals : np.ndarray or TensorStore
+            The predicted and actual cumulative returns of the origins index_start
+            to index_end - 1, of shape (n_origins, df.shape[1], n_steps_predict).
+            They are read one batch of symbols at a time.
+        index_start, index_end : int
+            The range of origins.
+        title : str, optional
+            The title of the report. Default is "Evaluation report".
+
+        Returns
+        -------
+        Path
+            The path of the index.html page of the report.
+        """
+        (self.output_dir / SYMBOLS_DIR).mkdir(parents=True, exist_ok=True)
+        n_steps_predict = predictions.shape[2]
+        positions = sorted({1, n_steps_predict // 2, n_steps_predict - 1})
+        dates = df.index[index_start:index_end]
+        df_prices = (1 + df).cumprod().iloc[index_start:index_end]
+        settings = dict(positions=positions, figsize=self.figsize, dpi=self.dpi)
+        date_values = np.asarray(dates.astype(str), dtype=str)
+
+        batch_size = self.batch_size
+        if batch_size is None:
+            batch_size = (
+                predictions.chunk_symbols
+                if isinstance(predictions, TensorStore)
+                else DEFAULT_BATCH_SIZE
+            )
+
+        old_manifest = self.load_manifest()
+        manifest = {}
+        batches = []
+        median_errors = {}
+        for batch_start in range(0, df.shape[1], batch_size):
+            batch = slice(batch_start, batch_start + batch_size)
+            batch_predictions = np.asarray(predictions[:, batch])
+            batch_actuals = np.asarray(actuals[:, batch])
+
+            symbol_inputs = []
+            for i, symbol in enumerate(df.columns[batch]):
+                inputs = (
+                    df_prices[symbol].to_numpy(),
+                    batch_predictions[:, i],
+                    batch_actuals[:, i],
+                )
+                errors = get_origin_errors(
+                    inputs[1][:, np.newaxis], inputs[2][:, np.newaxis]
+                )
+                median_errors[symbol] = (
+                    np.nanmedian(errors) if np.isfinite(errors).any() else np.nan
+                )
+
+                manifest[symbol] = get_symbol_hash(
+                    date_values, *inputs, settings=settings
+                )
+                figure_path = self.output_dir / SYMBOLS_DIR / f"{symbol}.png"
+                if (
+                    old_manifest.get(symbol) != manifest[symbol]
+                    or not figure_path.exists()
+                ):
+                    symbol_inputs.append((symbol,) + inputs)
+            if symbol_inputs:
+                batches.append(symbol_inputs)
+
+        n_drawn = sum(len(batch) for batch in batches)
+        logger.info(
+            f"Drawing {n_drawn} symbols, {df.shape[1] - n_drawn} are unchanged."
+        )
+        render_args = (dates, self.output_dir, positions, self.figsize, self.dpi)
+        if self.n_jobs == 1:
+            for symbol_inputs in batches:
+                _render_symbols(symbol_inputs, *render_args)
+        else:
+            with ProcessPoolExecutor(max_workers=self.n_jobs) as executor:
+                futures = [
+                    executor.submit(_render_symbols, symbol_inputs, *render_args)
+                    for symbol_inputs in batches
+                ]
+                for future in futures:
+                    future.result()
+        # Only record the hashes once the figures exist
+        self.save_manifest(manifest)
+
+        accumulator = MetricsAccumulator(df.columns, n_steps_predict)
+        periods = dates.year if isinstance(dates, pd.DatetimeIndex) else None
+        for chunk_start in range(0, index_end - index_start, 256):
+            chunk = slice(chunk_start, chunk_start + 256)
+            accumulator.update(
+                np.asarray(predictions[chunk]),
+                np.asarray(actuals[chunk]),
+                None if periods is None else periods[chunk],
+            )
+        self.save_aggregate_figures(accumulator, pd.Series(median_errors))
+
+        df_metrics = accumulator.get_metrics(by="symbol")
+        df_metrics["median_error"] = pd.Series(median_errors)
+        return self.write_html(title, accumulator, df_metrics)
+
+    def save_aggregate_figures(
+        self, accumulator: MetricsAccumulator, median_errors: pd.Series
+    ):
+        figure = Figure(figsize=self.figsize, dpi=self.dpi, layout="constrained")
+        FigureCanvasAgg(figure)
+        ax_histogram, ax_horizons, ax_periods = figure.subplots(3, 1)
+
+        ax_histogram.hist(median_errors.dropna(), bins=20)
+        ax_histogram.set_xlabel("Symbol Median Error")
+        ax_histogram.set_ylabel("Count")
+        ax_histogram.set_title("Histogram of Median Percent Prediction Errors")
+
+        df_horizons = accumulator.get_metrics(by="horizon")
+        ax_horizons.plot(df_horizons.index, df_horizons["mape"], marker="o")
+        ax_horizons.set_xlabel("Horizon")
+        ax_horizons.set_ylabel("MAPE")
+        ax_accuracy = ax_horizons.twinx()
+        ax_accuracy.plot(
+            df_horizons.index,
+            df_horizons["directional_accuracy"],
+            color="C1",
+            marker="s",
+        )
+        ax_accuracy.set_ylabel("Directional accuracy")
+
+        df_periods = accumulator.get_metrics(by="period")
+        ax_periods.bar(range(len(df_periods)), df_periods["mape"])
+        ax_periods.set_xticks(range(len(df_periods)), df_periods.index.astype(str))
+        ax_periods.set_xlabel("Period")
+        ax_periods.set_ylabel("MAPE")
+
+        figure.savefig(self.output_dir / "aggregate.png")
+
+    def write_html(
+        self, title: str, accumulator: MetricsAccumulator, df_metrics: pd.DataFrame
+    ) -> Path:
+        df_overall = accumulator.get_metrics(by="overall")
+        symbol_sections = "\n".join(
+            f'<h3 id="{html.escape(symbol)}">{html.escape(symbol)}</h3>\n'
+            f'<img src="{SYMBOLS_DIR}/{html.escape(symbol)}.png" loading="lazy">'
+            for symbol in df_metrics.index
+        )
+        page = f"""<!DOCTYPE html>
+<html>
+<head>
+<meta charset="utf-8">
+<title>{html.escape(title)}</title>
+<style>
+body {{ font-family: sans-serif; margin: 2em; }}
+table {{ border-collapse: collapse; }}
+td, th {{ padding: 0.2em 0.6em; text-align: right; }}
+img {{ max-width: 100%; }}
+</style>
+</head>
+<body>
+<h1>{html.escape(title)}</h1>
+{df_overall.to_html(float_format="{:.4f}".format)}
+<h2>Aggregate</h2>
+<img src="aggregate.png">
+<h2>Symbols</h2>
+{df_metrics.sort_values("mape").to_html(float_format="{:.4f}".format)}
+{symbol_sections}
+</body>
+</html>
+"""
+        index_path = self.output_dir / "index.html"
+        index_path.write_text(page)
+        logger.info(f"Report written to {index_path}")
+
+        return index_path
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Generates the evaluation report of stored backtest predictions"
+    )
+    parser.add_argument(
+        "--returns_csv", type=Path, required=True, help="Csv of the returns"
+    )
+    parser.add_argument(
+        "--predictions", type=Path, required=True, help="TensorStore of predictions"
+    )
+    parser.add_argument(
+        "--actuals", type=Path, required=True, help="TensorStore of actuals"
+    )
+    parser.add_argument(
+        "--index_start", type=int, required=True, help="Index of the first origin"
+    )
+    parser.add_argument("--output_dir", type=Path, default=Path("report"))
+    parser.add_argument("--n_jobs", type=int, default=1, help="Number of processes")
+
+    args = parser.parse_args()
+
+    df_returns = pd.read_csv(args.returns_csv, index_col="Date", parse_dates=True)
+    store_predictions = TensorStore(args.predictions)
+    ReportGenerator(args.output_dir, n_jobs=args.n_jobs).generate(
+        df_returns[store_predictions.symbols],
+        store_predictions,
+        TensorStore(args.actuals),
+        args.index_start,
+        args.index_start + store_predictions.shape[0],
+    )
@@ -0,0 +1,387 @@
+"""
+Chunked on-disk store of (origins x symbols x horizons) tensors, such as the
+predictions of a backtest and their actuals.
+
+A store is a directory with a json manifest (the shape, dtype, chunking, origin
+dates, symbols and free metadata such as the model configuration) and one file
+per chunk of origins and symbols, with all the horizons. The chunks are either npy
+files, which are memory mapped when read, or zlib compressed after shuffling the
+bytes of the values, which compresses floats much better. Reading a slice only
+reads the chunks it overlaps, so analyses can select a few symbols or horizons of
+tensors much larger than memory.
+
+Rows of origins are written through a buffer that only writes a chunk to disk once
+all its rows are set, so a store can be passed as the output array of a
+WalkForwardBacktest, whose folds finish in any order.
+"""
+import json
+import zlib
+from pathlib import Path
+from typing import Any, Optional, Sequence, Union
+
+import numpy as np
+import pandas as pd
+
+from stock_prediction.helpers.logging.log_config import get_logger
+
+logger = get_logger()
+
+COMPRESSIONS = ("none", "zlib")
+
+
+def shuffle_bytes(values: np.ndarray) -> bytes:
+    # Group the i-th bytes of all the values, e.g. the exponents of floats
+    return values.view(np.uint8).reshape(-1, values.itemsize).T.tobytes()
+
+
+def unshuffle_bytes(data: bytes, dtype: np.dtype, shape: tuple) -> np.ndarray:
+    itemsize = np.dtype(dtype).itemsize
+    return (
+        np.frombuffer(data, dtype=np.uint8)
+        .reshape(itemsize, -1)
+        .T.copy()
+        .view(dtype)
+        .reshape(shape)
+    )
+
+
+class TensorStore:
+    MANIFEST_FILE = "manifest.json"
+
+    def __init__(self, path: Union[str, Path]):
+        """
+        Opens an existing store.
+
+        Parameters
+        ----------
+        path : str or Path
+            The directory of the store, see create.
+
+        Attributes
+        ----------
+        shape : tuple[int, int, int]
+            The shape (n_origins, n_symbols, n_steps_predict) of the tensor.
+        symbols : list[str]
+            The symbols of the second axis.
+        dates : pd.Index or None
+            The dates of the origins, if any.
+        metadata : dict
+            The free metadata of the store, e.g. the model configuration.
+        """
+        self.path = Path(path)
+        with open(self.path / self.MANIFEST_FILE) as f:
+            manifest = json.load(f)
+
+        self.shape = tuple(manifest["shape"])
+        self.dtype = np.dtype(manifest["dtype"])
+        self.chunk_origins = manifest["chunk_origins"]
+        self.chunk_symbols = manifest["chunk_symbols"]
+        self.compression = manifest["compression"]
+        self.compression_level = manifest["compression_level"]
+        self.symbols = manifest["symbols"]
+        self.dates = (
+            None if manifest["dates"] is None else pd.to_datetime(manifest["dates"])
+        )
+        self.metadata = manifest["metadata"]
+
+        # Rows set of the origin chunks not written yet
+        self._buffers: dict[int, tuple[np.ndarray, np.ndarray]] = {}
+
+    @classmethod
+    def create(
+        cls,
+        path: Union[str, Path],
+        shape: tuple[int, int, int],
+        symbols: Optional[Sequence[str]] = None,
+        dates: Optional[Sequence] = None,
+        dtype: Any = np.float64,
+        chunk_origins: int = 256,
+        chunk_symbols: int = 256,
+        compression: str = "zlib",
+        compression_level: int = 1,
+        metadata: Optional[dict] = None,
+    ) -> "TensorStore":
+        """
+        Creates an empty store, in which every value is NaN until written.
+
+        Parameters
+        ----------
+        path : str or Path
+            The directory of the store, which must not contain a store already.
+        shape : tuple[int, int, int]
+            The shape (n_origins, n_symbols, n_steps_predict) of the tensor.
+        symbols : Sequence[str], optional
+            The symbols of the second axis. Default is their positions.
+        dates : Sequence, optional
+            The dates of the origins.
+        dtype : optional
+            The dtype of the values, e.g. np.float32 to halve the size of the store.
+            Default is np.float64.
+        chunk_origins, chunk_symbols : int, optional
+            The number of origins and symbols of each chunk. Default is 256.
+        compression : str, optional
+            One of COMPRESSIONS. With "none" the chunks are npy files that are
+            memory mapped when read. Default is "zlib".
+        compression_level : int, optional
+            The zlib compression level. Default is 1, which compresses almost as
+            much as the higher levels, much faster.
+        metadata : dict, optional
+            Any json serializable metadata, e.g. the model configuration.
+
+        Returns
+        -------
+        TensorStore
+            The opened store.
+        """
+        if compression not in COMPRESSIONS:
+            raise ValueError(
+                f"Unknown compression {compression}, expected one of {COMPRESSIONS}."
+            )
+        if symbols is not None and len(symbols) != shape[1]:
+            raise ValueError(f"Got {len(symbols)} symbols for {shape[1]} columns.")
+        if dates is not None and len(dates) != shape[0]:
+            raise ValueError(f"Got {len(dates)} dates for {shape[0]} origins.")
+
+        path = Path(path)
+        if (path / cls.MANIFEST_FILE).exists():
+            raise FileExistsError(f"There is already a store in {path}.")
+        path.mkdir(parents=True, exist_ok=True)
+
+        manifest = {
+            "shape": list(shape),
+            "dtype": np.dtype(dtype).str,
+            "chunk_origins": chunk_origins,
+            "chunk_symbols": chunk_symbols,
+            "compression": compression,
+            "compression_level": compression_level,
+            "symbols": (
+                [str(symbol) for symbol in symbols]
+                if symbols is not None
+                else [str(i) for i in range(shape[1])]
+            ),
+            "dates": (
+                None
+                if dates is None
+                else [str(date) for date in pd.to_datetime(pd.Index(dates))]
+            ),
+            "metadata": metadata or {},
+        }
+        with open(path / cls.MANIFEST_FILE, "w") as f:
+            json.dump(manifest, f, indent=2)
+
+        return cls(path)
+
+    @property
+    def ndim(self) -> int:
+        return 3
+
+    @property
+    def n_origin_chunks(self) -> int:
+        return -(-self.shape[0] // self.chunk_origins)
+
+    @property
+    def n_symbol_chunks(self) -> int:
+        return -(-self.shape[1] // self.chunk_symbols)
+
+    def __len__(self) -> int:
+        return self.shape[0]
+
+    def get_chunk_path(self, i_origins: int, i_symbols: int) -> Path:
+        suffix = ".npy" if self.compression == "none" else ".zlib"
+        return self.path / f"chunk_{i_origins}_{i_symbols}{suffix}"
+
+    def get_chunk_shape(self, i_origins: int, i_symbols: int) -> tuple[int, int, int]:
+        return (
+            min(self.chunk_origins, self.shape[0] - i_origins * self.chunk_origins),
+            min(self.chunk_symbols, self.shape[1] - i_symbols * self.chunk_symbols),
+            self.shape[2],
+        )
+
+    def write_chunk(self, i_origins: int, i_symbols: int, values: np.ndarray):
+        """
+        Writes a whole chunk.
+
+        Parameters
+        ----------
+        i_origins, i_symbols : int
+            The position of the chunk along the origins and symbols.
+        values : np.ndarray
+            The values of the chunk, of shape get_chunk_shape(i_origins, i_symbols).
+        """
+        chunk_shape = self.get_chunk_shape(i_origins, i_symbols)
+        if values.shape != chunk_shape:
+            raise ValueError(
+                f"Chunk ({i_origins}, {i_symbols}) has shape {chunk_shape}, got "
+                f"values of shape {values.shape}."
+            )
+
+        values = np.ascontiguousarray(values, dtype=self.dtype)
+        chunk_path = self.get_chunk_path(i_origins, i_symbols)
+        if self.compression == "none":
+            np.save(chunk_path, values)
+        else:
+            chunk_path.write_bytes(
+                zlib.compress(shuffle_bytes(values), self.compression_level)
+            )
+
+    def read_chunk(self, i_origins: int, i_symbols: int) -> np.ndarray:
+        """
+        Reads a whole chunk, all NaN if it was not written.
+
+        Returns
+        -------
+        np.ndarray
+            The values of the chunk, memory mapped if the store is not compressed.
+        """
+        chunk_shape = self.get_chunk_shape(i_origins, i_symbols)
+        chunk_path = self.get_chunk_path(i_origins, i_symbols)
+        if not chunk_path.exists():
+            return np.full(chunk_shape, np.nan, dtype=self.dtype)
+        if self.compression == "none":
+            return np.load(chunk_path, mmap_mode="r")
+
+        return unshuffle_bytes(
+            zlib.decompress(chunk_path.read_bytes()), self.dtype, chunk_shape
+        )
+
+    def __setitem__(self, key: slice, values: np.ndarray):
+        """
+        Sets rows of origins, for all the symbols and horizons.
+
+        The rows are buffered, and each chunk of origins is written once all its
+        rows are set, so that the chunks are written whole.
+
+        Parameters
+        ----------
+        key : slice
+            The contiguous rows of origins, with step 1.
+        values : np.ndarray
+            The values of shape (n_rows, n_symbols, n_steps_predict).
+        """
+        if not isinstance(key, slice) or key.step not in (None, 1):
+            raise TypeError("Only contiguous slices of origins can be set.")
+        origin_start, origin_end, _ = key.indices(self.shape[0])
+        values = np.broadcast_to(
+            values, (origin_end - origin_start,) + tuple(self.shape[1:])
+        )
+
+        for i_origins in range(
+            origin_start // self.chunk_origins,
+            -(-origin_end // self.chunk_origins),
+        ):
+            chunk_start = i_origins * self.chunk_origins
+            n_rows = self.get_chunk_shape(i_origins, 0)[0]
+            start = max(origin_start, chunk_start)
+            end = min(origin_end, chunk_start + n_rows)
+
+            if i_origins not in self._buffers:
+                self._buffers[i_origins] = (
+                    np.full((n_rows,) + tuple(self.shape[1:]), np.nan, self.dtype),
+                    np.zeros(n_rows, dtype=bool),
+                )
+            buffer, is_set = self._buffers[i_origins]
+            buffer[start - chunk_start : end - chunk_start] = values[
+                start - origin_start : end - origin_start
+            ]
+            is_set[start - chunk_start : end - chunk_start] = True
+
+            if is_set.all():
+                self.flush_origin_chunk(i_origins)
+
+    def flush_origin_chunk(self, i_origins: int):
+        buffer, _ = self._buffers.pop(i_origins)
+        for i_symbols in range(self.n_symbol_chunks):
+            self.write_chunk(
+                i_origins,
+                i_symbols,
+                buffer[
+                    :,
+                    i_symbols
+                    * self.chunk_symbols : (i_symbols + 1)
+                    * self.chunk_symbols,
+                ],
+            )
+
+    def flush(self):
+        """
+        Writes the chunks of origins whose rows are only partially set, with NaN
+        in the rows that are not set.
+        """
+        for i_origins in list(self._buffers):
+            self.flush_origin_chunk(i_origins)
+
+    def __getitem__(self, key) -> np.ndarray:
+        """
+        Reads a selection of the tensor, with numpy's basic and integer array
+        indexing of each axis, e.g. store[:, [3, 5], :5]. Only the chunks overlapping
+        the selection are read.
+
+        Returns
+        -------
+        np.ndarray
+            The selected values. As with np.ix_, the integer arrays of different
+            axes select their outer product.
+        """
+        if not isinstance(key, tuple):
+            key = (key,)
+        key = key + (slice(None),) * (self.ndim - len(key))
+
+        indices = [np.arange(n)[axis_key] for n, axis_key in zip(self.shape, key)]
+        is_scalar = [np.ndim(axis_indices) == 0 for axis_indices in indices]
+        origins, symbols, horizons = [np.atleast_1d(i) for i in indices]
+
+        values = np.empty((len(origins), len(symbols), len(horizons)), self.dtype)
+        origin_chunks = origins // self.chunk_origins
+        symbol_chunks = symbols // self.chunk_symbols
+        for i_origins in np.unique(origin_chunks):
+            origin_mask = origin_chunks == i_origins
+            for i_symbols in np.unique(symbol_chunks):
+                symbol_mask = symbol_chunks == i_symbols
+                chunk = self.read_chunk(i_origins, i_symbols)
+                values[np.ix_(origin_mask, symbol_mask)] = chunk[
+                    np.ix_(
+                        origins[origin_mask] - i_origins * self.chunk_origins,
+                        symbols[symbol_mask] - i_symbols * self.chunk_symbols,
+                        horizons,
+                    )
+                ]
+
+        return values[tuple(0 if scalar else slice(None) for scalar in is_scalar)]
+
+    def select(
+        self,
+        symbols: Optional[Sequence[str]] = None,
+        horizons: Optional[Sequence[int]] = None,
+        origins: slice = slice(None),
+    ) -> np.ndarray:
+        """
+        Reads the values of some symbols and horizons.
+
+        Parameters
+        ----------
+        symbols : Sequence[str], optional
+            The symbols to read. Default is all of them.
+        horizons : Sequence[int], optional
+            The horizons to read, starting at 1. Default is all of them.
+        origins : slice, optional
+            The origins to read. Default is all of them.
+
+        Returns
+        -------
+        np.ndarray
+            The values of shape (n_origins, len(symbols), len(horizons)).
+        """
+        symbol_indices = (
+            slice(None)
+            if symbols is None
+            else pd.Index(self.symbols).get_indexer(list(symbols))
+        )
+        if symbols is not None and (symbol_indices < 0).any():
+            raise KeyError(f"Unknown symbols in {symbols}.")
+        horizon_indices = slice(None) if horizons is None else np.asarray(horizons) - 1
+
+        return self[origins, symbol_indices, horizon_indices]
+
+    def __array__(self, dtype=None, copy=None) -> np.ndarray:
+        values = self[:]
+        return values if dtype is None else values.astype(dtype)
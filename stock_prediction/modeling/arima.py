@@ -1,9 +1,15 @@
-import copy
-from typing import Optional
+import json
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Optional, Union
 
 import numpy as np
 import pandas as pd
+from scipy.cluster.hierarchy import fcluster, linkage
+from scipy.spatial.distance import squareform
 from statsmodels.tsa.arima.model import ARIMA
+from statsmodels.tsa.statespace.mlemodel import MLEResults
 
 from stock_prediction.helpers.logging.log_config import get_logger
 from stock_prediction.modeling.forecast_model import ForecastModel
@@ -11,12 +17,350 @@ from stock_prediction.modeling.forecast_model import ForecastModel
 logger = get_logger()
 
 
+def get_system_matrices(representation) -> dict[str, np.ndarray]:
+    """
+    Gets the time invariant system matrices of a univariate state space model.
+
+    Parameters
+    ----------
+    representation
+        A statsmodels state space representation, or filter results.
+
+    Returns
+    -------
+    dict[str, np.ndarray]
+        The design (k_states,), obs_intercept and obs_cov (scalars), transition
+        (k_states, k_states), state_intercept (k_states, 1) and the covariance of
+        the state disturbances, "state_cov" = R Q R' (k_states, k_states).
+    """
+    matrices = {
+        name: getattr(representation, name)
+        for name in (
+            "design",
+            "obs_intercept",
+            "obs_cov",
+            "transition",
+            "state_intercept",
+            "selection",
+            "state_cov",
+        )
+    }
+    # A trend is stored as time varying intercepts, which must be constant (e.g.
+    # the "c" trend) to be extrapolated to the forecast steps
+    if any(not np.all(matrix == matrix[..., :1]) for matrix in matrices.values()):
+        raise NotImplementedError("Time varying system matrices are not supported.")
+
+    selection = matrices["selection"][:, :, 0]
+    return {
+        "design": matrices["design"][0, :, 0],
+        "obs_intercept": matrices["obs_intercept"][0, 0],
+        "obs_cov": matrices["obs_cov"][0, 0, 0],
+        "transition": matrices["transition"][:, :, 0],
+        "state_intercept": matrices["state_intercept"][:, :1],
+        "state_cov": selection @ matrices["state_cov"][:, :, 0] @ selection.T,
+    }
+
+
+def propagate_forecasts(
+    states: np.ndarray, matrices: dict[str, np.ndarray], n_steps_predict: int
+) -> np.ndarray:
+    """
+    Forecasts the steps after some predicted states.
+
+    Parameters
+    ----------
+    states : np.ndarray
+        The predicted states of the first forecast step, of shape
+        (k_states, n_origins).
+    matrices : dict[str, np.ndarray]
+        The system matrices, see get_system_matrices.
+    n_steps_predict : int
+        The number of steps ahead to forecast.
+
+    Returns
+    -------
+    np.ndarray
+        The cumulative returns forecast from each state, of shape
+        (n_origins, n_steps_predict).
+    """
+    forecasts = np.zeros((states.shape[1], n_steps_predict))
+    for step in range(n_steps_predict):
+        forecasts[:, step] = matrices["design"] @ states + matrices["obs_intercept"]
+        states = matrices["transition"] @ states + matrices["state_intercept"]
+
+    return np.cumprod(1 + forecasts, axis=1)
+
+
+def rolling_forecasts(
+    results: MLEResults, endog: np.ndarray, n_steps_predict: int
+) -> np.ndarray:
+    """
+    Forecasts after each new observation of a fitted state space model.
+
+    The Kalman filter is run once over the new observations with the fitted
+    parameters, which gives the predicted state of the next step after each of them.
+    The forecasts of all the horizons of all the origins are then propagated from
+    those states with the (time invariant) system matrices, instead of appending
+    each observation to the results and forecasting from a new results object.
+
+    Parameters
+    ----------
+    results : MLEResults
+        The fitted results, e.g. of an ARIMA model.
+    endog : np.ndarray
+        The new observations following the data of the results, one per origin.
+    n_steps_predict : int
+        The number of steps ahead to forecast.
+
+    Returns
+    -------
+    np.ndarray
+        The cumulative returns forecast after each new observation, of shape
+        (len(endog), n_steps_predict).
+    """
+    filter_results = results.extend(endog).filter_results
+
+    # Predicted state of the step after each new observation
+    return propagate_forecasts(
+        filter_results.predicted_state[:, 1:],
+        get_system_matrices(filter_results),
+        n_steps_predict,
+    )
+
+
+class CompactARIMA:
+    """
+    Lightweight forecaster holding only what a fitted ARIMA needs to forecast.
+
+    It stores the order, the parameters and the last predicted state (and its
+    covariance) of the Kalman filter, a few kilobytes instead of the training data
+    and filter output of the statsmodels results. The system matrices are rebuilt
+    from the parameters, and new observations are filtered with NumPy.
+    """
+
+    ARRAY_NAMES = ("order", "params", "state", "state_cov")
+
+    def __init__(
+        self,
+        order: tuple[int, int, int],
+        params: np.ndarray,
+        state: np.ndarray,
+        state_cov: np.ndarray,
+    ):
+        """
+        Initialize the compact ARIMA.
+
+        Parameters
+        ----------
+        order : tuple[int, int, int]
+            The (p, d, q) order of the ARIMA.
+        params : np.ndarray
+            The fitted parameters.
+        state : np.ndarray
+            The predicted state of the step after the last observation, of shape
+            (k_states,).
+        state_cov : np.ndarray
+            The covariance of the predicted state, of shape (k_states, k_states).
+        """
+        self.order = tuple(int(n) for n in order)
+        self.params = np.asarray(params, dtype=np.float64)
+        self.state = np.asarray(state, dtype=np.float64)
+        self.state_cov = np.asarray(state_cov, dtype=np.float64)
+
+        model = ARIMA(np.zeros(1), order=self.order)
+        model.update(self.params)
+        self.matrices = get_system_matrices(model.ssm)
+
+    @classmethod
+    def from_results(cls, results: MLEResults) -> "CompactARIMA":
+        return cls(
+            order=results.model.order,
+            params=results.params,
+            state=results.predicted_state[:, -1],
+            state_cov=results.predicted_state_cov[:, :, -1],
+        )
+
+    def to_arrays(self) -> dict[str, np.ndarray]:
+        return {
+            "order": np.array(self.order),
+            "params": self.params,
+            "state": self.state,
+            "state_cov": self.state_cov,
+        }
+
+    def filter(self, endog: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Runs the Kalman filter over new observations from the stored state.
+
+        Parameters
+        ----------
+        endog : np.ndarray
+            The new observations. Missing values only advance the state.
+
+        Returns
+        -------
+        tuple[np.ndarray, np.ndarray]
+            The predicted states of the step after each observation, of shape
+            (k_states, len(endog)), and the covariance of the last one.
+        """
+        design = self.matrices["design"]
+        transition = self.matrices["transition"]
+        state_intercept = self.matrices["state_intercept"][:, 0]
+
+        state, state_cov = self.state, self.state_cov
+        states = np.zeros((len(state), len(endog)))
+        for t, observation in enumerate(np.asarray(endog, dtype=np.float64)):
+            if np.isfinite(observation):
+                cov_design = state_cov @ design
+                forecast_cov = design @ cov_design + self.matrices["obs_cov"]
+                forecast_error = (
+                    observation - design @ state - self.matrices["obs_intercept"]
+                )
+                state = state + cov_design * forecast_error / forecast_cov
+                state_cov = state_cov - np.outer(cov_design, cov_design) / forecast_cov
+
+            state = transition @ state + state_intercept
+            state_cov = (
+                transition @ state_cov @ transition.T + self.matrices["state_cov"]
+            )
+            states[:, t] = state
+
+        return states, state_cov
+
+    def extend(self, endog: np.ndarray) -> "CompactARIMA":
+        """
+        Gets the compact ARIMA after new observations, with the same parameters.
+        """
+        states, state_cov = self.filter(endog)
+        if states.shape[1] == 0:
+            return self
+
+        return CompactARIMA(self.order, self.params, states[:, -1], state_cov)
+
+    def rolling_forecasts(self, endog: np.ndarray, n_steps_predict: int) -> np.ndarray:
+        """
+        Forecasts after each new observation, as rolling_forecasts.
+        """
+        states, _ = self.filter(endog)
+        return propagate_forecasts(states, self.matrices, n_steps_predict)
+
+
+INFORMATION_CRITERIA = ("aic", "bic", "hqic")
+
+
+class ARIMAFitTimeout(Exception):
+    """
+    Raised between the iterations of the optimization of an ARIMA once it exceeds
+    its time limit.
+    """
+
+
+def fit_arima_params(
+    endog: np.ndarray,
+    order: tuple[int, int, int],
+    start_params: Optional[np.ndarray] = None,
+    time_limit: Optional[float] = None,
+) -> tuple[np.ndarray, dict]:
+    """
+    Estimates the parameters of an ARIMA, falling back to its starting parameters.
+
+    Only the parameters are returned, so that the (large) results objects are never
+    sent back from the worker processes.
+
+    Parameters
+    ----------
+    endog : np.ndarray
+        The series to fit.
+    order : tuple[int, int, int]
+        The (p, d, q) order of the ARIMA.
+    start_params : np.ndarray, optional
+        The parameters the optimization starts from. If None, the default starting
+        parameters of the model are used.
+    time_limit : float, optional
+        The maximum number of seconds of the optimization. If exceeded, or if the
+        optimization fails, the starting parameters are returned. The limit is best
+        effort: it is only checked between the iterations of the optimizer, so a
+        slow iteration (or the setup of the model before the first one) can run
+        past it, and the fit is not interrupted.
+
+    Returns
+    -------
+    tuple[np.ndarray, dict]
+        The parameters and information about the fit ("converged", "timed_out",
+        "failed", "warm_start", "fit_time" and the INFORMATION_CRITERIA, which are
+        infinite if the fit did not finish).
+    """
+    time_start = time.perf_counter()
+    info = {
+        "converged": False,
+        "timed_out": False,
+        "failed": False,
+        "warm_start": start_params is not None,
+        **{criterion: np.inf for criterion in INFORMATION_CRITERIA},
+    }
+
+    def check_time_limit(params: np.ndarray):
+        if time.perf_counter() - time_start > time_limit:
+            raise ARIMAFitTimeout()
+
+    model = ARIMA(endog, order=order)
+    try:
+        results = model.fit(
+            start_params=start_params,
+            method_kwargs={"callback": check_time_limit}
+            if time_limit is not None
+            else None,
+            cov_type="none",
+            low_memory=True,
+        )
+        params = np.asarray(results.params)
+        info["converged"] = bool(results.mle_retvals.get("converged", False))
+        for criterion in INFORMATION_CRITERIA:
+            info[criterion] = float(getattr(results, criterion))
+    except ARIMAFitTimeout:
+        info["timed_out"] = True
+    except (np.linalg.LinAlgError, ValueError) as error:
+        logger.warning(f"ARIMA fit failed: {error}")
+        info["failed"] = True
+
+    if info["timed_out"] or info["failed"]:
+        params = np.asarray(
+            start_params if start_params is not None else model.start_params
+        )
+
+    info["fit_time"] = time.perf_counter() - time_start
+
+    return params, info
+
+
+def _fit_arima_params_star(args: tuple) -> tuple[np.ndarray, dict]:
+    return fit_arima_params(*args)
+
+
+def get_model_order(model: Union[MLEResults, CompactARIMA]) -> tuple[int, int, int]:
+    if isinstance(model, CompactARIMA):
+        return model.order
+
+    return tuple(model.model.order)
+
+
 class UnivariateARIMAs(ForecastModel):
+    WARM_START_STRATEGIES = ("previous", "centroid")
+
     def __init__(
         self,
         p: int = 20,
         d: int = 1,
         q: int = 20,
+        n_jobs: int = 1,
+        warm_start: Optional[str] = "previous",
+        n_clusters: int = 1,
+        time_limit: Optional[float] = None,
+        candidate_orders: Optional[list[tuple[int, int, int]]] = None,
+        information_criterion: str = "aic",
+        selection_time_limit: Optional[float] = None,
+        order_cache_path: Optional[Path] = None,
+        compact: bool = False,
     ):
 
         """
@@ -30,6 +374,42 @@ class UnivariateARIMAs(ForecastModel):
             The number of differencing terms. Default is 1.
         q : int, optional
             The number of moving average terms. Default is 20.
+        n_jobs : int, optional
+            The number of processes fitting the symbols. Default is 1.
+        warm_start : str, optional
+            How the optimization of each symbol is started. "previous" starts from
+            the parameters of the previous fit of the symbol (e.g. the previous
+            day's) and from the centroid parameters for symbols without one.
+            "centroid" starts from the parameters fit on the mean series of the
+            symbol's cluster. If None, the default starting parameters are used.
+            Default is "previous".
+        n_clusters : int, optional
+            The number of clusters of correlated symbols with their own centroid
+            parameters. Default is 1.
+        time_limit : float, optional
+            The maximum number of seconds of the fit of each symbol. A fit that
+            exceeds it keeps its starting parameters. It is a best effort limit,
+            checked between the optimizer iterations, see fit_arima_params. Default
+            is None (no limit).
+        candidate_orders : list[tuple[int, int, int]], optional
+            The (p, d, q) orders the order of each symbol is selected from. They
+            must all have the differencing order d, as the information criteria of
+            models of differenced and undifferenced series are not comparable. If
+            None, every symbol uses (p, d, q). The order of a symbol is only selected
+            once, and then reused (e.g. on the following days) while it is cached.
+        information_criterion : str, optional
+            The criterion of the order selection, one of INFORMATION_CRITERIA.
+            Default is "aic".
+        selection_time_limit : float, optional
+            The maximum number of seconds of the fit of each candidate order.
+            Candidates that exceed it are abandoned, with the same best effort
+            check as time_limit. Default is None (no limit).
+        order_cache_path : Path, optional
+            A JSON file where the order and parameters of each symbol are cached
+            across fits, e.g. between daily runs. Default is None (not cached).
+        compact : bool, optional
+            Whether to keep CompactARIMA models instead of the statsmodels results,
+            which hold the training data and filter output. Default is False.
 
         Attributes
         ----------
@@ -38,17 +418,164 @@ class UnivariateARIMAs(ForecastModel):
         q : int
             The number of moving average terms.
         models : dict
-            A dictionary of ARIMA models, keyed by symbol.
+            A dictionary of fitted ARIMA results (or CompactARIMA), keyed by symbol.
+        fit_info : dict
+            Information about the last fit of each symbol, see fit_arima_params.
+        orders : dict
+            The selected (or cached) order of each symbol.
         """
+        if warm_start is not None and warm_start not in self.WARM_START_STRATEGIES:
+            raise ValueError(
+                f"warm_start must be one of {self.WARM_START_STRATEGIES} or None."
+            )
+        if candidate_orders is not None and any(
+            order[1] != d for order in candidate_orders
+        ):
+            raise ValueError(
+                f"All the candidate orders must have the differencing order d={d}."
+            )
+        if information_criterion not in INFORMATION_CRITERIA:
+            raise ValueError(
+                f"information_criterion must be one of {INFORMATION_CRITERIA}."
+            )
+
         self.p = p
         self.d = d
         self.q = q
-        self.models: dict[str, ARIMA] = dict()
+        self.n_jobs = n_jobs
+        self.warm_start = warm_start
+        self.n_clusters = n_clusters
+        self.time_limit = time_limit
+        self.candidate_orders = (
+            [tuple(order) for order in candidate_orders]
+            if candidate_orders is not None
+            else None
+        )
+        self.information_criterion = information_criterion
+        self.selection_time_limit = selection_time_limit
+        self.order_cache_path = (
+            Path(order_cache_path) if order_cache_path is not None else None
+        )
+        self.compact = compact
+        self.models: dict[str, Union[MLEResults, CompactARIMA]] = dict()
+        self.fit_info: dict[str, dict] = dict()
+        self.orders: dict[str, tuple[int, int, int]] = dict()
+        # Parameters of the cached orders, used as warm starts
+        self.cached_params: dict[str, np.ndarray] = dict()
+
+    @property
+    def order(self) -> tuple[int, int, int]:
+        return (self.p, self.d, self.q)
+
+    def get_order(self, symbol: str) -> tuple[int, int, int]:
+        return self.orders.get(symbol, self.order)
+
+    def fit_params(
+        self,
+        endogs: list[np.ndarray],
+        start_params: list[Optional[np.ndarray]],
+        orders: list[tuple[int, int, int]],
+        time_limit: Optional[float],
+    ) -> list[tuple[np.ndarray, dict]]:
+        """
+        Estimates the parameters of several series, in a process pool if n_jobs > 1.
+        """
+        tasks = [
+            (endog, order, params, time_limit)
+            for endog, params, order in zip(endogs, start_params, orders)
+        ]
+        if self.n_jobs == 1 or len(tasks) <= 1:
+            return list(map(_fit_arima_params_star, tasks))
+
+        with ProcessPoolExecutor(max_workers=min(self.n_jobs, len(tasks))) as executor:
+            return list(executor.map(_fit_arima_params_star, tasks))
+
+    def cluster_symbols(self, df: pd.DataFrame) -> np.ndarray:
+        """
+        Clusters the symbols by the correlation of their series.
+
+        Returns
+        -------
+        np.ndarray
+            The cluster label, from 0 to at most n_clusters - 1, of each column.
+        """
+        n_clusters = min(self.n_clusters, df.shape[1])
+        if n_clusters <= 1:
+            return np.zeros(df.shape[1], dtype=int)
+
+        distances = 1 - df.corr().fillna(0).to_numpy()
+        np.fill_diagonal(distances, 0)
+        linkage_matrix = linkage(
+            squareform(distances, checks=False).clip(min=0), method="average"
+        )
+        return fcluster(linkage_matrix, n_clusters, criterion="maxclust") - 1
+
+    def get_centroid_params(self, df: pd.DataFrame) -> dict[str, np.ndarray]:
+        """
+        Fits the mean series of each cluster of symbols.
+
+        Returns
+        -------
+        dict[str, np.ndarray]
+            The parameters of the centroid of each symbol's cluster.
+        """
+        labels = self.cluster_symbols(df)
+        clusters = np.unique(labels)
+        logger.info(f"Fitting the ARIMA centroids of {len(clusters)} clusters...")
+
+        centroid_params = self.fit_params(
+            [
+                df.loc[:, labels == cluster].mean(axis=1).to_numpy()
+                for cluster in clusters
+            ],
+            [None] * len(clusters),
+            [self.order] * len(clusters),
+            self.time_limit,
+        )
+        params_by_cluster = {
+            cluster: params for cluster, (params, _) in zip(clusters, centroid_params)
+        }
+
+        return {
+            symbol: params_by_cluster[label]
+            for symbol, label in zip(df.columns, labels)
+        }
+
+    def get_start_params(self, df: pd.DataFrame) -> dict[str, Optional[np.ndarray]]:
+        start_params: dict[str, Optional[np.ndarray]] = {
+            symbol: None for symbol in df.columns
+        }
+        if self.warm_start is None:
+            return start_params
+
+        if self.warm_start == "previous":
+            for symbol in df.columns:
+                if symbol in self.models and get_model_order(
+                    self.models[symbol]
+                ) == self.get_order(symbol):
+                    start_params[symbol] = np.asarray(self.models[symbol].params)
+                elif symbol in self.cached_params:
+                    start_params[symbol] = self.cached_params[symbol]
+
+        # The centroids are fit with the default order
+        symbols_cold = [
+            symbol
+            for symbol, params in start_params.items()
+            if params is None and self.get_order(symbol) == self.order
+        ]
+        if symbols_cold:
+            start_params.update(self.get_centroid_params(df[symbols_cold]))
+
+        return start_params
 
     def fit(self, df: pd.DataFrame, **kwargs):
         """
         Fit the UnivariateARIMAs to the given training data.
 
+        The symbols are fit in parallel and independently, each warm started as
+        set by warm_start. If candidate_orders is set, the order of the symbols
+        without a selected (or cached) order is selected first.
+
         Parameters
         ----------
         df_train : pd.DataFrame
@@ -61,20 +588,174 @@ class UnivariateARIMAs(ForecastModel):
 
         df_train = df.reset_index(drop=True)
 
-        start_params = None
+        self.load_order_cache()
+
+        symbols_params: dict[str, tuple[np.ndarray, dict]] = dict()
+        if self.candidate_orders is not None:
+            symbols_select = [
+                symbol for symbol in df_train.columns if symbol not in self.orders
+            ]
+            if symbols_select:
+                symbols_params.update(self.select_orders(df_train[symbols_select]))
+
+        symbols_fit = [
+            symbol for symbol in df_train.columns if symbol not in symbols_params
+        ]
+        if symbols_fit:
+            start_params = self.get_start_params(df_train[symbols_fit])
+
+            logger.info(f"Fitting the ARIMAs of {len(symbols_fit)} symbols...")
+            symbols_params.update(
+                zip(
+                    symbols_fit,
+                    self.fit_params(
+                        [df_train[symbol].to_numpy() for symbol in symbols_fit],
+                        [start_params[symbol] for symbol in symbols_fit],
+                        [self.get_order(symbol) for symbol in symbols_fit],
+                        self.time_limit,
+                    ),
+                )
+            )
 
         for symbol in df_train.columns:
-            arima_model = ARIMA(df_train[symbol], order=(self.p, self.d, self.q))
-            if len(self.models) == df_train.shape[1]:
-                start_params = self.models[symbol].params
+            params, info = symbols_params[symbol]
+            if info["timed_out"] or info["failed"]:
+                logger.warning(
+                    f"The ARIMA fit of {symbol} did not finish, "
+                    "keeping its starting parameters."
+                )
+            # Filter with the estimated parameters, for the states used to predict
+            self.models[symbol] = ARIMA(
+                df_train[symbol], order=self.get_order(symbol)
+            ).filter(params)
+            self.fit_info[symbol] = info
 
-            if start_params is None:
-                arima_model = arima_model.fit()
-                start_params = arima_model.params
-            else:
-                arima_model = arima_model.fit(start_params=start_params)
+        if self.compact:
+            self.to_compact()
 
-            self.models[symbol] = arima_model
+        self.save_order_cache()
+
+    def to_compact(self):
+        """
+        Replaces the fitted results of every symbol with a CompactARIMA.
+        """
+        self.models = {
+            symbol: model
+            if isinstance(model, CompactARIMA)
+            else CompactARIMA.from_results(model)
+            for symbol, model in self.models.items()
+        }
+
+    def save_models(self, path: Path):
+        """
+        Saves the models of all the symbols, in compact form, to an .npz file.
+        """
+        arrays = {"symbols": np.array(list(self.models.keys()), dtype=str)}
+        for i, model in enumerate(self.models.values()):
+            if not isinstance(model, CompactARIMA):
+                model = CompactARIMA.from_results(model)
+            arrays.update(
+                {f"{name}_{i}": array for name, array in model.to_arrays().items()}
+            )
+
+        np.savez_compressed(path, **arrays)
+
+    def load_models(self, path: Path):
+        """
+        Loads the compact models saved by save_models.
+        """
+        with np.load(path) as arrays:
+            self.models = {
+                symbol: CompactARIMA(
+                    **{name: arrays[f"{name}_{i}"] for name in CompactARIMA.ARRAY_NAMES}
+                )
+                for i, symbol in enumerate(arrays["symbols"].tolist())
+            }
+        self.orders.update(
+            {symbol: model.order for symbol, model in self.models.items()}
+        )
+
+    def select_orders(self, df: pd.DataFrame) -> dict[str, tuple[np.ndarray, dict]]:
+        """
+        Selects the order of each symbol from candidate_orders.
+
+        Every (symbol, candidate order) pair is fit in the process pool, abandoning
+        the fits that exceed selection_time_limit, and the order with the lowest
+        information criterion is kept for each symbol.
+
+        Parameters
+        ----------
+        df : pd.DataFrame
+            The training data of the symbols.
+
+        Returns
+        -------
+        dict[str, tuple[np.ndarray, dict]]
+            The parameters and fit information of the selected order of each
+            symbol, so that the symbols do not need to be fit again.
+        """
+        logger.info(
+            f"Selecting the ARIMA orders of {df.shape[1]} symbols from "
+            f"{len(self.candidate_orders)} candidates..."
+        )
+        tasks = [
+            (symbol, order) for symbol in df.columns for order in self.candidate_orders
+        ]
+        candidates_params = self.fit_params(
+            [df[symbol].to_numpy() for symbol, _ in tasks],
+            [None] * len(tasks),
+            [order for _, order in tasks],
+            self.selection_time_limit,
+        )
+
+        selected: dict[str, tuple[np.ndarray, dict]] = dict()
+        n_candidates = len(self.candidate_orders)
+        for i, symbol in enumerate(df.columns):
+            symbol_candidates = candidates_params[
+                i * n_candidates : (i + 1) * n_candidates
+            ]
+            scores = [info[self.information_criterion] for _, info in symbol_candidates]
+            best = int(np.argmin(scores))
+            if not np.isfinite(scores[best]):
+                logger.warning(
+                    f"No candidate ARIMA order of {symbol} finished, "
+                    f"using {self.candidate_orders[best]}."
+                )
+            self.orders[symbol] = self.candidate_orders[best]
+            selected[symbol] = symbol_candidates[best]
+
+        return selected
+
+    def load_order_cache(self):
+        if self.order_cache_path is None or not self.order_cache_path.exists():
+            return
+
+        with open(self.order_cache_path) as f:
+            cache = json.load(f)
+
+        for symbol, entry in cache.items():
+            self.orders.setdefault(symbol, tuple(entry["order"]))
+            if tuple(entry["order"]) == self.orders[symbol]:
+                self.cached_params[symbol] = np.array(entry["params"])
+
+    def save_order_cache(self):
+        if self.order_cache_path is None:
+            return
+
+        cache = dict()
+        if self.order_cache_path.exists():
+            with open(self.order_cache_path) as f:
+                cache = json.load(f)
+
+        for symbol, results in self.models.items():
+            cache[symbol] = {
+                "order": list(self.get_order(symbol)),
+                "params": np.asarray(results.params).tolist(),
+            }
+
+        self.order_cache_path.parent.mkdir(parents=True, exist_ok=True)
+        with open(self.order_cache_path, "w") as f:
+            json.dump(cache, f, indent=2)
 
     def predict(
         self,
@@ -103,52 +784,32 @@ class UnivariateARIMAs(ForecastModel):
         -------
         np.ndarray
             A numpy array of predicted values of shape (df_predict.shape[0], df_predict.shape[1], n_steps_predict).
+
+        Notes
+        -----
+        The observations df_predict[index_start:index_end] are appended, one origin
+        at a time, after the data the models were fit on, and the forecasts of each
+        origin are made after its observation. This is consistent when the models
+        were fit on the data just before index_start.
         """
         if index_start is None:
             index_start = df_predict.shape[0] - n_steps_predict
         if index_end is None:
             index_end = df_predict.shape[0] - n_steps_predict + 1
 
-        n_rows_predict = index_end - index_start
-        predictions = np.zeros((n_rows_predict, df_predict.shape[1], n_steps_predict))
-
-        if self.models is None:
+        if not self.models:
             raise ValueError("Model must be fit before calling predict.")
 
-        # copy self.models
-        models = copy.deepcopy(self.models)
-
-        for index in range(index_start, index_end):
-            # Add one new real instance of each symbol
-            for symbol in models.keys():
-                models.update(
-                    {
-                        symbol: models[symbol].append(
-                            df_predict[symbol][index : index + 1].to_numpy()
-                        )
-                    }
-                )
+        predictions = np.zeros(
+            (index_end - index_start, df_predict.shape[1], n_steps_predict)
+        )
 
-            predictions[index - index_start, :, :] = self.forecast_next_n_steps(
-                index_first=index + 1,
-                n_steps_predict=n_steps_predict,
-                models=models,
-            )
-
-        return predictions
-
-    def forecast_next_n_steps(
-        self, index_first: int, n_steps_predict: int, models: dict
-    ):
+        for i, symbol in enumerate(df_predict.columns):
+            model = self.models[symbol]
+            endog = df_predict[symbol].to_numpy()[index_start:index_end]
+            if isinstance(model, CompactARIMA):
+                predictions[:, i, :] = model.rolling_forecasts(endog, n_steps_predict)
+            else:
+                predictions[:, i, :] = rolling_forecasts(model, endog, n_steps_predict)
 
-        n_symbols = len(models.keys())
-        predictions = np.zeros((n_symbols, n_steps_predict))
-        for i, symbol in enumerate(models.keys()):
-            predictions[i, :] = (
-                1
-                + models[symbol].predict(
-                    start=index_first,
-                    end=index_first + n_steps_predict - 1,  # the end index is inclusive
-                )
-            ).cumprod()
         return predictions
@@ -0,0 +1,227 @@
+from typing import Optional
+
+import numpy as np
+import pandas as pd
+from numpy.lib.stride_tricks import sliding_window_view
+
+from stock_prediction.helpers.logging.log_config import get_logger
+from stock_prediction.modeling.forecast_model import ForecastModel
+
+logger = get_logger()
+
+# Same calendar terms as get_time_features in sklearn_api_based
+CALENDAR_FEATURES = ["frac_week", "frac_month", "frac_year"]
+
+
+def get_calendar_features(dates: pd.DatetimeIndex) -> np.ndarray:
+    """
+    Computes the calendar features of some dates.
+
+    Parameters
+    ----------
+    dates : pd.DatetimeIndex
+        The dates.
+
+    Returns
+    -------
+    np.ndarray
+        The features in CALENDAR_FEATURES, of shape (len(dates), 3).
+    """
+    frac_month = (dates.day / dates.days_in_month).to_numpy()
+    return np.column_stack(
+        [
+            ((dates.weekday + 1) / 5).to_numpy(),
+            frac_month,
+            (dates.month.to_numpy() - 1 + frac_month) / 12,
+        ]
+    )
+
+
+class UnivariateARs(ForecastModel):
+    def __init__(
+        self,
+        p: int = 5,
+        calendar_features: bool = False,
+        ridge: float = 0.0,
+        **kwargs,
+    ):
+        """
+        Initialize the UnivariateARs model.
+
+        An AR(p) model of the returns is fit independently for every symbol, but all
+        the symbols are solved at once with batched least squares, and the forecasts
+        of all the symbols and origins are computed by a single vectorized
+        recursion.
+
+        Parameters
+        ----------
+        p : int, optional
+            The number of autoregressive terms. Default is 5.
+        calendar_features : bool, optional
+            Whether to add the calendar features in CALENDAR_FEATURES as exogenous
+            terms. Requires a DatetimeIndex. Default is False.
+        ridge : float, optional
+            The L2 penalty of the coefficients, except the intercept. Default is 0.
+
+        Attributes
+        ----------
+        coef : np.ndarray
+            The coefficients of shape (n_symbols, n_terms), in the order of
+            term_names.
+        symbols : list[str]
+            The symbols the model was fit on.
+        """
+        self.p = p
+        self.calendar_features = calendar_features
+        self.ridge = ridge
+        self.coef: Optional[np.ndarray] = None
+        self.symbols: list[str] = []
+
+    @property
+    def term_names(self) -> list[str]:
+        return (
+            ["intercept"]
+            + [f"lag_{j}" for j in range(1, self.p + 1)]
+            + (CALENDAR_FEATURES if self.calendar_features else [])
+        )
+
+    @property
+    def coefficients(self) -> pd.DataFrame:
+        """
+        The coefficients of the fitted models, with one row per symbol.
+        """
+        if self.coef is None:
+            raise ValueError("Model must be fit before getting its coefficients.")
+
+        return pd.DataFrame(self.coef, index=self.symbols, columns=self.term_names)
+
+    def get_exog(self, dates: pd.Index) -> np.ndarray:
+        if not self.calendar_features:
+            return np.zeros((len(dates), 0))
+        if not isinstance(dates, pd.DatetimeIndex):
+            raise ValueError("Calendar features require a DatetimeIndex.")
+
+        return get_calendar_features(dates)
+
+    def fit(self, df: pd.DataFrame, **kwargs):
+        """
+        Fit the AR models of all the symbols with batched least squares.
+
+        Rows with missing values (e.g. before a symbol starts trading) are left out
+        of the fit of that symbol only.
+
+        Parameters
+        ----------
+        df : pd.DataFrame
+            The dataframe containing the training data.
+        """
+        values = df.to_numpy(dtype=np.float64).T
+
+        # Stacked lag tensor of shape (n_symbols, n_rows, p), lag_1 first
+        lags = sliding_window_view(values[:, :-1], self.p, axis=1)[..., ::-1]
+        targets = values[:, self.p :]
+        exog = self.get_exog(df.index[self.p :])
+
+        X = np.concatenate(
+            [
+                np.ones(targets.shape + (1,)),
+                lags,
+                np.broadcast_to(exog, targets.shape + (exog.shape[1],)),
+            ],
+            axis=2,
+        )
+        is_valid = np.isfinite(targets) & np.isfinite(X).all(axis=2)
+        X = np.where(is_valid[..., np.newaxis], X, 0.0)
+        targets = np.where(is_valid, targets, 0.0)
+
+        # Batched normal equations, one system per symbol
+        gram = np.einsum("stm,stn->smn", X, X)
+        moments = np.einsum("stm,st->sm", X, targets)
+        penalty = self.ridge * np.eye(X.shape[2])
+        penalty[0, 0] = 0.0
+
+        self.coef = np.einsum("smn,sn->sm", np.linalg.pinv(gram + penalty), moments)
+        self.symbols = list(df.columns)
+
+        logger.info(f"Fit AR({self.p}) models of {len(self.symbols)} symbols.")
+
+    def predict(
+        self,
+        df_predict: pd.DataFrame,
+        n_steps_predict: int,
+        index_start: Optional[int] = None,
+        index_end: Optional[int] = None,
+        **kwargs,
+    ):
+        """
+        Predict future values using the UnivariateARs.
+
+        The forecasts are made recursively, feeding the predicted returns back as
+        lags, for all the symbols and origins at once.
+
+        Parameters
+        ----------
+        df_predict : pd.DataFrame
+            The dataframe containing the data to predict from.
+        n_steps_predict : int
+            The number of steps ahead to predict.
+        index_start : int, optional
+            The starting index for prediction. If None, defaults to the last available index minus n_steps_predict.
+        index_end : int, optional
+            The ending index for prediction. If None, defaults to the last available index minus n_steps_predict + 1.
+
+        Returns
+        -------
+        np.ndarray
+            A numpy array of predicted values of shape
+            (index_end - index_start, df_predict.shape[1], n_steps_predict).
+        """
+        if self.coef is None:
+            raise ValueError("Model must be fit before calling predict.")
+
+        if index_start is None:
+            index_start = df_predict.shape[0] - n_steps_predict
+        if index_end is None:
+            index_end = df_predict.shape[0] - n_steps_predict + 1
+
+        if index_start < self.p - 1:
+            raise ValueError(f"index_start must be at least p - 1 ({self.p - 1}).")
+
+        symbol_indices = pd.Index(self.symbols).get_indexer(df_predict.columns)
+        if (symbol_indices < 0).any():
+            raise ValueError("df_predict has symbols the model was not fit on.")
+        coef = self.coef[symbol_indices]
+
+        # Lags at each origin, of shape (n_symbols, n_origins, p), lag_1 first
+        values = df_predict.to_numpy(dtype=np.float64).T
+        lags = sliding_window_view(values[:, :index_end], self.p, axis=1)[
+            :, index_start - self.p + 1 :, ::-1
+        ].copy()
+
+        exog_coef = coef[:, self.p + 1 :]
+        if self.calendar_features:
+            # Calendar features of the steps after the last date, on business days
+            future_dates = pd.bdate_range(
+                df_predict.index[-1] + pd.Timedelta(days=1), periods=n_steps_predict
+            )
+            exog = self.get_exog(df_predict.index.append(future_dates))
+            # Exogenous contribution of each (origin, step), of shape
+            # (n_symbols, n_origins + n_steps_predict - 1)
+            exog_terms = (
+                exog_coef @ exog[index_start + 1 : index_end + n_steps_predict].T
+            )
+
+        n_origins = index_end - index_start
+        forecasts = np.zeros((n_origins, df_predict.shape[1], n_steps_predict))
+        for step in range(n_steps_predict):
+            step_forecasts = coef[:, [0]] + np.einsum(
+                "sop,sp->so", lags, coef[:, 1 : self.p + 1]
+            )
+            if self.calendar_features:
+                step_forecasts += exog_terms[:, step : step + n_origins]
+            forecasts[:, :, step] = step_forecasts.T
+
+            lags[..., 1:] = lags[..., :-1]
+            lags[..., 0] = step_forecasts
+
+        return np.cumprod(1 + forecasts, axis=2)
@@ -1,7 +1,9 @@
+from abc import abstractmethod
 from typing import Optional
 
 import numpy as np
 import pandas as pd
+from numpy.lib.stride_tricks import sliding_window_view
 
 from stock_prediction.helpers.logging.log_config import get_logger
 from stock_prediction.modeling.forecast_model import ForecastModel
@@ -9,6 +11,79 @@ from stock_prediction.modeling.forecast_model import ForecastModel
 logger = get_logger()
 
 
+def get_predict_range(
+    df_predict: pd.DataFrame,
+    n_steps_predict: int,
+    index_start: Optional[int] = None,
+    index_end: Optional[int] = None,
+) -> tuple[int, int]:
+    if index_start is None:
+        index_start = df_predict.shape[0] - n_steps_predict
+    if index_end is None:
+        index_end = df_predict.shape[0] - n_steps_predict + 1
+
+    return index_start, index_end
+
+
+def rolling_sum(values: np.ndarray, window: int) -> np.ndarray:
+    """
+    Computes the rolling sums of the columns of an array with cumulative sums.
+
+    Parameters
+    ----------
+    values : np.ndarray
+        The array of shape (n_rows, n_columns).
+    window : int
+        The number of rows of each window.
+
+    Returns
+    -------
+    np.ndarray
+        The sums of shape (n_rows - window + 1, n_columns), where row i is the sum
+        of the rows i to i + window - 1. A sum is NaN if its window has a missing
+        value, as with pandas' rolling windows.
+    """
+    is_missing = np.isnan(values)
+    cumsum = np.zeros((values.shape[0] + 1, values.shape[1]))
+    np.cumsum(np.where(is_missing, 0.0, values), axis=0, out=cumsum[1:])
+    n_missing = np.zeros(cumsum.shape, dtype=np.int64)
+    np.cumsum(is_missing, axis=0, out=n_missing[1:])
+
+    sums = cumsum[window:] - cumsum[:-window]
+    sums[n_missing[window:] - n_missing[:-window] > 0] = np.nan
+
+    return sums
+
+
+def compound_log_growth(log_growth: np.ndarray, n_steps_predict: int) -> np.ndarray:
+    """
+    Compounds a constant log growth per step over the forecast horizons.
+
+    Parameters
+    ----------
+    log_growth : np.ndarray
+        The log growth per step of each origin and symbol, of shape
+        (n_origins, n_symbols).
+    n_steps_predict : int
+        The number of steps ahead to predict.
+
+    Returns
+    -------
+    np.ndarray
+        The cumulative returns exp(log_growth * step), of shape
+        (n_origins, n_symbols, n_steps_predict).
+    """
+    predictions = np.empty(log_growth.shape + (n_steps_predict,))
+    np.multiply(
+        log_growth[:, :, np.newaxis],
+        np.arange(1, n_steps_predict + 1),
+        out=predictions,
+    )
+    np.exp(predictions, out=predictions)
+
+    return predictions
+
+
 class RollingGeometricAverage(ForecastModel):
     def __init__(self, window: int = 20, **kwargs):
         self.window = window
@@ -46,28 +121,24 @@ class RollingGeometricAverage(ForecastModel):
             A numpy array of predicted values of shape
             (df_predict.shape[0], df_predict.shape[1], n_steps_predict).
         """
-        if index_start is None:
-            index_start = df_predict.shape[0] - n_steps_predict
-
-        if index_end is None:
-            index_end = df_predict.shape[0] - n_steps_predict + 1
-
-        df_rolling_geometric_average = (
-            df_predict[index_start - self.window + 1 : index_end]
-            .reset_index(drop=True)
-            .rolling(window=self.window)
-            .apply(lambda y: (1 + y).cumprod().iloc[-1] ** (1 / self.window))
+        index_start, index_end = get_predict_range(
+            df_predict, n_steps_predict, index_start, index_end
         )
 
-        np_range = np.arange(n_steps_predict)
-
-        predictions = (
-            df_rolling_geometric_average[self.window - 1 :]
-            .map(lambda x: x ** (np_range + 1))
-            .to_numpy()
+        # Mean log growth over the window ending at each origin
+        log_growth = (
+            rolling_sum(
+                np.log1p(
+                    df_predict.iloc[index_start - self.window + 1 : index_end].to_numpy(
+                        dtype=np.float64
+                    )
+                ),
+                self.window,
+            )
+            / self.window
         )
 
-        return np.array(predictions.tolist())
+        return compound_log_growth(log_growth, n_steps_predict)
 
 
 class NoReturnForecast(ForecastModel):
@@ -109,20 +180,224 @@ class NoReturnForecast(ForecastModel):
             A numpy array of predicted values of shape
             (df_predict.shape[0], df_predict.shape[1], n_steps_predict).
         """
-        if index_start is None:
-            index_start = df_predict.shape[0] - n_steps_predict
+        index_start, index_end = get_predict_range(
+            df_predict, n_steps_predict, index_start, index_end
+        )
+
+        return np.ones((index_end - index_start, df_predict.shape[1], n_steps_predict))
+
+
+class DriftForecast(ForecastModel):
+    """
+    Base class of the baselines compounding a drift (a return per step) estimated
+    at each origin from the returns up to it.
+
+    Subclasses implement get_drift, which computes the drifts of all the origins
+    and symbols at once.
+    """
+
+    def __init__(self, window: int = 20, **kwargs):
+        self.window = window
+
+    def fit(self, df: pd.DataFrame, **kwargs):
+        logger.info(
+            f"{type(self).__name__} estimates its drift at each origin so it is "
+            "not fitted."
+        )
+
+    @abstractmethod
+    def get_drift(
+        self, df_predict: pd.DataFrame, index_start: int, index_end: int
+    ) -> np.ndarray:
+        """
+        Estimates the drift of each origin and symbol.
+
+        Returns
+        -------
+        np.ndarray
+            The drifts of shape (index_end - index_start, df_predict.shape[1]).
+        """
+        pass
+
+    def get_window_values(
+        self, df_predict: pd.DataFrame, index_start: int, index_end: int
+    ) -> np.ndarray:
+        # The returns of all the windows ending at the origins
+        return df_predict.iloc[index_start - self.window + 1 : index_end].to_numpy(
+            dtype=np.float64
+        )
+
+    def predict(
+        self,
+        df_predict: pd.DataFrame,
+        n_steps_predict: int = 1,
+        index_start: Optional[int] = None,
+        index_end: Optional[int] = None,
+        **kwargs,
+    ):
+        """
+        Predict future values by compounding the drift of each origin.
+
+        Parameters
+        ----------
+        df_predict : pd.DataFrame
+            The dataframe containing the data to predict from.
+        n_steps_predict : int, optional
+            The number of steps ahead to predict. Default is 1.
+        index_start : int, optional
+            The starting index for prediction. If None, defaults to the last available index minus n_steps_predict.
+        index_end : int, optional
+            The ending index for prediction. If None, defaults to the last available index minus n_steps_predict.
+
+        Returns
+        -------
+        np.ndarray
+            A numpy array of predicted values of shape
+            (index_end - index_start, df_predict.shape[1], n_steps_predict).
+        """
+        index_start, index_end = get_predict_range(
+            df_predict, n_steps_predict, index_start, index_end
+        )
+
+        return compound_log_growth(
+            np.log1p(self.get_drift(df_predict, index_start, index_end)),
+            n_steps_predict,
+        )
+
+
+class EWMADrift(DriftForecast):
+    def __init__(self, halflife: float = 20, **kwargs):
+        """
+        Initialize the EWMADrift model.
+
+        Parameters
+        ----------
+        halflife : float, optional
+            The halflife, in steps, of the exponentially weighted mean of the
+            returns. Default is 20.
+        """
+        super().__init__(**kwargs)
+        self.halflife = halflife
+
+    def get_drift(
+        self, df_predict: pd.DataFrame, index_start: int, index_end: int
+    ) -> np.ndarray:
+        # The weights never vanish, so the mean uses all the returns up to index_end
+        return (
+            df_predict.iloc[:index_end]
+            .ewm(halflife=self.halflife)
+            .mean()
+            .to_numpy()[index_start:index_end]
+        )
+
+
+class RollingMedianDrift(DriftForecast):
+    """
+    Drift given by the median return of the window ending at each origin, which
+    is robust to the outliers of the returns.
+    """
+
+    def get_drift(
+        self, df_predict: pd.DataFrame, index_start: int, index_end: int
+    ) -> np.ndarray:
+        windows = sliding_window_view(
+            self.get_window_values(df_predict, index_start, index_end),
+            self.window,
+            axis=0,
+        )
+        return np.median(windows, axis=2)
+
+
+class VolatilityScaledDrift(DriftForecast):
+    """
+    Rolling mean return, shrunk towards zero by its sampling noise.
+
+    The mean m of the window ending at each origin is multiplied by
+    m^2 / (m^2 + s^2 / window), where s is the volatility of the window. So the
+    drift is close to m when it is large compared with its standard error, and
+    close to zero for noisy, volatile windows.
+    """
+
+    def get_drift(
+        self, df_predict: pd.DataFrame, index_start: int, index_end: int
+    ) -> np.ndarray:
+        values = self.get_window_values(df_predict, index_start, index_end)
+        mean = rolling_sum(values, self.window) / self.window
+        variance = np.maximum(
+            rolling_sum(values**2, self.window) / self.window - mean**2, 0.0
+        ) * (self.window / max(self.window - 1, 1))
+
+        mean_squared = mean**2
+        with np.errstate(invalid="ignore", divide="ignore"):
+            shrinkage = mean_squared / (mean_squared + variance / self.window)
+
+        # A window of constant returns has no noise, but 0 / 0 shrinkage if zero
+        return mean * np.nan_to_num(shrinkage, nan=0.0)
 
-        if index_end is None:
-            index_end = df_predict.shape[0] - n_steps_predict + 1
 
-        df_predict_same = df_predict[
-            index_start - self.window + 1 : index_end
-        ].reset_index(drop=True)
+class SeasonalNaive(ForecastModel):
+    def __init__(self, season_length: int = 5, **kwargs):
+        """
+        Initialize the SeasonalNaive model.
+
+        Parameters
+        ----------
+        season_length : int, optional
+            The number of steps of a season, e.g. 5 for weekly seasonality of
+            daily returns. Default is 5.
+        """
+        self.season_length = season_length
 
-        predictions = (
-            df_predict_same[self.window - 1 :]
-            .map(lambda x: 1 + np.zeros(n_steps_predict))
-            .to_numpy()
+    def fit(self, df: pd.DataFrame, **kwargs):
+        logger.info(
+            "This model simply repeats the last season of returns so it is not "
+            "fitted."
         )
 
-        return np.array(predictions.tolist())
+    def predict(
+        self,
+        df_predict: pd.DataFrame,
+        n_steps_predict: int = 1,
+        index_start: Optional[int] = None,
+        index_end: Optional[int] = None,
+        **kwargs,
+    ):
+        """
+        Predict future values by repeating the returns of the last season.
+
+        The return forecast h steps after the origin t is the return observed at
+        t + h - k * season_length, with the smallest k that makes it observed.
+
+        Parameters
+        ----------
+        df_predict : pd.DataFrame
+            The dataframe containing the data to predict from.
+        n_steps_predict : int, optional
+            The number of steps ahead to predict. Default is 1.
+        index_start : int, optional
+            The starting index for prediction. If None, defaults to the last available index minus n_steps_predict.
+        index_end : int, optional
+            The ending index for prediction. If None, defaults to the last available index minus n_steps_predict.
+
+        Returns
+        -------
+        np.ndarray
+            A numpy array of predicted values of shape
+            (index_end - index_start, df_predict.shape[1], n_steps_predict).
+        """
+        index_start, index_end = get_predict_range(
+            df_predict, n_steps_predict, index_start, index_end
+        )
+
+        # Row of the return repeated by each (origin, step)
+        rows = (
+            np.arange(index_start, index_end)[:, np.newaxis]
+            - self.season_length
+            + 1
+            + np.arange(n_steps_predict) % self.season_length
+        )
+
+        returns = df_predict.to_numpy(dtype=np.float64)[rows]
+        predictions = np.cumprod(1 + returns, axis=1)
+
+        return predictions.transpose(0, 2, 1)
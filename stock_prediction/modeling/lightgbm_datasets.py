@@ -0,0 +1,226 @@
+"""
+Construction and on-disk caching of LightGBM datasets.
+
+Binning the features into LightGBM histograms is a significant part of the cost of
+training. The helpers in this module construct each ``lgb.Dataset`` once, share the
+bin mappers of a training dataset with its validation dataset through the
+``reference`` mechanism, and persist the constructed datasets as LightGBM binary
+files so that identical features are never binned twice.
+"""
+import hashlib
+import json
+import os
+from pathlib import Path
+from typing import Callable, Optional, Union
+
+import lightgbm as lgb
+import numpy as np
+import pandas as pd
+
+from stock_prediction.helpers.logging.log_config import get_logger
+
+logger = get_logger()
+
+DATASET_FILE_SUFFIX = ".bin"
+LABELS_FILE_SUFFIX = ".labels.npy"
+
+# LightGBM parameters (and their aliases) that change how a dataset is binned.
+# Only these are part of the cache key, so that models that only differ in
+# boosting parameters (e.g. learning_rate or max_depth) share the same datasets.
+DATASET_PARAMS = (
+    "max_bin",
+    "max_bins",
+    "max_bin_by_feature",
+    "min_data_in_bin",
+    "bin_construct_sample_cnt",
+    "subsample_for_bin",
+    "data_random_seed",
+    "data_seed",
+    "use_missing",
+    "zero_as_missing",
+    "feature_pre_filter",
+    "min_data_in_leaf",
+    "min_data_per_leaf",
+    "min_data",
+    "min_child_samples",
+    "min_samples_leaf",
+    "linear_tree",
+    "linear_trees",
+    "categorical_feature",
+    "cat_feature",
+    "categorical_column",
+    "cat_column",
+    "categorical_features",
+    "forcedbins_filename",
+    "enable_bundle",
+    "is_enable_bundle",
+    "bundle",
+    "max_conflict_rate",
+    "is_enable_sparse",
+    "is_sparse",
+    "enable_sparse",
+    "sparse",
+)
+
+
+def get_dataset_params(params: Optional[dict]) -> dict:
+    """
+    Selects the parameters that affect the construction of a LightGBM dataset.
+
+    Parameters
+    ----------
+    params : dict, optional
+        The LightGBM parameters of a model.
+
+    Returns
+    -------
+    dict
+        The subset of ``params`` that changes how a dataset is binned.
+    """
+    return {
+        name: value
+        for name, value in (params or dict()).items()
+        if name in DATASET_PARAMS
+    }
+
+
+def make_dataset_key(data: Union[pd.DataFrame, pd.Series], **config) -> str:
+    """
+    Makes a cache key for the datasets built from some raw data and configuration.
+
+    Parameters
+    ----------
+    data : pd.DataFrame or pd.Series
+        The raw data the datasets are built from.
+    **config
+        Any configuration (feature settings, validation range, dataset parameters)
+        that changes the datasets built from ``data``. Values must be JSON
+        serializable or have a meaningful string representation.
+
+    Returns
+    -------
+    str
+        A hexadecimal digest identifying the datasets.
+    """
+    columns = data.columns if isinstance(data, pd.DataFrame) else [data.name]
+
+    hasher = hashlib.sha1()
+    hasher.update(pd.util.hash_pandas_object(data, index=True).to_numpy().tobytes())
+    hasher.update(json.dumps([str(column) for column in columns]).encode())
+    hasher.update(json.dumps(config, sort_keys=True, default=str).encode())
+
+    return hasher.hexdigest()
+
+
+class LightGBMDatasetCache:
+    """
+    Builds constructed LightGBM datasets and optionally persists them to disk.
+
+    Each dataset is stored as a LightGBM binary file together with a ``.npy`` file
+    holding its label matrix, which has one column per target. The binary file is
+    saved with the labels of the first target; callers training several targets on
+    the same features swap the labels with ``lgb.Dataset.set_label``.
+    """
+
+    def __init__(self, cache_dir: Optional[Path] = None, params: Optional[dict] = None):
+        """
+        Initialize the dataset cache.
+
+        Parameters
+        ----------
+        cache_dir : Path, optional
+            The directory where datasets are persisted. If None, datasets are
+            constructed in memory and never saved.
+        params : dict, optional
+            The LightGBM parameters of the models trained on the datasets. Only the
+            parameters affecting dataset construction are used.
+        """
+        self.cache_dir = Path(cache_dir) if cache_dir is not None else None
+        self.params = get_dataset_params(params)
+
+    def get_paths(self, key: str) -> tuple[Path, Path]:
+        if self.cache_dir is None:
+            raise ValueError("The dataset cache has no cache_dir.")
+
+        return (
+            self.cache_dir / f"{key}{DATASET_FILE_SUFFIX}",
+            self.cache_dir / f"{key}{LABELS_FILE_SUFFIX}",
+        )
+
+    def contains(self, key: str) -> bool:
+        if self.cache_dir is None:
+            return False
+
+        return all(path.exists() for path in self.get_paths(key))
+
+    def get(
+        self,
+        key: str,
+        build: Callable[[], tuple[np.ndarray, np.ndarray, list[str]]],
+        reference: Optional[lgb.Dataset] = None,
+    ) -> tuple[lgb.Dataset, np.ndarray]:
+        """
+        Loads a constructed dataset from the cache or builds it.
+
+        Parameters
+        ----------
+        key : str
+            The key of the dataset, see ``make_dataset_key``.
+        build : Callable
+            Returns the feature matrix, the label matrix and the feature names of
+            the dataset. It is only called when the dataset is not cached.
+        reference : lgb.Dataset, optional
+            The dataset whose bin mappers are reused, e.g. the training dataset
+            when building a validation dataset.
+
+        Returns
+        -------
+        tuple[lgb.Dataset, np.ndarray]
+            The constructed dataset and its label matrix of shape
+            (n_rows, n_targets), in column-major order so that the labels of each
+            target are contiguous.
+        """
+        params = dict(self.params, verbosity=-1)
+
+        if self.contains(key):
+            dataset_path, labels_path = self.get_paths(key)
+            logger.info(f"Loading LightGBM dataset from cache: {dataset_path}")
+            labels = np.asfortranarray(np.load(labels_path))
+            dataset = lgb.Dataset(
+                str(dataset_path), reference=reference, params=params
+            ).construct()
+            return dataset, labels
+
+        features, labels, feature_names = build()
+        labels = np.asfortranarray(
+            np.asarray(labels, dtype=np.float64).reshape(len(features), -1)
+        )
+        dataset = lgb.Dataset(
+            features,
+            label=labels[:, 0],
+            feature_name=feature_names,
+            reference=reference,
+            params=params,
+        ).construct()
+
+        if self.cache_dir is not None:
+            self.save(key, dataset, labels)
+
+        return dataset, labels
+
+    def save(self, key: str, dataset: lgb.Dataset, labels: np.ndarray):
+        dataset_path, labels_path = self.get_paths(key)
+        dataset_path.parent.mkdir(parents=True, exist_ok=True)
+
+        # Write to temporary files first so that concurrent readers (e.g. parallel
+        # tuning trials) never see a partially written dataset
+        suffix = f".{os.getpid()}.tmp"
+        dataset_tmp_path = dataset_path.with_name(dataset_path.name + suffix)
+        labels_tmp_path = labels_path.with_name(labels_path.name + suffix)
+
+        with open(labels_tmp_path, "wb") as labels_file:
+            np.save(labels_file, labels)
+        dataset.save_binary(str(dataset_tmp_path))
+
+        os.replace(labels_tmp_path, labels_path)
+        os.replace(dataset_tmp_path, dataset_path)
@@ -1,12 +1,23 @@
 from calendar import monthrange
-from typing import Optional
+from pathlib import Path
+from typing import Callable, Optional, Union
 
+import lightgbm as lgb
 import numpy as np
 import pandas as pd
-from lightgbm import LGBMRegressor
 
 from stock_prediction.helpers.logging.log_config import get_logger
 from stock_prediction.modeling.forecast_model import ForecastModel
+from stock_prediction.modeling.lightgbm_datasets import (
+    LightGBMDatasetCache,
+    get_dataset_params,
+    make_dataset_key,
+)
+from stock_prediction.modeling.tree_ensemble import (
+    CompiledTreeEnsemble,
+    UncompilableBoosterError,
+)
+from stock_prediction.utils.series import assemble_cumulative_predictions
 
 logger = get_logger()
 
@@ -62,6 +73,7 @@ class UnivariateLightGBMs(ForecastModel):
         stats: list[str] = ["mean", "std", "min", "max"],
         n_shifts: int = 20,
         n_steps_predict: int = 20,
+        dataset_cache_dir: Optional[Path] = None,
         **kwargs,
     ):
 
@@ -70,7 +82,172 @@ class UnivariateLightGBMs(ForecastModel):
         self.n_shifts = n_shifts
         self.n_steps_predict = n_steps_predict
         self.lgbm_hpts = lgbm_hpts or dict()
-        self.models: dict[str, LGBMRegressor] = dict()
+        self.dataset_cache_dir = dataset_cache_dir
+        self.models: dict[str, lgb.Booster] = dict()
+        self.evals_results: dict[str, dict] = dict()
+
+    @property
+    def dataset_cache(self) -> LightGBMDatasetCache:
+        return LightGBMDatasetCache(self.dataset_cache_dir, params=self.lgbm_hpts)
+
+    def get_dataset_key(
+        self,
+        data: Union[pd.DataFrame, pd.Series],
+        valid_range: Optional[tuple[int, int]] = None,
+    ) -> str:
+        return make_dataset_key(
+            data,
+            model=type(self).__name__,
+            windows=self.windows,
+            stats=self.stats,
+            n_shifts=self.n_shifts,
+            n_steps_predict=self.n_steps_predict,
+            valid_range=valid_range,
+            train_gap=self.n_steps_predict if valid_range is not None else None,
+            dataset_params=get_dataset_params(self.lgbm_hpts),
+        )
+
+    def get_datasets(
+        self,
+        data: Union[pd.DataFrame, pd.Series],
+        make_features_and_labels: Callable[[], tuple[pd.DataFrame, np.ndarray]],
+        valid_range: Optional[tuple[int, int]] = None,
+    ) -> tuple[lgb.Dataset, np.ndarray, Optional[lgb.Dataset], Optional[np.ndarray]]:
+        """
+        Gets the constructed training and validation datasets for some raw data.
+
+        The features are only computed when the datasets are not already cached,
+        and the validation dataset reuses the bin mappers of the training dataset.
+
+        Parameters
+        ----------
+        data : pd.DataFrame or pd.Series
+            The raw data the features are computed from.
+        make_features_and_labels : Callable
+            Returns the features (including the initial index column) and the label
+            matrix, with one column per target.
+        valid_range : tuple[int, int], optional
+            The range of initial indices used for validation.
+
+        Returns
+        -------
+        tuple
+            The training dataset and labels, and the validation dataset and labels
+            (None if ``valid_range`` is None).
+        """
+        key = self.get_dataset_key(data, valid_range=valid_range)
+        processed: dict = dict()
+
+        def build_split(split: str) -> tuple[np.ndarray, np.ndarray, list[str]]:
+            # The features are converted once to a single float matrix, from which
+            # each split only takes its rows
+            if not processed:
+                df_features, labels = make_features_and_labels()
+                processed["feature_names"] = [
+                    col for col in df_features.columns if col != self.INITIAL_INDEX_COL
+                ]
+                processed["feature_columns"] = np.flatnonzero(
+                    df_features.columns != self.INITIAL_INDEX_COL
+                )
+                processed["masks"] = self.get_split_masks(
+                    df_features[self.INITIAL_INDEX_COL].to_numpy(), valid_range
+                )
+                processed["features"] = df_features.to_numpy(dtype=np.float64)
+                processed["labels"] = np.asarray(labels, dtype=np.float64)
+
+            mask = processed["masks"][split]
+            return (
+                processed["features"][np.ix_(mask, processed["feature_columns"])],
+                processed["labels"][mask],
+                processed["feature_names"],
+            )
+
+        dataset_cache = self.dataset_cache
+        train_set, train_labels = dataset_cache.get(
+            f"{key}_train", lambda: build_split("train")
+        )
+
+        if valid_range is None:
+            return train_set, train_labels, None, None
+
+        valid_set, valid_labels = dataset_cache.get(
+            f"{key}_valid", lambda: build_split("valid"), reference=train_set
+        )
+
+        return train_set, train_labels, valid_set, valid_labels
+
+    def get_split_masks(
+        self, initial_index: np.ndarray, valid_range: Optional[tuple[int, int]]
+    ) -> dict[str, np.ndarray]:
+        if valid_range is None:
+            return {"train": np.ones(len(initial_index), dtype=bool)}
+
+        # The labels of a row are the returns of the n_steps_predict days after it,
+        # so the training rows stop n_steps_predict days before the validation
+        # range, whose returns they would otherwise be trained on
+        return {
+            "train": initial_index < valid_range[0] - self.n_steps_predict,
+            "valid": (initial_index >= valid_range[0])
+            & (initial_index < valid_range[1]),
+        }
+
+    def get_symbol_datasets(
+        self, series: pd.Series, valid_range: Optional[tuple[int, int]] = None
+    ) -> tuple[lgb.Dataset, np.ndarray, Optional[lgb.Dataset], Optional[np.ndarray]]:
+        def make_features_and_labels():
+            df_all = self.preprocess(series)
+            return (
+                df_all.drop(columns=[self.LABEL_COL]),
+                df_all[[self.LABEL_COL]].to_numpy(),
+            )
+
+        return self.get_datasets(series, make_features_and_labels, valid_range)
+
+    def train_booster(
+        self,
+        symbol: str,
+        train_set: lgb.Dataset,
+        valid_set: Optional[lgb.Dataset] = None,
+    ):
+        evals_result: dict = dict()
+        booster = lgb.train(
+            self.lgbm_hpts,
+            train_set,
+            valid_sets=[valid_set] if valid_set is not None else None,
+            callbacks=[lgb.record_evaluation(evals_result)],
+        )
+        # Drop the reference to the training data, which is not needed to predict
+        booster.free_dataset()
+
+        self.models[symbol] = booster
+        self.evals_results[symbol] = evals_result
+
+    def get_valid_score(self, metric: str = "l2") -> float:
+        """
+        Gets the validation score of the last fit, averaged over symbols.
+
+        Parameters
+        ----------
+        metric : str, optional
+            The LightGBM metric to average. Default is "l2", the default metric of
+            the regression objective.
+
+        Returns
+        -------
+        float
+            The mean over symbols of the metric at the last boosting iteration.
+        """
+        if not self.evals_results or not all(self.evals_results.values()):
+            raise ValueError("Model must be fit with a valid_range to be scored.")
+
+        return float(
+            np.mean(
+                [
+                    evals_result["valid_0"][metric][-1]
+                    for evals_result in self.evals_results.values()
+                ]
+            )
+        )
 
     def preprocess(self, series: pd.Series) -> pd.DataFrame:
         series_reset = series.reset_index(drop=True)
@@ -118,34 +295,12 @@ class UnivariateLightGBMs(ForecastModel):
     ):
         for symbol in df.columns:
             print(f"Training {symbol}...")
-            # Preprocess and split the data
-            df_all = self.preprocess(df[symbol])
-            df_valid = None
-
-            if valid_range is not None:
-                df_train = df_all[df_all[self.INITIAL_INDEX_COL] < valid_range[0]]
-                df_valid = df_all[
-                    (df_all[self.INITIAL_INDEX_COL] >= valid_range[0])
-                    & (df_all[self.INITIAL_INDEX_COL] < valid_range[1])
-                ]
-            else:
-                df_train = df_all
-
-            # Initialize and fit the model
-            lgbm_model = LGBMRegressor(**self.lgbm_hpts)
-            lgbm_model.fit(
-                df_train.drop([self.LABEL_COL, self.INITIAL_INDEX_COL], axis=1),
-                df_train[self.LABEL_COL],
-                eval_set=[
-                    (
-                        df_valid.drop([self.LABEL_COL, self.INITIAL_INDEX_COL], axis=1),
-                        df_valid[self.LABEL_COL],
-                    )
-                ]
-                if df_valid is not None
-                else None,
+            # Preprocess and split the data, unless the datasets are cached
+            train_set, _, valid_set, _ = self.get_symbol_datasets(
+                df[symbol], valid_range=valid_range
             )
-            self.models[symbol] = lgbm_model
+
+            self.train_booster(symbol, train_set, valid_set)
 
     def _get_dict_all_features_dfs(
         self,
@@ -157,12 +312,24 @@ class UnivariateLightGBMs(ForecastModel):
         for symbol in df.columns:
             df_features = self.preprocess(df[symbol])
             df_features = df_features[
-                df_features[self.INITIAL_INDEX_COL].between(index_start, index_end)
+                df_features[self.INITIAL_INDEX_COL].between(
+                    index_start, index_end, inclusive="left"
+                )
             ].drop(columns=[self.LABEL_COL])
             dict_all_features_dfs[symbol] = df_features
 
         return dict_all_features_dfs
 
+    def _predict_symbols(
+        self, dict_all_features_dfs: dict[str, pd.DataFrame]
+    ) -> dict[str, np.ndarray]:
+        return {
+            symbol: self.models[symbol].predict(
+                df_features.drop([self.INITIAL_INDEX_COL], axis=1)
+            )
+            for symbol, df_features in dict_all_features_dfs.items()
+        }
+
     def predict(
         self,
         df_predict: pd.DataFrame,
@@ -191,39 +358,34 @@ class UnivariateLightGBMs(ForecastModel):
             df_predict, index_start, index_end
         )
 
+        dict_predictions_lgbm = self._predict_symbols(dict_all_features_dfs)
+
         for i, symbol in enumerate(df_predict.columns):
-            predictions_lgbm = self.models[symbol].predict(
-                dict_all_features_dfs[symbol].drop([self.INITIAL_INDEX_COL], axis=1)
-            )
-            df_preds = dict_all_features_dfs[symbol][
-                [self.INITIAL_INDEX_COL, self.N_FORECAST_COL]
-            ].copy()
-            df_preds[self.PREDICTION_COL] = predictions_lgbm
-
-            predictions[:, i, :] = (
-                df_preds.groupby(self.INITIAL_INDEX_COL)[
-                    [self.INITIAL_INDEX_COL, self.N_FORECAST_COL, self.PREDICTION_COL]
-                ]
-                .apply(
-                    lambda x: (
-                        1
-                        + pd.Series(
-                            x.sort_values(by=self.N_FORECAST_COL)[
-                                self.PREDICTION_COL
-                            ].values
-                        )
-                    ).cumprod()
-                )
-                .sort_index()
-                .to_numpy()[:, :n_steps_predict]
+            assemble_cumulative_predictions(
+                initial_index=dict_all_features_dfs[symbol][
+                    self.INITIAL_INDEX_COL
+                ].to_numpy(),
+                n_forecast=dict_all_features_dfs[symbol][
+                    self.N_FORECAST_COL
+                ].to_numpy(),
+                predictions=dict_predictions_lgbm[symbol],
+                index_start=index_start,
+                out=predictions[:, i, :],
             )
 
         return predictions
 
 
 class MultivariateLightGBM(UnivariateLightGBMs):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.compiled_ensemble: Optional[CompiledTreeEnsemble] = None
+        # Whether the boosters can be compiled, unknown until the first prediction
+        self.is_compilable: Optional[bool] = None
+
     def preprocess(self, df: pd.DataFrame):
-        df_all_features = None
+        key_columns = [self.INITIAL_INDEX_COL, self.N_FORECAST_COL]
+        dfs_symbol_features: list[pd.DataFrame] = []
         df_all_labels: dict[str, pd.DataFrame] = dict()
         for symbol in df.columns:
             # Preprocess and split the data
@@ -241,67 +403,49 @@ class MultivariateLightGBM(UnivariateLightGBMs):
 
             df_symbol = df_symbol.rename(columns=column_renames)
 
-            if df_all_features is None:
-                df_all_features = df_symbol.drop(columns=[self.LABEL_COL])
-            else:
-                df_all_features = df_all_features.merge(
-                    df_symbol.drop(columns=[self.LABEL_COL]),
-                    on=[
-                        self.INITIAL_INDEX_COL,
-                        self.N_FORECAST_COL,
-                    ],
-                    how="inner",
+            # Only the first symbol keeps the key columns, in their original place
+            dfs_symbol_features.append(
+                df_symbol.drop(columns=[self.LABEL_COL]).set_index(
+                    key_columns, drop=bool(dfs_symbol_features)
                 )
+            )
 
             df_all_labels[symbol] = df_symbol[
                 [self.LABEL_COL, self.INITIAL_INDEX_COL, self.N_FORECAST_COL]
             ]
 
+        # Join the features of all symbols at once rather than growing the shared
+        # matrix one symbol at a time
+        df_all_features = pd.concat(dfs_symbol_features, axis=1, join="inner")
+        df_all_features = df_all_features.reset_index(drop=True)
+
         return df_all_features, df_all_labels
 
     def fit(
         self, df: pd.DataFrame, valid_range: Optional[tuple[int, int]] = None, **kwargs
     ):
-        # Make shared features dataset
-        df_all_features, df_all_labels = self.preprocess(df)
-        all_labels_train: dict[str, pd.DataFrame] = dict()
-        all_labels_valid: dict[str, pd.DataFrame] = dict()
-        df_train_all = df_all_features
-        df_valid_all = None
-        if valid_range is not None:
-            for symbol in df.columns:
-                all_labels_train[symbol] = df_all_labels[symbol][
-                    df_all_labels[symbol][self.INITIAL_INDEX_COL] < valid_range[0]
-                ]
-                all_labels_valid[symbol] = df_all_labels[symbol][
-                    (df_all_labels[symbol][self.INITIAL_INDEX_COL] >= valid_range[0])
-                    & (df_all_labels[symbol][self.INITIAL_INDEX_COL] < valid_range[1])
-                ]
+        def make_features_and_labels():
+            df_all_features, df_all_labels = self.preprocess(df)
+            labels = np.column_stack(
+                [df_all_labels[symbol][self.LABEL_COL] for symbol in df.columns]
+            )
+            return df_all_features, labels
 
-            df_train_all = df_all_features[
-                df_all_features[self.INITIAL_INDEX_COL] < valid_range[0]
-            ]
-            df_valid_all = df_all_features[
-                (df_all_features[self.INITIAL_INDEX_COL] >= valid_range[0])
-                & (df_all_features[self.INITIAL_INDEX_COL] < valid_range[1])
-            ]
+        self.compiled_ensemble = None
+        self.is_compilable = None
 
-        for symbol in df.columns:
+        # Make shared features datasets, binned once for all symbols
+        train_set, train_labels, valid_set, valid_labels = self.get_datasets(
+            df, make_features_and_labels, valid_range=valid_range
+        )
+
+        for i, symbol in enumerate(df.columns):
             logger.info(f"Training {symbol}...")
-            lgbm_model = LGBMRegressor(**self.lgbm_hpts)
-            lgbm_model.fit(
-                df_train_all.drop([self.INITIAL_INDEX_COL], axis=1),
-                all_labels_train[symbol][self.LABEL_COL],
-                eval_set=[
-                    (
-                        df_valid_all.drop([self.INITIAL_INDEX_COL], axis=1),
-                        all_labels_valid[symbol][self.LABEL_COL],
-                    )
-                ]
-                if df_valid_all is not None
-                else None,
-            )
-            self.models[symbol] = lgbm_model
+            train_set.set_label(train_labels[:, i])
+            if valid_set is not None:
+                valid_set.set_label(valid_labels[:, i])
+
+            self.train_booster(symbol, train_set, valid_set)
 
     def _get_dict_all_features_dfs(
         self,
@@ -311,7 +455,9 @@ class MultivariateLightGBM(UnivariateLightGBMs):
     ):
         df_all_features, _ = self.preprocess(df)
         df_all_features = df_all_features[
-            df_all_features[self.INITIAL_INDEX_COL].between(index_start, index_end)
+            df_all_features[self.INITIAL_INDEX_COL].between(
+                index_start, index_end, inclusive="left"
+            )
         ]
         dict_all_features_dfs: dict[str, pd.DataFrame] = dict()
 
@@ -319,3 +465,30 @@ class MultivariateLightGBM(UnivariateLightGBMs):
             dict_all_features_dfs[symbol] = df_all_features
 
         return dict_all_features_dfs
+
+    def _predict_symbols(
+        self, dict_all_features_dfs: dict[str, pd.DataFrame]
+    ) -> dict[str, np.ndarray]:
+        # All the symbols share the same features, so the boosters of all symbols
+        # are scored in a single pass of the compiled ensemble, unless they use
+        # features it does not support (e.g. linear trees or categorical splits)
+        symbols = list(dict_all_features_dfs.keys())
+        model_symbols = list(self.models.keys())
+        if self.is_compilable is None:
+            try:
+                self.compiled_ensemble = CompiledTreeEnsemble.from_boosters(
+                    [self.models[symbol] for symbol in model_symbols]
+                )
+                self.is_compilable = True
+            except UncompilableBoosterError as e:
+                logger.info(f"Predicting with the LightGBM boosters: {e}")
+                self.is_compilable = False
+
+        if not self.is_compilable:
+            return super()._predict_symbols(dict_all_features_dfs)
+
+        predictions = self.compiled_ensemble.predict(dict_all_features_dfs[symbols[0]])
+
+        return {
+            symbol: predictions[:, model_symbols.index(symbol)] for symbol in symbols
+        }
@@ -0,0 +1,306 @@
+from pathlib import Path
+from typing import Optional
+
+import numpy as np
+import pandas as pd
+from numpy.lib.stride_tricks import sliding_window_view
+
+from stock_prediction.helpers.logging.log_config import get_logger
+from stock_prediction.modeling.forecast_model import ForecastModel
+
+logger = get_logger()
+
+
+class UnivariateRLS(ForecastModel):
+    """
+    Online linear forecaster trained with recursive least squares (RLS).
+
+    For every symbol and horizon h, the return h steps after an origin is regressed
+    on an intercept and the last p returns up to the origin. Each new day gives one
+    new (features, label) pair per horizon, which is absorbed by a rank-one update
+    of the coefficients and their covariance, with exponential forgetting of the
+    older days. All the symbols and horizons are updated at once, so absorbing a
+    day costs a few small array operations instead of a refit.
+    """
+
+    def __init__(
+        self,
+        p: int = 5,
+        n_steps_predict: int = 20,
+        forgetting_factor: float = 0.995,
+        initial_cov: float = 100.0,
+        **kwargs,
+    ):
+        """
+        Initialize the UnivariateRLS model.
+
+        Parameters
+        ----------
+        p : int, optional
+            The number of lagged returns of the features. Default is 5.
+        n_steps_predict : int, optional
+            The number of horizons with their own coefficients. Default is 20.
+        forgetting_factor : float, optional
+            The weight of the past days is multiplied by it every day, so the
+            effective memory is about 1 / (1 - forgetting_factor) days. Default is
+            0.995.
+        initial_cov : float, optional
+            The initial covariance of the coefficients (times the identity). Larger
+            values mean a weaker prior towards zero. Default is 100.
+
+        Attributes
+        ----------
+        coef : np.ndarray
+            The coefficients of shape (n_symbols, n_steps_predict, p + 1), with the
+            intercept first.
+        cov : np.ndarray
+            Their covariances, of shape (n_symbols, n_steps_predict, p + 1, p + 1).
+        history : np.ndarray
+            The last p + n_steps_predict - 1 returns, needed to absorb new days.
+        n_observations : int
+            The number of days absorbed.
+        """
+        self.p = p
+        self.n_steps_predict = n_steps_predict
+        self.forgetting_factor = forgetting_factor
+        self.initial_cov = initial_cov
+        self.symbols: list[str] = []
+        self.coef: Optional[np.ndarray] = None
+        self.cov: Optional[np.ndarray] = None
+        self.history: Optional[np.ndarray] = None
+        self.n_observations = 0
+
+    @property
+    def n_history(self) -> int:
+        return self.p + self.n_steps_predict - 1
+
+    def get_lags(self, values: np.ndarray) -> np.ndarray:
+        """
+        Gets the features of every row, the intercept and the last p returns.
+
+        Returns
+        -------
+        np.ndarray
+            The features of shape (n_rows, n_symbols, p + 1), which are NaN for the
+            rows with less than p returns up to them.
+        """
+        padded = np.vstack([np.full((self.p - 1, values.shape[1]), np.nan), values])
+        lags = sliding_window_view(padded, self.p, axis=0)[..., ::-1]
+
+        return np.concatenate([np.ones(lags.shape[:2] + (1,)), lags], axis=2)
+
+    def update_day(
+        self,
+        coef: np.ndarray,
+        cov: np.ndarray,
+        features: np.ndarray,
+        labels: np.ndarray,
+    ):
+        """
+        Absorbs the pairs of one day into the coefficients and covariances in place.
+
+        Parameters
+        ----------
+        coef, cov : np.ndarray
+            The coefficients and covariances, see the attributes.
+        features : np.ndarray
+            The features of the origin of each horizon, of shape
+            (n_symbols, n_steps_predict, p + 1).
+        labels : np.ndarray
+            The return of the day, of shape (n_symbols,), which is the label of all
+            the horizons.
+        """
+        labels = np.broadcast_to(labels[:, np.newaxis], features.shape[:2])
+        is_valid = np.isfinite(labels) & np.isfinite(features).all(axis=2)
+        features = np.where(is_valid[..., np.newaxis], features, 0.0)
+
+        cov_features = np.einsum("shmn,shn->shm", cov, features)
+        gain = cov_features / (
+            self.forgetting_factor
+            + np.einsum("shm,shm->sh", features, cov_features)[..., np.newaxis]
+        )
+        errors = np.where(
+            is_valid, labels - np.einsum("shm,shm->sh", coef, features), 0.0
+        )
+
+        coef += gain * errors[..., np.newaxis]
+        # Missing pairs leave the covariance unchanged instead of forgetting
+        cov -= np.where(
+            is_valid[..., np.newaxis, np.newaxis],
+            gain[..., np.newaxis] * cov_features[..., np.newaxis, :],
+            0.0,
+        )
+        cov /= np.where(is_valid, self.forgetting_factor, 1.0)[
+            ..., np.newaxis, np.newaxis
+        ]
+
+    def absorb(
+        self,
+        coef: np.ndarray,
+        cov: np.ndarray,
+        values: np.ndarray,
+        features: np.ndarray,
+        rows: range,
+    ):
+        """
+        Absorbs some rows of an array of returns, in order, in place.
+
+        Parameters
+        ----------
+        coef, cov : np.ndarray
+            The coefficients and covariances, see the attributes.
+        values : np.ndarray
+            The returns of shape (n_rows, n_symbols), including the returns before
+            the absorbed rows that their features need.
+        features : np.ndarray
+            The features of the rows of values, see get_lags.
+        rows : range
+            The rows to absorb.
+        """
+        for row in rows:
+            # Features of the origins row - 1, ..., row - n_steps_predict
+            origins = row - np.arange(1, self.n_steps_predict + 1)
+            features_day = np.where(
+                (origins >= 0)[np.newaxis, :, np.newaxis],
+                features[np.maximum(origins, 0)].transpose(1, 0, 2),
+                np.nan,
+            )
+            self.update_day(coef, cov, features_day, values[row])
+
+    def fit(self, df: pd.DataFrame, **kwargs):
+        """
+        Fit the UnivariateRLS from scratch, absorbing every day of df in order.
+
+        Parameters
+        ----------
+        df : pd.DataFrame
+            The dataframe containing the training data.
+        """
+        n_symbols = df.shape[1]
+        self.symbols = list(df.columns)
+        self.coef = np.zeros((n_symbols, self.n_steps_predict, self.p + 1))
+        self.cov = np.broadcast_to(
+            self.initial_cov * np.eye(self.p + 1), self.coef.shape + (self.p + 1,)
+        ).copy()
+        self.history = np.zeros((0, n_symbols))
+        self.n_observations = 0
+
+        self.update(df)
+
+    def update(self, df_new: pd.DataFrame):
+        """
+        Absorbs the days following the ones the model has absorbed so far.
+
+        Parameters
+        ----------
+        df_new : pd.DataFrame
+            The returns of the new days, with the same symbols as the fit.
+        """
+        if self.coef is None:
+            raise ValueError("Model must be fit before calling update.")
+
+        values = np.vstack(
+            [self.history, df_new[self.symbols].to_numpy(dtype=np.float64)]
+        )
+        self.absorb(
+            self.coef,
+            self.cov,
+            values,
+            self.get_lags(values),
+            range(len(self.history), len(values)),
+        )
+
+        self.history = values[-self.n_history :]
+        self.n_observations += len(df_new)
+        logger.info(f"The RLS models absorbed {len(df_new)} days.")
+
+    def predict(
+        self,
+        df_predict: pd.DataFrame,
+        n_steps_predict: int,
+        index_start: Optional[int] = None,
+        index_end: Optional[int] = None,
+        **kwargs,
+    ):
+        """
+        Predict future values using the UnivariateRLS.
+
+        The rows of df_predict are assumed to continue the days absorbed so far
+        from its first row, as when the model was fit on df_predict.iloc[:n]. The
+        origins after the absorbed days are absorbed one at a time, on a copy of the
+        state, before forecasting from them.
+
+        Parameters
+        ----------
+        df_predict : pd.DataFrame
+            The dataframe containing the data to predict from.
+        n_steps_predict : int
+            The number of steps ahead to predict.
+        index_start : int, optional
+            The starting index for prediction. If None, defaults to the last available index minus n_steps_predict.
+        index_end : int, optional
+            The ending index for prediction. If None, defaults to the last available index minus n_steps_predict + 1.
+
+        Returns
+        -------
+        np.ndarray
+            A numpy array of predicted values of shape
+            (index_end - index_start, df_predict.shape[1], n_steps_predict).
+        """
+        if self.coef is None:
+            raise ValueError("Model must be fit before calling predict.")
+        if n_steps_predict > self.n_steps_predict:
+            raise ValueError(
+                "n_steps_predict cannot be greater than the "
+                f"model's n_steps_predict ({self.n_steps_predict})"
+            )
+
+        if index_start is None:
+            index_start = df_predict.shape[0] - n_steps_predict
+        if index_end is None:
+            index_end = df_predict.shape[0] - n_steps_predict + 1
+
+        symbol_indices = pd.Index(self.symbols).get_indexer(df_predict.columns)
+        if (symbol_indices < 0).any():
+            raise ValueError("df_predict has symbols the model was not fit on.")
+
+        values = df_predict[self.symbols].to_numpy(dtype=np.float64)
+        features = self.get_lags(values)
+        coef, cov = self.coef.copy(), self.cov.copy()
+
+        n_absorbed = self.n_observations
+        returns = np.zeros(
+            (index_end - index_start, len(self.symbols), n_steps_predict)
+        )
+        for origin in range(index_start, index_end):
+            if origin >= n_absorbed:
+                self.absorb(coef, cov, values, features, range(n_absorbed, origin + 1))
+                n_absorbed = origin + 1
+
+            returns[origin - index_start] = np.einsum(
+                "shm,sm->sh", coef[:, :n_steps_predict], features[origin]
+            )
+
+        return np.cumprod(1 + returns[:, symbol_indices], axis=2)
+
+    def get_state(self) -> dict[str, np.ndarray]:
+        return {
+            "symbols": np.array(self.symbols, dtype=str),
+            "coef": self.coef,
+            "cov": self.cov,
+            "history": self.history,
+            "n_observations": np.array(self.n_observations),
+        }
+
+    def save(self, path: Path):
+        np.savez_compressed(path, **self.get_state())
+
+    def load(self, path: Path):
+        with np.load(path) as state:
+            self.symbols = state["symbols"].tolist()
+            self.coef = state["coef"]
+            self.cov = state["cov"]
+            self.history = state["history"]
+            self.n_observations = int(state["n_observations"])
+
+        self.n_steps_predict, self.p = self.coef.shape[1], self.coef.shape[2] - 1
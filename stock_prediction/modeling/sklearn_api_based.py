@@ -1,15 +1,23 @@
+import copy
 from calendar import monthrange
-from typing import Optional
+from typing import Callable, Iterator, Optional
 
 import numpy as np
 import pandas as pd
-from sklearn.base import BaseEstimator
+from joblib import Parallel, delayed
+from sklearn.base import BaseEstimator, clone
+from sklearn.linear_model import LinearRegression, Ridge
 
 from stock_prediction.helpers.logging.log_config import get_logger
 from stock_prediction.modeling.forecast_model import ForecastModel
+from stock_prediction.utils.series import assemble_cumulative_predictions
 
 logger = get_logger()
 
+# Linear estimators fitted on the labels of all symbols at once by
+# MultivariateSklearnAPIBased
+MULTI_TARGET_LINEAR_MODELS = (LinearRegression, Ridge)
+
 
 def get_time_features(row: pd.DataFrame) -> pd.Series:
     row_ = row["Date"]
@@ -26,6 +34,75 @@ def get_time_features(row: pd.DataFrame) -> pd.Series:
     )
 
 
+def get_target_estimator(estimator: BaseEstimator, i: int) -> BaseEstimator:
+    """
+    Gets the fitted single-target estimator of one target of a linear estimator.
+
+    Parameters
+    ----------
+    estimator : BaseEstimator
+        A linear estimator fitted on a matrix of targets.
+    i : int
+        The index of the target.
+
+    Returns
+    -------
+    BaseEstimator
+        An estimator of the same class, fitted as if only on target i.
+    """
+    target_estimator = clone(estimator)
+    for attribute, value in vars(estimator).items():
+        # Copy the fitted attributes (e.g. n_features_in_, feature_names_in_)
+        if attribute.endswith("_") and not attribute.startswith("_"):
+            setattr(target_estimator, attribute, value)
+
+    target_estimator.coef_ = estimator.coef_[i]
+    # Without fit_intercept, the intercept is the scalar 0.0 for all targets
+    target_estimator.intercept_ = (
+        estimator.intercept_
+        if np.ndim(estimator.intercept_) == 0
+        else estimator.intercept_[i]
+    )
+
+    return target_estimator
+
+
+def _call_on_column(
+    function: Callable,
+    values: np.ndarray,
+    index: pd.Index,
+    i: int,
+    name: str,
+    **kwargs,
+):
+    # Runs in the joblib workers, where values may be a read-only memory map
+    return function(pd.Series(values[:, i], index=index, name=name), **kwargs)
+
+
+def _fit_estimator(
+    model_class_type: BaseEstimator,
+    hpts: dict,
+    X_train: np.ndarray,
+    y_train: np.ndarray,
+    columns: pd.Index,
+    X_valid: Optional[np.ndarray] = None,
+    y_valid: Optional[np.ndarray] = None,
+) -> BaseEstimator:
+    # Runs in the joblib workers. The features are rebuilt as dataframes (without
+    # copying) so that the estimators keep the feature names.
+    model = model_class_type(**hpts)
+    if X_valid is not None:
+        model.fit(
+            pd.DataFrame(X_train, columns=columns, copy=False),
+            y_train,
+            eval_set=[(pd.DataFrame(X_valid, columns=columns, copy=False), y_valid)],
+        )
+    else:
+        model.fit(pd.DataFrame(X_train, columns=columns, copy=False), y_train)
+
+    return model
+
+
 def make_shifted_series_df(
     series: pd.Series, min_shift: int, max_shift: int, shift_name: str = "shifted"
 ):
@@ -63,6 +140,10 @@ class UnivariateSklearnAPIBased(ForecastModel):
         stats: list[str] = ["mean", "std", "min", "max"],
         n_shifts: int = 20,
         n_steps_predict: int = 20,
+        batch_size: Optional[int] = None,
+        n_epochs: int = 1,
+        n_jobs: int = 1,
+        prefer: str = "processes",
         **kwargs,
     ):
 
@@ -72,9 +153,23 @@ class UnivariateSklearnAPIBased(ForecastModel):
         self.n_shifts = n_shifts
         self.n_steps_predict = n_steps_predict
         self.hpts = hpts or dict()
+        # Streaming training with partial_fit, if batch_size is given
+        self.batch_size = batch_size
+        self.n_epochs = n_epochs
+        # Symbol level parallelism with joblib. Processes suit estimators that hold
+        # the GIL (and the pandas preprocessing), threads suit estimators that
+        # release it or are already parallel (e.g. LGBMRegressor with n_jobs > 1)
+        self.n_jobs = n_jobs
+        self.prefer = prefer
         self.models: dict[str, BaseEstimator] = dict()
 
-    def preprocess(self, series: pd.Series) -> pd.DataFrame:
+    @property
+    def n_lookback(self) -> int:
+        return max(self.windows + [self.n_shifts])
+
+    def make_features_and_labels(
+        self, series: pd.Series
+    ) -> tuple[pd.DataFrame, pd.DataFrame]:
         series_reset = series.reset_index(drop=True)
 
         df_time_features = series.reset_index().apply(get_time_features, axis=1)
@@ -96,12 +191,13 @@ class UnivariateSklearnAPIBased(ForecastModel):
 
         df_all_features = pd.concat(
             [df_time_features, df_shifted_series, df_rolling_features], axis=1
-        ).iloc[max(self.windows + [self.n_shifts]) : -self.n_steps_predict]
+        )
 
-        df_labels = df_labels.iloc[
-            max(self.windows + [self.n_shifts]) : -self.n_steps_predict
-        ]
+        return df_all_features, df_labels
 
+    def expand_horizons(
+        self, df_all_features: pd.DataFrame, df_labels: pd.DataFrame
+    ) -> pd.DataFrame:
         df_processed_list = []
         for col in df_labels.columns:
             df_tmp = df_all_features.copy()
@@ -117,71 +213,231 @@ class UnivariateSklearnAPIBased(ForecastModel):
 
         return df_processed_expanded
 
+    def preprocess(self, series: pd.Series) -> pd.DataFrame:
+        df_all_features, df_labels = self.make_features_and_labels(series)
+
+        return self.expand_horizons(
+            df_all_features.iloc[self.n_lookback : -self.n_steps_predict],
+            df_labels.iloc[self.n_lookback : -self.n_steps_predict],
+        )
+
+    def iter_minibatches(
+        self, series: pd.Series, batch_size: int, index_end: Optional[int] = None
+    ) -> Iterator[tuple[pd.DataFrame, pd.Series]]:
+        """
+        Generates minibatches of the horizon expanded dataset of a series.
+
+        The features of each minibatch are computed from the slice of the series
+        it needs (including the lookback of the rolling windows and shifts), so the
+        full horizon expanded dataset is never built.
+
+        Parameters
+        ----------
+        series : pd.Series
+            The series to generate the minibatches from.
+        batch_size : int
+            The approximate number of rows per minibatch. Each minibatch holds all
+            the horizons of batch_size // n_steps_predict consecutive initial
+            indices (at least one).
+        index_end : int, optional
+            Only initial indices before index_end are generated. If None, all the
+            initial indices with labels for every horizon are generated.
+
+        Yields
+        ------
+        tuple[pd.DataFrame, pd.Series]
+            The features, with the same columns as ``preprocess`` minus the label
+            and initial index, and the labels of a minibatch.
+        """
+        n_origins_batch = max(1, batch_size // self.n_steps_predict)
+        index_last = len(series) - self.n_steps_predict
+        if index_end is not None:
+            index_last = min(index_last, index_end)
+
+        for index_batch in range(self.n_lookback, index_last, n_origins_batch):
+            n_origins = min(n_origins_batch, index_last - index_batch)
+            df_all_features, df_labels = self.make_features_and_labels(
+                series.iloc[
+                    index_batch
+                    - self.n_lookback : index_batch
+                    + n_origins
+                    + self.n_steps_predict
+                ]
+            )
+
+            df_batch = self.expand_horizons(
+                df_all_features.iloc[self.n_lookback : self.n_lookback + n_origins],
+                df_labels.iloc[self.n_lookback : self.n_lookback + n_origins],
+            )
+
+            yield (
+                df_batch.drop([self.LABEL_COL, self.INITIAL_INDEX_COL], axis=1),
+                df_batch[self.LABEL_COL],
+            )
+
+    def get_worker(self) -> "UnivariateSklearnAPIBased":
+        """
+        Gets a copy of the model without fitted estimators, to send to the workers.
+
+        The estimators a worker needs are passed to it explicitly, so that a task
+        never pickles the estimators of the other symbols.
+        """
+        worker = copy.copy(self)
+        worker.models = dict()
+        return worker
+
+    def run_per_symbol(
+        self,
+        function: Callable,
+        df: pd.DataFrame,
+        symbol_kwargs: Optional[dict[str, dict]] = None,
+        **kwargs,
+    ) -> list:
+        """
+        Runs a function on the series of every symbol, in parallel if n_jobs != 1.
+
+        The panel is passed to the workers as a single array, which joblib
+        memory-maps when it is sent to worker processes, so every worker reads the
+        same copy of it instead of receiving a pickled series per task.
+
+        Parameters
+        ----------
+        function : Callable
+            Called as ``function(series, **kwargs, **symbol_kwargs[symbol])``.
+        df : pd.DataFrame
+            The dataframe with one column per symbol.
+        symbol_kwargs : dict[str, dict], optional
+            The keyword arguments specific to each symbol.
+        **kwargs
+            The keyword arguments shared by all the symbols.
+
+        Returns
+        -------
+        list
+            The results of the function, in the order of the columns of df.
+        """
+        values = df.to_numpy()
+        symbol_kwargs = symbol_kwargs or dict()
+
+        return Parallel(n_jobs=self.n_jobs, prefer=self.prefer)(
+            delayed(_call_on_column)(
+                function,
+                values,
+                df.index,
+                i,
+                symbol,
+                **kwargs,
+                **symbol_kwargs.get(symbol, dict()),
+            )
+            for i, symbol in enumerate(df.columns)
+        )
+
+    def fit_symbol(
+        self, series: pd.Series, valid_range: Optional[tuple[int, int]] = None
+    ) -> BaseEstimator:
+        print(f"Training {series.name}...")
+        # Preprocess and split the data
+        df_all = self.preprocess(series)
+        df_valid = None
+
+        if valid_range is not None:
+            df_train = df_all[df_all[self.INITIAL_INDEX_COL] < valid_range[0]]
+            df_valid = df_all[
+                (df_all[self.INITIAL_INDEX_COL] >= valid_range[0])
+                & (df_all[self.INITIAL_INDEX_COL] < valid_range[1])
+            ]
+        else:
+            df_train = df_all
+
+        # Initialize and fit the model
+        model = self.model_class_type(**self.hpts)
+        if df_valid is not None:
+            model.fit(
+                df_train.drop([self.LABEL_COL, self.INITIAL_INDEX_COL], axis=1),
+                df_train[self.LABEL_COL],
+                eval_set=[
+                    (
+                        df_valid.drop([self.LABEL_COL, self.INITIAL_INDEX_COL], axis=1),
+                        df_valid[self.LABEL_COL],
+                    )
+                ],
+            )
+        else:
+            model.fit(
+                df_train.drop([self.LABEL_COL, self.INITIAL_INDEX_COL], axis=1),
+                df_train[self.LABEL_COL],
+            )
+
+        return model
+
     def fit(
         self, df: pd.DataFrame, valid_range: Optional[tuple[int, int]] = None, **kwargs
     ):
-        for symbol in df.columns:
-            print(f"Training {symbol}...")
-            # Preprocess and split the data
-            df_all = self.preprocess(df[symbol])
-            df_valid = None
-
-            if valid_range is not None:
-                df_train = df_all[df_all[self.INITIAL_INDEX_COL] < valid_range[0]]
-                df_valid = df_all[
-                    (df_all[self.INITIAL_INDEX_COL] >= valid_range[0])
-                    & (df_all[self.INITIAL_INDEX_COL] < valid_range[1])
-                ]
-            else:
-                df_train = df_all
-
-            # Initialize and fit the model
-            model = self.model_class_type(**self.hpts)
-            if df_valid is not None:
-                model.fit(
-                    df_train.drop([self.LABEL_COL, self.INITIAL_INDEX_COL], axis=1),
-                    df_train[self.LABEL_COL],
-                    eval_set=[
-                        (
-                            df_valid.drop(
-                                [self.LABEL_COL, self.INITIAL_INDEX_COL], axis=1
-                            ),
-                            df_valid[self.LABEL_COL],
-                        )
-                    ],
-                )
-            else:
-                model.fit(
-                    df_train.drop([self.LABEL_COL, self.INITIAL_INDEX_COL], axis=1),
-                    df_train[self.LABEL_COL],
-                )
-            self.models[symbol] = model
+        if self.batch_size is not None:
+            self.fit_minibatches(df, self.batch_size, valid_range=valid_range)
+            return
 
-    def _get_dict_all_features_dfs(
+        models = self.run_per_symbol(
+            self.get_worker().fit_symbol, df, valid_range=valid_range
+        )
+        self.models.update(zip(df.columns, models))
+
+    def fit_symbol_minibatches(
+        self, series: pd.Series, batch_size: int, index_end: Optional[int] = None
+    ) -> BaseEstimator:
+        print(f"Training {series.name}...")
+        model = self.model_class_type(**self.hpts)
+        for _ in range(self.n_epochs):
+            for df_batch_features, batch_labels in self.iter_minibatches(
+                series, batch_size, index_end=index_end
+            ):
+                model.partial_fit(df_batch_features, batch_labels)
+
+        return model
+
+    def fit_minibatches(
         self,
         df: pd.DataFrame,
-        index_start: Optional[int] = None,
-        index_end: Optional[int] = None,
+        batch_size: int,
+        valid_range: Optional[tuple[int, int]] = None,
     ):
-        dict_all_features_dfs: dict[str, pd.DataFrame] = dict()
-        for symbol in df.columns:
-            df_features = self.preprocess(df[symbol])
-            df_features = df_features[
-                df_features[self.INITIAL_INDEX_COL].between(index_start, index_end)
-            ].drop(columns=[self.LABEL_COL])
-            dict_all_features_dfs[symbol] = df_features
+        """
+        Fits the models with partial_fit on minibatches streamed from the series.
+
+        Parameters
+        ----------
+        df : pd.DataFrame
+            The dataframe containing the training data.
+        batch_size : int
+            The approximate number of rows per minibatch.
+        valid_range : tuple[int, int], optional
+            The range of initial indices used for validation. Only the initial
+            indices before it are trained on, since partial_fit takes no
+            evaluation set.
+        """
+        if not hasattr(self.model_class_type, "partial_fit"):
+            raise ValueError(
+                f"{self.model_class_type.__name__} does not support partial_fit, "
+                "so it cannot be trained with a batch_size."
+            )
 
-        return dict_all_features_dfs
+        index_end = valid_range[0] if valid_range is not None else None
 
-    def predict(
+        models = self.run_per_symbol(
+            self.get_worker().fit_symbol_minibatches,
+            df,
+            batch_size=batch_size,
+            index_end=index_end,
+        )
+        self.models.update(zip(df.columns, models))
+
+    def get_predict_range(
         self,
         df_predict: pd.DataFrame,
         n_steps_predict: int,
         index_start: Optional[int] = None,
         index_end: Optional[int] = None,
-        **kwargs,
-    ):
-
+    ) -> tuple[int, int]:
         if n_steps_predict > self.n_steps_predict:
             raise ValueError(
                 "n_steps_predict cannot be greater than the "
@@ -193,45 +449,82 @@ class UnivariateSklearnAPIBased(ForecastModel):
         if index_end is None:
             index_end = df_predict.shape[0] - n_steps_predict + 1
 
-        predictions = np.zeros(
-            (index_end - index_start, df_predict.shape[1], n_steps_predict)
+        return index_start, index_end
+
+    def predict_symbol(
+        self,
+        series: pd.Series,
+        model: BaseEstimator,
+        n_steps_predict: int,
+        index_start: int,
+        index_end: int,
+    ) -> np.ndarray:
+        """
+        Predicts the cumulative returns of one symbol.
+
+        Returns
+        -------
+        np.ndarray
+            The predictions, of shape (index_end - index_start, n_steps_predict).
+        """
+        df_features = self.preprocess(series)
+        df_features = df_features[
+            df_features[self.INITIAL_INDEX_COL].between(
+                index_start, index_end, inclusive="left"
+            )
+        ].drop(columns=[self.LABEL_COL])
+
+        predictions = np.zeros((index_end - index_start, n_steps_predict))
+        assemble_cumulative_predictions(
+            initial_index=df_features[self.INITIAL_INDEX_COL].to_numpy(),
+            n_forecast=df_features[self.N_FORECAST_COL].to_numpy(),
+            predictions=model.predict(
+                df_features.drop([self.INITIAL_INDEX_COL], axis=1)
+            ),
+            index_start=index_start,
+            out=predictions,
         )
 
-        dict_all_features_dfs = self._get_dict_all_features_dfs(
-            df_predict, index_start, index_end
+        return predictions
+
+    def predict(
+        self,
+        df_predict: pd.DataFrame,
+        n_steps_predict: int,
+        index_start: Optional[int] = None,
+        index_end: Optional[int] = None,
+        **kwargs,
+    ):
+        index_start, index_end = self.get_predict_range(
+            df_predict, n_steps_predict, index_start, index_end
         )
 
-        for i, symbol in enumerate(df_predict.columns):
-            predictions_model = self.models[symbol].predict(
-                dict_all_features_dfs[symbol].drop([self.INITIAL_INDEX_COL], axis=1)
-            )
-            df_preds = dict_all_features_dfs[symbol][
-                [self.INITIAL_INDEX_COL, self.N_FORECAST_COL]
-            ].copy()
-            df_preds[self.PREDICTION_COL] = predictions_model
-
-            predictions[:, i, :] = (
-                df_preds.groupby(self.INITIAL_INDEX_COL)[
-                    [self.INITIAL_INDEX_COL, self.N_FORECAST_COL, self.PREDICTION_COL]
-                ]
-                .apply(
-                    lambda x: (
-                        1
-                        + pd.Series(
-                            x.sort_values(by=self.N_FORECAST_COL)[
-                                self.PREDICTION_COL
-                            ].values
-                        )
-                    ).cumprod()
-                )
-                .sort_index()
-                .to_numpy()[:, :n_steps_predict]
-            )
+        symbol_predictions = self.run_per_symbol(
+            self.get_worker().predict_symbol,
+            df_predict,
+            symbol_kwargs={
+                symbol: {"model": self.models[symbol]} for symbol in df_predict.columns
+            },
+            n_steps_predict=n_steps_predict,
+            index_start=index_start,
+            index_end=index_end,
+        )
 
-        return predictions
+        return np.stack(symbol_predictions, axis=1)
 
 
 class MultivariateSklearnAPIBased(UnivariateSklearnAPIBased):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        if self.batch_size is not None:
+            raise ValueError(
+                "Minibatch training is only supported by UnivariateSklearnAPIBased, "
+                "batch_size must be None."
+            )
+        # Single estimator fitted on the labels of all symbols, for linear models
+        self.multi_target_model: Optional[BaseEstimator] = None
+        self.multi_target_symbols: list[str] = []
+
     def preprocess(self, df: pd.DataFrame):
         df_all_features = None
         df_all_labels: dict[str, pd.DataFrame] = dict()
@@ -301,29 +594,89 @@ class MultivariateSklearnAPIBased(UnivariateSklearnAPIBased):
                 all_labels_train[symbol] = df_all_labels[symbol]
             df_train_all = df_all_features
 
-        for symbol in df.columns:
-            logger.info(f"Training {symbol}...")
-            model = self.model_class_type(**self.hpts)
-            if df_valid_all is not None:
-                model.fit(
-                    df_train_all.drop([self.INITIAL_INDEX_COL], axis=1),
-                    all_labels_train[symbol][self.LABEL_COL],
-                    eval_set=[
-                        (
-                            df_valid_all.drop([self.INITIAL_INDEX_COL], axis=1),
-                            all_labels_valid[symbol][self.LABEL_COL],
-                        )
-                    ]
-                    if df_valid_all is not None
-                    else None,
-                )
-            else:
-                model.fit(
-                    df_train_all.drop([self.INITIAL_INDEX_COL], axis=1),
-                    all_labels_train[symbol][self.LABEL_COL],
-                )
+        self.multi_target_model = None
+        if issubclass(self.model_class_type, MULTI_TARGET_LINEAR_MODELS):
+            self.fit_multi_target(df_train_all, all_labels_train)
+            return
+
+        # The shared features are converted to arrays once, which joblib
+        # memory-maps when they are sent to worker processes
+        df_X_train = df_train_all.drop([self.INITIAL_INDEX_COL], axis=1)
+        X_train = df_X_train.to_numpy()
+        X_valid = (
+            df_valid_all.drop([self.INITIAL_INDEX_COL], axis=1).to_numpy()
+            if df_valid_all is not None
+            else None
+        )
+        logger.info(f"Training {len(df.columns)} symbols...")
+        models = Parallel(n_jobs=self.n_jobs, prefer=self.prefer)(
+            delayed(_fit_estimator)(
+                self.model_class_type,
+                self.hpts,
+                X_train,
+                all_labels_train[symbol][self.LABEL_COL].to_numpy(),
+                df_X_train.columns,
+                X_valid,
+                all_labels_valid[symbol][self.LABEL_COL].to_numpy()
+                if X_valid is not None
+                else None,
+            )
+            for symbol in df.columns
+        )
+        self.models.update(zip(df.columns, models))
+
+    def fit_multi_target(
+        self, df_train_all: pd.DataFrame, all_labels_train: dict[str, pd.DataFrame]
+    ):
+        """
+        Fits a linear model for all symbols at once on the shared features.
+
+        The linear estimators in MULTI_TARGET_LINEAR_MODELS solve for a matrix of
+        labels with a single factorization of the features (e.g. Cholesky for
+        Ridge, SVD for LinearRegression), instead of one fit per symbol. The
+        solution is then split into one fitted estimator per symbol.
+
+        Parameters
+        ----------
+        df_train_all : pd.DataFrame
+            The shared training features, including the initial index column.
+        all_labels_train : dict[str, pd.DataFrame]
+            The training labels of each symbol, aligned with the features.
+        """
+        symbols = list(all_labels_train.keys())
+        logger.info(
+            f"Training {len(symbols)} symbols with a single "
+            f"{self.model_class_type.__name__}..."
+        )
 
-            self.models[symbol] = model
+        self.multi_target_model = self.model_class_type(**self.hpts).fit(
+            df_train_all.drop([self.INITIAL_INDEX_COL], axis=1),
+            np.column_stack(
+                [all_labels_train[symbol][self.LABEL_COL] for symbol in symbols]
+            ),
+        )
+        self.multi_target_symbols = symbols
+
+        for i, symbol in enumerate(symbols):
+            self.models[symbol] = get_target_estimator(self.multi_target_model, i)
+
+    def _predict_symbols(
+        self, dict_all_features_dfs: dict[str, pd.DataFrame]
+    ) -> dict[str, np.ndarray]:
+        # All the symbols share the same features, so they are only prepared once
+        symbols = list(dict_all_features_dfs.keys())
+        X = dict_all_features_dfs[symbols[0]].drop([self.INITIAL_INDEX_COL], axis=1)
+
+        if self.multi_target_model is not None and set(symbols) <= set(
+            self.multi_target_symbols
+        ):
+            predictions = self.multi_target_model.predict(X)
+            return {
+                symbol: predictions[:, self.multi_target_symbols.index(symbol)]
+                for symbol in symbols
+            }
+
+        return {symbol: self.models[symbol].predict(X) for symbol in symbols}
 
     def _get_dict_all_features_dfs(
         self,
@@ -333,7 +686,9 @@ class MultivariateSklearnAPIBased(UnivariateSklearnAPIBased):
     ):
         df_all_features, _ = self.preprocess(df)
         df_all_features = df_all_features[
-            df_all_features[self.INITIAL_INDEX_COL].between(index_start, index_end)
+            df_all_features[self.INITIAL_INDEX_COL].between(
+                index_start, index_end, inclusive="left"
+            )
         ]
         dict_all_features_dfs: dict[str, pd.DataFrame] = dict()
 
@@ -341,3 +696,40 @@ class MultivariateSklearnAPIBased(UnivariateSklearnAPIBased):
             dict_all_features_dfs[symbol] = df_all_features
 
         return dict_all_features_dfs
+
+    def predict(
+        self,
+        df_predict: pd.DataFrame,
+        n_steps_predict: int,
+        index_start: Optional[int] = None,
+        index_end: Optional[int] = None,
+        **kwargs,
+    ):
+        index_start, index_end = self.get_predict_range(
+            df_predict, n_steps_predict, index_start, index_end
+        )
+
+        predictions = np.zeros(
+            (index_end - index_start, df_predict.shape[1], n_steps_predict)
+        )
+
+        dict_all_features_dfs = self._get_dict_all_features_dfs(
+            df_predict, index_start, index_end
+        )
+
+        dict_predictions_model = self._predict_symbols(dict_all_features_dfs)
+
+        for i, symbol in enumerate(df_predict.columns):
+            assemble_cumulative_predictions(
+                initial_index=dict_all_features_dfs[symbol][
+                    self.INITIAL_INDEX_COL
+                ].to_numpy(),
+                n_forecast=dict_all_features_dfs[symbol][
+                    self.N_FORECAST_COL
+                ].to_numpy(),
+                predictions=dict_predictions_model[symbol],
+                index_start=index_start,
+                out=predictions[:, i, :],
+            )
+
+        return predictions
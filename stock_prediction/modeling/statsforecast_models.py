@@ -0,0 +1,261 @@
+from typing import Optional, Union
+
+import numpy as np
+import pandas as pd
+from statsforecast import StatsForecast
+from statsforecast.models import AutoARIMA, AutoETS, Theta
+
+from stock_prediction.helpers.logging.log_config import get_logger
+from stock_prediction.modeling.forecast_model import ForecastModel
+
+logger = get_logger()
+
+
+def make_long_df(df: pd.DataFrame, n_rows_padding: int = 0) -> pd.DataFrame:
+    """
+    Converts a dataframe of returns into statsforecast's long format.
+
+    The time stamps are the integer row indices (with freq=1), so that the gaps of
+    the trading calendar are irrelevant. The missing values before the first
+    observation of a symbol are dropped and any other missing value is set to 0.
+
+    Parameters
+    ----------
+    df : pd.DataFrame
+        The dataframe with one column of returns per symbol.
+    n_rows_padding : int, optional
+        The number of rows of zeros appended after the data, e.g. so that
+        cross-validation windows can end after the last row. Default is 0.
+
+    Returns
+    -------
+    pd.DataFrame
+        The dataframe with the columns unique_id, ds and y.
+    """
+    values = np.vstack(
+        [df.to_numpy(dtype=np.float64), np.zeros((n_rows_padding, df.shape[1]))]
+    )
+    is_started = np.maximum.accumulate(np.isfinite(values), axis=0)
+
+    ds, i_symbol = np.nonzero(is_started)
+    order = np.lexsort((ds, i_symbol))
+    ds, i_symbol = ds[order], i_symbol[order]
+
+    return pd.DataFrame(
+        {
+            "unique_id": df.columns.to_numpy()[i_symbol],
+            "ds": ds,
+            "y": np.nan_to_num(values[ds, i_symbol]),
+        }
+    )
+
+
+class UnivariateStatsForecast(ForecastModel):
+    """
+    Base class of the models running a statsforecast model on every symbol.
+
+    Subclasses set MODEL_CLASS, the statsforecast model class.
+    """
+
+    MODEL_CLASS: type = AutoARIMA
+
+    def __init__(
+        self,
+        n_jobs: int = 1,
+        refit: Union[bool, int] = False,
+        **model_kwargs,
+    ):
+        """
+        Initialize the model.
+
+        Parameters
+        ----------
+        n_jobs : int, optional
+            The number of processes statsforecast fits the symbols with. Default
+            is 1.
+        refit : bool or int, optional
+            Whether (or every how many origins) the models are refit on the data up
+            to the origins when predicting several origins. If False, the models
+            fitted by fit are only updated with the observations up to each
+            origin. Default is False.
+        **model_kwargs
+            The arguments of the statsforecast model, e.g. season_length.
+
+        Attributes
+        ----------
+        stats_forecast : StatsForecast
+            The statsforecast models fitted by fit, one per symbol.
+        """
+        self.n_jobs = n_jobs
+        self.refit = refit
+        self.model_kwargs = model_kwargs
+        self.stats_forecast: Optional[StatsForecast] = None
+
+    def make_stats_forecast(self) -> StatsForecast:
+        return StatsForecast(
+            models=[self.MODEL_CLASS(alias="forecast", **self.model_kwargs)],
+            freq=1,
+            n_jobs=self.n_jobs,
+        )
+
+    def fit(self, df: pd.DataFrame, **kwargs):
+        """
+        Fit the statsforecast model of every symbol to the given training data.
+
+        Parameters
+        ----------
+        df : pd.DataFrame
+            The dataframe containing the training data.
+        """
+        logger.info(
+            f"Fitting the {self.MODEL_CLASS.__name__} of {df.shape[1]} symbols..."
+        )
+        self.stats_forecast = self.make_stats_forecast().fit(df=make_long_df(df))
+
+    def get_fitted_models(self) -> dict:
+        return dict(
+            zip(self.stats_forecast.uids.tolist(), self.stats_forecast.fitted_[:, 0])
+        )
+
+    def predict(
+        self,
+        df_predict: pd.DataFrame,
+        n_steps_predict: int,
+        index_start: Optional[int] = None,
+        index_end: Optional[int] = None,
+        **kwargs,
+    ):
+        """
+        Predict future values with the fitted models.
+
+        The fitted model of each symbol forecasts every origin from the returns up
+        to it, without being fitted again, unless refit is set. Then the forecasts
+        of all the symbols and origins come from a single statsforecast
+        cross-validation whose windows are the origins.
+
+        Parameters
+        ----------
+        df_predict : pd.DataFrame
+            The dataframe containing the data to predict from.
+        n_steps_predict : int
+            The number of steps ahead to predict.
+        index_start : int, optional
+            The starting index for prediction. If None, defaults to the last available index minus n_steps_predict.
+        index_end : int, optional
+            The ending index for prediction. If None, defaults to the last available index minus n_steps_predict + 1.
+
+        Returns
+        -------
+        np.ndarray
+            A numpy array of predicted values of shape
+            (index_end - index_start, df_predict.shape[1], n_steps_predict).
+        """
+        if self.stats_forecast is None:
+            raise RuntimeError(
+                f"{type(self).__name__} must be fitted before predicting."
+            )
+        if index_start is None:
+            index_start = df_predict.shape[0] - n_steps_predict
+        if index_end is None:
+            index_end = df_predict.shape[0] - n_steps_predict + 1
+
+        if self.refit:
+            returns = self.cross_validate(
+                df_predict, n_steps_predict, index_start, index_end
+            )
+        else:
+            returns = self.forward(df_predict, n_steps_predict, index_start, index_end)
+
+        return np.cumprod(1 + returns, axis=2)
+
+    def forward(
+        self,
+        df_predict: pd.DataFrame,
+        n_steps_predict: int,
+        index_start: int,
+        index_end: int,
+    ) -> np.ndarray:
+        """
+        Forecasts the returns of every origin by applying the fitted model of each
+        symbol to its returns up to the origin.
+        """
+        df_long = make_long_df(df_predict.iloc[:index_end])
+        models = self.get_fitted_models()
+        returns = np.zeros(
+            (index_end - index_start, df_predict.shape[1], n_steps_predict)
+        )
+
+        symbols_unfitted = []
+        for symbol, df_symbol in df_long.groupby("unique_id", sort=False):
+            i_symbol = df_predict.columns.get_loc(symbol)
+            if symbol not in models:
+                symbols_unfitted.append(symbol)
+                continue
+            ds = df_symbol["ds"].to_numpy()
+            y = df_symbol["y"].to_numpy()
+            # Rows of the observations up to each origin
+            n_observed = np.searchsorted(ds, np.arange(index_start, index_end), "right")
+            for i_origin, n in enumerate(n_observed):
+                if n > 0:
+                    returns[i_origin, i_symbol] = models[symbol].forward(
+                        y=y[:n], h=n_steps_predict
+                    )["mean"]
+
+        if symbols_unfitted:
+            logger.warning(
+                f"No fitted model for {len(symbols_unfitted)} symbols, e.g. "
+                f"{symbols_unfitted[0]}, which are predicted without returns."
+            )
+
+        return returns
+
+    def cross_validate(
+        self,
+        df_predict: pd.DataFrame,
+        n_steps_predict: int,
+        index_start: int,
+        index_end: int,
+    ) -> np.ndarray:
+        """
+        Forecasts the returns of every origin with statsforecast's cross-validation,
+        refitting the models every refit origins.
+        """
+        n_origins = index_end - index_start
+
+        # The last window must end n_steps_predict rows after the last origin. Its
+        # (padded) actual values are not used by the forecasts.
+        df_data = df_predict.iloc[: index_end + n_steps_predict]
+        df_long = make_long_df(
+            df_data, n_rows_padding=index_end + n_steps_predict - len(df_data)
+        )
+
+        df_cv = self.make_stats_forecast().cross_validation(
+            df=df_long,
+            h=n_steps_predict,
+            step_size=1,
+            n_windows=n_origins,
+            refit=self.refit,
+        )
+        if "unique_id" not in df_cv.columns:
+            df_cv = df_cv.reset_index()
+
+        returns = np.zeros((n_origins, df_predict.shape[1], n_steps_predict))
+        returns[
+            df_cv["cutoff"].to_numpy() - index_start,
+            df_predict.columns.get_indexer(df_cv["unique_id"]),
+            df_cv["ds"].to_numpy() - df_cv["cutoff"].to_numpy() - 1,
+        ] = df_cv["forecast"].to_numpy()
+
+        return returns
+
+
+class UnivariateAutoARIMAs(UnivariateStatsForecast):
+    MODEL_CLASS = AutoARIMA
+
+
+class UnivariateAutoETS(UnivariateStatsForecast):
+    MODEL_CLASS = AutoETS
+
+
+class UnivariateThetas(UnivariateStatsForecast):
+    MODEL_CLASS = Theta
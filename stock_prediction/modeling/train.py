@@ -2,6 +2,7 @@
 This script is used to train the model periodically.
 """
 import argparse
+import json
 from datetime import datetime
 from pathlib import Path
 
@@ -9,10 +10,16 @@ import pandas as pd
 import yfinance as yf
 
 from stock_prediction.deployment.utils import PREDICTIONS_FILE_NAME
+from stock_prediction.etl.synthetic_data import write_synthetic_dataset
 from stock_prediction.etl.ticker_data_extractors import (
     extract_ticker_data,
     load_cleaned_dataset,
 )
+from stock_prediction.evaluation.conformal import (
+    ConformalIntervals,
+    calibrate_intervals,
+)
+from stock_prediction.evaluation.tensor_store import TensorStore
 from stock_prediction.helpers.logging.log_config import get_logger
 from stock_prediction.modeling.lightgbm_model import UnivariateLightGBMs
 
@@ -28,12 +35,77 @@ if __name__ == "__main__":
         "--n_steps_predict", type=int, default=20, help="Number of days to predict"
     )
 
+    parser.add_argument(
+        "--model_config",
+        type=Path,
+        default=None,
+        help="Json file with the model configuration, e.g. the output of tuning.py",
+    )
+
+    parser.add_argument(
+        "--offline",
+        action="store_true",
+        help="Use a synthetic dataset instead of downloading the data",
+    )
+
+    parser.add_argument(
+        "--n_synthetic_symbols",
+        type=int,
+        default=100,
+        help="Number of symbols of the synthetic dataset, with --offline",
+    )
+
+    parser.add_argument(
+        "--intervals_state",
+        type=Path,
+        default=None,
+        help="Npz file of the residuals of the conformal prediction intervals, "
+        "updated on every run. If None, no intervals are computed",
+    )
+
+    parser.add_argument(
+        "--calibration_predictions",
+        type=Path,
+        default=None,
+        help="TensorStore of backtest predictions the intervals are calibrated on "
+        "if the intervals state does not exist yet",
+    )
+
+    parser.add_argument(
+        "--calibration_actuals",
+        type=Path,
+        default=None,
+        help="TensorStore of the actuals of the calibration predictions",
+    )
+
+    parser.add_argument(
+        "--coverage", type=float, default=0.9, help="Coverage of the intervals"
+    )
+
+    parser.add_argument(
+        "--intervals_half_life",
+        type=float,
+        default=None,
+        help="Number of days after which the weight of a residual is halved. If "
+        "None, the half-life of the intervals state is kept",
+    )
+
     args = parser.parse_args()
+    if (args.calibration_predictions is None) != (args.calibration_actuals is None):
+        parser.error(
+            "--calibration_predictions and --calibration_actuals must be given "
+            "together"
+        )
 
     # Extract raw data
-    df_all_symbols = extract_ticker_data(
-        cache_path=Path("extracted_data.csv"), overwrite_cache=True
-    )
+    if args.offline:
+        df_all_symbols = write_synthetic_dataset(
+            Path("extracted_data.csv"), n_symbols=args.n_synthetic_symbols
+        )
+    else:
+        df_all_symbols = extract_ticker_data(
+            cache_path=Path("extracted_data.csv"), overwrite_cache=True
+        )
 
     # Clean the data
     df_all_symbols = load_cleaned_dataset(df_all_symbols)
@@ -41,22 +113,27 @@ if __name__ == "__main__":
     # Calculate cumulative returns to be able to get absolute prices
     df_all_symbols_cumulative = (1 + df_all_symbols).cumprod()
 
-    # Get last date in the dataset for which closing prices are available
-    latest_prices = None
-    i_latest_prices = len(df_all_symbols)
-    for i in range(len(df_all_symbols) - 1, 0, -1):
-        i_latest_prices = i
-        last_date = df_all_symbols.index[i_latest_prices]
-        latest_prices = yf.download(
-            list(df_all_symbols.columns),
-            start=last_date.strftime("%Y-%m-%d"),
-            end=datetime.now().strftime("%Y-%m-%d"),
-        )
-        if len(latest_prices["Close"]) != 0:
-            break
+    if args.offline:
+        # Synthetic prices starting at 100
+        i_latest_prices = len(df_all_symbols) - 1
+        last_day_close = 100 * df_all_symbols_cumulative.iloc[-1]
+    else:
+        # Get last date in the dataset for which closing prices are available
+        latest_prices = None
+        i_latest_prices = len(df_all_symbols)
+        for i in range(len(df_all_symbols) - 1, 0, -1):
+            i_latest_prices = i
+            last_date = df_all_symbols.index[i_latest_prices]
+            latest_prices = yf.download(
+                list(df_all_symbols.columns),
+                start=last_date.strftime("%Y-%m-%d"),
+                end=datetime.now().strftime("%Y-%m-%d"),
+            )
+            if len(latest_prices["Close"]) != 0:
+                break
 
-    # Extract the 'Adj Close' prices as of the last day in the extracted returns dataset
-    last_day_close = latest_prices["Close"][latest_prices.index == last_date.strftime("%Y-%m-%d")].iloc[0]  # type: ignore
+        # Extract the 'Adj Close' prices as of the last day in the extracted returns dataset
+        last_day_close = latest_prices["Close"][latest_prices.index == last_date.strftime("%Y-%m-%d")].iloc[0]  # type: ignore
     # Clip the end of the dataframes if needed, and select only the columns we need
     df_all_symbols = df_all_symbols.iloc[: i_latest_prices + 1][last_day_close.index]
     df_all_symbols_cumulative = df_all_symbols_cumulative.iloc[: i_latest_prices + 1][
@@ -77,10 +154,15 @@ if __name__ == "__main__":
     print(df_all_symbols)
 
     # Train the model
-    model = UnivariateLightGBMs(
-        windows=[5, 20, 60, 180, 400],
-        lgbm_hpts={"max_depth": 3, "learning_rate": 0.01},
-    )
+    if args.model_config is not None:
+        with open(args.model_config) as f:
+            model_kwargs = json.load(f)
+    else:
+        model_kwargs = dict(
+            windows=[5, 20, 60, 180, 400],
+            lgbm_hpts={"max_depth": 3, "learning_rate": 0.01},
+        )
+    model = UnivariateLightGBMs(**model_kwargs)
     model.fit(df_all_symbols)
 
     n_steps_predict = args.n_steps_predict
@@ -116,6 +198,69 @@ if __name__ == "__main__":
     )
     # name the index as Date
     df_predictions.index.name = "Date"
+
+    if args.intervals_state is not None:
+        # Add the residuals of the past predictions now observed, then get the
+        # conformal intervals of the new ones
+        symbols = list(last_day_close.index)
+        intervals_kwargs = dict(
+            coverage=args.coverage, half_life=args.intervals_half_life
+        )
+        if args.intervals_state.exists():
+            intervals = ConformalIntervals(symbols, n_steps_predict, **intervals_kwargs)
+            intervals.load(args.intervals_state)
+            if args.intervals_half_life is not None:
+                # The loaded state has the decay of the run that saved it
+                decay = intervals.decay
+                intervals.set_half_life(args.intervals_half_life)
+                if intervals.decay != decay:
+                    logger.info(
+                        "Changing the half-life of the intervals to "
+                        f"{args.intervals_half_life} days."
+                    )
+        elif args.calibration_predictions is not None:
+            store_predictions = TensorStore(args.calibration_predictions)
+            intervals = calibrate_intervals(
+                store_predictions,
+                TensorStore(args.calibration_actuals),
+                store_predictions.symbols,
+                **intervals_kwargs,
+            )
+        else:
+            logger.warning(
+                "No intervals state or calibration predictions, the intervals will "
+                "be available once the first predictions are observed."
+            )
+            intervals = ConformalIntervals(symbols, n_steps_predict, **intervals_kwargs)
+        if intervals.n_steps_predict != n_steps_predict:
+            raise ValueError(
+                f"The intervals have {intervals.n_steps_predict} horizons, but "
+                f"{n_steps_predict} days are predicted."
+            )
+
+        intervals.align(symbols)
+        intervals.update_pending(df_all_symbols[symbols])
+        intervals.add_pending(df_all_symbols.index[-1], predictions[-1])
+        intervals.save(args.intervals_state)
+
+        lower, upper = intervals.get_intervals(df_predictions[symbols].to_numpy().T)
+        df_predictions = pd.concat(
+            [
+                df_predictions,
+                pd.DataFrame(
+                    lower.T,
+                    columns=[f"{symbol}_lower" for symbol in symbols],
+                    index=df_predictions.index,
+                ),
+                pd.DataFrame(
+                    upper.T,
+                    columns=[f"{symbol}_upper" for symbol in symbols],
+                    index=df_predictions.index,
+                ),
+            ],
+            axis=1,
+        )
+
     df_predictions["is_predicted"] = True
 
     df_all_symbols_prices = pd.concat([df_all_symbols_prices, df_predictions])
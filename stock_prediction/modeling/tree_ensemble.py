@@ -0,0 +1,294 @@
+"""
+Compiled evaluation of LightGBM tree ensembles with NumPy.
+
+The trees of several LightGBM boosters are exported into flat node arrays (split
+feature, threshold, children, missing value handling) and a flat array of leaf
+values. All the trees are then evaluated on a batch of rows at once, descending one
+level of every tree per step, so scoring many shallow ensembles on the same
+features is a handful of array operations rather than one booster call per model.
+
+This module does not import LightGBM: boosters are compiled through their
+``dump_model`` output and a compiled ensemble can be saved to and loaded from an
+``.npz`` file.
+"""
+from pathlib import Path
+from typing import Optional, Sequence, Union
+
+import numpy as np
+import pandas as pd
+
+# Missing value handling of the splits, as in LightGBM's MissingType
+MISSING_NONE = 0
+MISSING_ZERO = 1
+MISSING_NAN = 2
+MISSING_TYPES = {"None": MISSING_NONE, "Zero": MISSING_ZERO, "NaN": MISSING_NAN}
+
+# LightGBM's threshold below which a feature value is considered to be zero
+ZERO_THRESHOLD = 1e-35
+
+# Objectives whose raw scores are the predictions
+IDENTITY_OBJECTIVES = (
+    "regression",
+    "regression_l1",
+    "huber",
+    "fair",
+    "quantile",
+    "mape",
+)
+
+
+class UncompilableBoosterError(Exception):
+    """
+    Raised when a booster uses a feature the compiled ensemble does not support, so
+    that it is predicted with booster.predict instead.
+    """
+
+
+class CompiledTreeEnsemble:
+    """
+    Flat array representation of the trees of one or more LightGBM boosters.
+
+    Internal nodes are indexed from 0 across all trees. A child index ``c < 0``
+    refers to the leaf ``~c`` in ``leaf_values``. The root of a tree with a single
+    leaf is encoded the same way.
+    """
+
+    ARRAY_NAMES = (
+        "split_feature",
+        "threshold",
+        "left_child",
+        "right_child",
+        "default_left",
+        "missing_type",
+        "leaf_values",
+        "tree_roots",
+        "booster_offsets",
+    )
+
+    def __init__(
+        self,
+        split_feature: np.ndarray,
+        threshold: np.ndarray,
+        left_child: np.ndarray,
+        right_child: np.ndarray,
+        default_left: np.ndarray,
+        missing_type: np.ndarray,
+        leaf_values: np.ndarray,
+        tree_roots: np.ndarray,
+        booster_offsets: np.ndarray,
+        feature_names: list[str],
+    ):
+        """
+        Initialize the compiled ensemble from its arrays.
+
+        Parameters
+        ----------
+        split_feature, threshold, left_child, right_child, default_left, missing_type
+            The arrays of the internal nodes, of shape (n_nodes,).
+        leaf_values : np.ndarray
+            The values of all the leaves, of shape (n_leaves,).
+        tree_roots : np.ndarray
+            The root of each tree, of shape (n_trees,).
+        booster_offsets : np.ndarray
+            The index of the first tree of each booster, of shape (n_boosters,).
+            The trees of a booster are contiguous.
+        feature_names : list[str]
+            The names of the features the boosters were trained on.
+        """
+        self.split_feature = split_feature
+        self.threshold = threshold
+        self.left_child = left_child
+        self.right_child = right_child
+        self.default_left = default_left
+        self.missing_type = missing_type
+        self.leaf_values = leaf_values
+        self.tree_roots = tree_roots
+        self.booster_offsets = booster_offsets
+        self.feature_names = feature_names
+
+    @property
+    def n_boosters(self) -> int:
+        return len(self.booster_offsets)
+
+    @property
+    def n_trees(self) -> int:
+        return len(self.tree_roots)
+
+    @classmethod
+    def from_boosters(cls, boosters: Sequence) -> "CompiledTreeEnsemble":
+        """
+        Compiles LightGBM boosters trained on the same features.
+
+        Parameters
+        ----------
+        boosters : Sequence[lgb.Booster]
+            The boosters, or any objects with LightGBM's ``dump_model`` method.
+
+        Returns
+        -------
+        CompiledTreeEnsemble
+            The compiled ensemble, whose predictions have one column per booster.
+        """
+        nodes: dict[str, list] = {
+            "split_feature": [],
+            "threshold": [],
+            "left_child": [],
+            "right_child": [],
+            "default_left": [],
+            "missing_type": [],
+        }
+        leaf_values: list[float] = []
+        tree_roots: list[int] = []
+        booster_offsets: list[int] = []
+        feature_names: Optional[list[str]] = None
+
+        def add_node(node: dict) -> int:
+            if "leaf_value" in node:
+                if "leaf_coeff" in node:
+                    raise UncompilableBoosterError("Linear trees are not supported.")
+                leaf_values.append(node["leaf_value"])
+                return ~(len(leaf_values) - 1)
+
+            if node["decision_type"] != "<=":
+                raise UncompilableBoosterError("Categorical splits are not supported.")
+
+            index = len(nodes["split_feature"])
+            nodes["split_feature"].append(node["split_feature"])
+            nodes["threshold"].append(node["threshold"])
+            nodes["default_left"].append(node["default_left"])
+            nodes["missing_type"].append(MISSING_TYPES[node["missing_type"]])
+            nodes["left_child"].append(0)
+            nodes["right_child"].append(0)
+            nodes["left_child"][index] = add_node(node["left_child"])
+            nodes["right_child"][index] = add_node(node["right_child"])
+            return index
+
+        for booster in boosters:
+            model = booster.dump_model()
+
+            if model["num_tree_per_iteration"] != 1:
+                raise UncompilableBoosterError("Multiclass boosters are not supported.")
+            # The objective is followed by its settings, e.g. "regression sqrt"
+            objective, *objective_settings = model["objective"].split(" ")
+            if objective not in IDENTITY_OBJECTIVES:
+                raise UncompilableBoosterError(
+                    f"Objective {model['objective']} is not supported."
+                )
+            # The predictions of reg_sqrt boosters are the squares of the raw scores
+            if "sqrt" in objective_settings or getattr(booster, "params", {}).get(
+                "reg_sqrt", False
+            ):
+                raise UncompilableBoosterError("reg_sqrt is not supported.")
+            # Random forests average their trees instead of summing them
+            if model.get("average_output", False):
+                raise UncompilableBoosterError(
+                    "Averaged outputs (e.g. of random forests) are not supported."
+                )
+            if feature_names is None:
+                feature_names = model["feature_names"]
+            elif model["feature_names"] != feature_names:
+                raise ValueError("All boosters must be trained on the same features.")
+
+            if not model["tree_info"]:
+                raise ValueError("Boosters must have at least one tree.")
+
+            booster_offsets.append(len(tree_roots))
+            for tree in model["tree_info"]:
+                tree_roots.append(add_node(tree["tree_structure"]))
+
+        return cls(
+            split_feature=np.array(nodes["split_feature"], dtype=np.int32),
+            threshold=np.array(nodes["threshold"], dtype=np.float64),
+            left_child=np.array(nodes["left_child"], dtype=np.int32),
+            right_child=np.array(nodes["right_child"], dtype=np.int32),
+            default_left=np.array(nodes["default_left"], dtype=bool),
+            missing_type=np.array(nodes["missing_type"], dtype=np.uint8),
+            leaf_values=np.array(leaf_values, dtype=np.float64),
+            tree_roots=np.array(tree_roots, dtype=np.int32),
+            booster_offsets=np.array(booster_offsets, dtype=np.int64),
+            feature_names=feature_names or [],
+        )
+
+    def predict(
+        self, X: Union[pd.DataFrame, np.ndarray], max_block_size: int = 2**22
+    ) -> np.ndarray:
+        """
+        Predicts the rows of X with every booster.
+
+        Parameters
+        ----------
+        X : pd.DataFrame or np.ndarray
+            The features. The columns of a dataframe are matched by name.
+        max_block_size : int, optional
+            The maximum number of (tree, row) pairs evaluated per step, which bounds
+            the memory of the intermediate arrays. Default is 2**22.
+
+        Returns
+        -------
+        np.ndarray
+            The predictions, of shape (n_rows, n_boosters).
+        """
+        if isinstance(X, pd.DataFrame):
+            X = X[self.feature_names].to_numpy(dtype=np.float64)
+        X = np.ascontiguousarray(X, dtype=np.float64)
+
+        predictions = np.zeros((X.shape[0], self.n_boosters))
+        if self.n_trees == 0:
+            return predictions
+
+        n_rows_block = max(1, max_block_size // self.n_trees)
+        for row_start in range(0, X.shape[0], n_rows_block):
+            X_block = X[row_start : row_start + n_rows_block]
+            predictions[row_start : row_start + len(X_block)] = self._predict_block(
+                X_block
+            ).T
+
+        return predictions
+
+    def _predict_block(self, X: np.ndarray) -> np.ndarray:
+        n_rows, n_features = X.shape
+        X_flat = X.ravel()
+        row_offsets = np.arange(n_rows) * n_features
+
+        # Node of every (tree, row) pair, descended one level per iteration
+        nodes = np.repeat(self.tree_roots[:, np.newaxis], n_rows, axis=1)
+        internal = nodes >= 0
+        while internal.any():
+            index = np.where(internal, nodes, 0)
+            values = X_flat[row_offsets + self.split_feature[index]]
+            missing_type = self.missing_type[index]
+
+            is_nan = np.isnan(values)
+            values = np.where(is_nan & (missing_type != MISSING_NAN), 0.0, values)
+            is_missing = (missing_type == MISSING_NAN) & is_nan
+            is_missing |= (missing_type == MISSING_ZERO) & (
+                np.abs(values) <= ZERO_THRESHOLD
+            )
+            go_left = np.where(
+                is_missing, self.default_left[index], values <= self.threshold[index]
+            )
+
+            nodes = np.where(
+                internal,
+                np.where(go_left, self.left_child[index], self.right_child[index]),
+                nodes,
+            )
+            internal = nodes >= 0
+
+        # Sum the leaf values of the trees of each booster
+        return np.add.reduceat(self.leaf_values[~nodes], self.booster_offsets, axis=0)
+
+    def save(self, path: Path):
+        np.savez(
+            path,
+            feature_names=np.array(self.feature_names, dtype=str),
+            **{name: getattr(self, name) for name in self.ARRAY_NAMES},
+        )
+
+    @classmethod
+    def load(cls, path: Path) -> "CompiledTreeEnsemble":
+        with np.load(path) as arrays:
+            return cls(
+                feature_names=arrays["feature_names"].tolist(),
+                **{name: arrays[name] for name in cls.ARRAY_NAMES},
+            )
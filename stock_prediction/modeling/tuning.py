@@ -0,0 +1,413 @@
+"""
+Search of hyperparameters and feature settings for UnivariateLightGBMs.
+
+Trials are sampled from a search space covering both the LightGBM hyperparameters
+and the feature settings (windows, stats and n_shifts) and are scored on walk-forward
+validation folds. The search runs trials in parallel worker processes and prunes them
+with successive halving: after each fold only the best fraction of the trials is
+evaluated on the next one. Trials sharing a feature configuration reuse the same
+cached LightGBM datasets, so the features of each configuration are computed and
+binned only once per fold.
+"""
+import argparse
+import itertools
+import json
+import math
+import random
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Optional
+
+import numpy as np
+import pandas as pd
+
+from stock_prediction.helpers.logging.log_config import get_logger
+from stock_prediction.modeling.lightgbm_datasets import get_dataset_params
+from stock_prediction.modeling.lightgbm_model import UnivariateLightGBMs
+
+logger = get_logger()
+
+FEATURE_SETTINGS = ("windows", "stats", "n_shifts")
+
+DEFAULT_SEARCH_SPACE = {
+    "windows": [[5, 20, 60, 180], [5, 20, 60, 180, 400]],
+    "stats": [["mean", "std", "min", "max"], ["mean", "std"]],
+    "n_shifts": [10, 20],
+    "max_depth": [3, 5, -1],
+    "learning_rate": [0.01, 0.03, 0.1],
+    "num_leaves": [7, 15, 31],
+    "n_estimators": [100, 300],
+}
+
+# Panel of returns shared by the trials run in a worker process
+_df_panel: Optional[pd.DataFrame] = None
+
+
+def walk_forward_splits(
+    n_samples: int, n_folds: int, valid_size: int, n_steps_predict: int
+) -> list[tuple[int, int]]:
+    """
+    Makes consecutive walk-forward validation ranges ending at the last labelled row.
+
+    Parameters
+    ----------
+    n_samples : int
+        The number of rows of the dataset.
+    n_folds : int
+        The number of validation folds.
+    valid_size : int
+        The number of initial indices in each validation range.
+    n_steps_predict : int
+        The number of steps ahead predicted by the models. The last rows of the
+        dataset have no labels for all horizons and are never validated on.
+
+    Returns
+    -------
+    list[tuple[int, int]]
+        The validation ranges, in chronological order. The model of each fold is
+        trained on the initial indices up to n_steps_predict before its validation
+        range, so that its labels do not overlap the validated returns.
+    """
+    last_index = n_samples - n_steps_predict
+    splits = [
+        (
+            last_index - (n_folds - fold) * valid_size,
+            last_index - (n_folds - fold - 1) * valid_size,
+        )
+        for fold in range(n_folds)
+    ]
+
+    if splits[0][0] <= n_steps_predict:
+        raise ValueError(
+            f"Not enough samples ({n_samples}) for {n_folds} folds of size {valid_size}."
+        )
+
+    return splits
+
+
+def sample_trials(search_space: dict, n_trials: int, seed: int = 0) -> list[dict]:
+    """
+    Samples distinct trials from a grid search space.
+
+    Parameters
+    ----------
+    search_space : dict
+        The candidate values of each setting, keyed by setting name.
+    n_trials : int
+        The number of trials to sample. If it is at least the size of the grid, all
+        the grid points are returned.
+    seed : int, optional
+        The random seed. Default is 0.
+
+    Returns
+    -------
+    list[dict]
+        The sampled trials, each mapping setting names to values.
+    """
+    names = list(search_space.keys())
+    n_candidates = [len(search_space[name]) for name in names]
+    n_grid = math.prod(n_candidates)
+
+    if n_trials >= n_grid:
+        return [
+            dict(zip(names, values))
+            for values in itertools.product(*search_space.values())
+        ]
+
+    trials = []
+    for grid_index in random.Random(seed).sample(range(n_grid), n_trials):
+        trial = dict()
+        # Decode the grid index in the mixed radix of the number of candidates
+        for name, n_candidates_name in zip(names, n_candidates):
+            grid_index, candidate_index = divmod(grid_index, n_candidates_name)
+            trial[name] = search_space[name][candidate_index]
+        trials.append(trial)
+
+    return trials
+
+
+def get_model_kwargs(trial: dict) -> dict:
+    """
+    Splits a trial into the feature settings and LightGBM hyperparameters.
+
+    Parameters
+    ----------
+    trial : dict
+        The trial settings.
+
+    Returns
+    -------
+    dict
+        The keyword arguments to initialize a UnivariateLightGBMs model.
+    """
+    model_kwargs = {name: trial[name] for name in FEATURE_SETTINGS if name in trial}
+    model_kwargs["lgbm_hpts"] = {
+        name: value for name, value in trial.items() if name not in FEATURE_SETTINGS
+    }
+    return model_kwargs
+
+
+def _init_worker(df: pd.DataFrame):
+    global _df_panel
+    _df_panel = df
+
+
+def _make_trial_model(
+    trial: dict,
+    valid_range: tuple[int, int],
+    n_steps_predict: int,
+    dataset_cache_dir: Path,
+    lgbm_defaults: dict,
+) -> tuple[UnivariateLightGBMs, pd.DataFrame]:
+    if _df_panel is None:
+        raise RuntimeError("The worker process was not initialized with a panel.")
+
+    model_kwargs = get_model_kwargs(trial)
+    model_kwargs["lgbm_hpts"] = dict(lgbm_defaults, **model_kwargs["lgbm_hpts"])
+    model = UnivariateLightGBMs(
+        n_steps_predict=n_steps_predict,
+        dataset_cache_dir=dataset_cache_dir,
+        **model_kwargs,
+    )
+    # Drop the rows after the labels of the validation range
+    df = _df_panel.iloc[: valid_range[1] + n_steps_predict]
+
+    return model, df
+
+
+def _build_trial_datasets(
+    trial: dict,
+    valid_range: tuple[int, int],
+    n_steps_predict: int,
+    dataset_cache_dir: Path,
+    lgbm_defaults: dict,
+):
+    model, df = _make_trial_model(
+        trial, valid_range, n_steps_predict, dataset_cache_dir, lgbm_defaults
+    )
+    for symbol in df.columns:
+        model.get_symbol_datasets(df[symbol], valid_range=valid_range)
+
+
+def _evaluate_trial(
+    trial: dict,
+    valid_range: tuple[int, int],
+    n_steps_predict: int,
+    dataset_cache_dir: Path,
+    lgbm_defaults: dict,
+) -> float:
+    model, df = _make_trial_model(
+        trial, valid_range, n_steps_predict, dataset_cache_dir, lgbm_defaults
+    )
+    model.fit(df, valid_range=valid_range)
+    return model.get_valid_score()
+
+
+class HyperparameterSearch:
+    SCORE_COL = "score"
+    N_FOLDS_COL = "n_folds_evaluated"
+    PRUNED_COL = "pruned"
+
+    def __init__(
+        self,
+        search_space: Optional[dict] = None,
+        n_trials: int = 20,
+        n_folds: int = 3,
+        valid_size: int = 250,
+        n_steps_predict: int = 20,
+        reduction_factor: int = 2,
+        n_jobs: int = 1,
+        dataset_cache_dir: Optional[Path] = None,
+        seed: int = 0,
+    ):
+        """
+        Initialize the hyperparameter search.
+
+        Parameters
+        ----------
+        search_space : dict, optional
+            The candidate values of each setting. The settings in FEATURE_SETTINGS
+            are passed to the model, all the others are LightGBM hyperparameters.
+            Default is DEFAULT_SEARCH_SPACE.
+        n_trials : int, optional
+            The number of trials sampled from the search space. Default is 20.
+        n_folds : int, optional
+            The number of walk-forward validation folds. Default is 3.
+        valid_size : int, optional
+            The number of initial indices in each validation fold. Default is 250.
+        n_steps_predict : int, optional
+            The number of steps ahead predicted by the models. Default is 20.
+        reduction_factor : int, optional
+            After each fold, only 1 / reduction_factor of the remaining trials are
+            evaluated on the next fold. Default is 2.
+        n_jobs : int, optional
+            The number of worker processes. Default is 1.
+        dataset_cache_dir : Path, optional
+            The directory where the LightGBM datasets are cached. If None, a
+            temporary directory is used for the duration of the search.
+        seed : int, optional
+            The random seed used to sample the trials. Default is 0.
+        """
+        self.search_space = search_space or DEFAULT_SEARCH_SPACE
+        self.n_trials = n_trials
+        self.n_folds = n_folds
+        self.valid_size = valid_size
+        self.n_steps_predict = n_steps_predict
+        self.reduction_factor = reduction_factor
+        self.n_jobs = n_jobs
+        self.dataset_cache_dir = dataset_cache_dir
+        self.seed = seed
+        self.results: Optional[pd.DataFrame] = None
+
+    def run(self, df: pd.DataFrame) -> pd.DataFrame:
+        """
+        Runs the search on a dataset of returns.
+
+        Parameters
+        ----------
+        df : pd.DataFrame
+            The dataframe of returns, with one column per symbol.
+
+        Returns
+        -------
+        pd.DataFrame
+            One row per trial with its settings, its score on each evaluated fold
+            and its mean score, sorted from best to worst. Pruned trials come after
+            the trials evaluated on all folds.
+        """
+        trials = sample_trials(self.search_space, self.n_trials, seed=self.seed)
+        splits = walk_forward_splits(
+            df.shape[0], self.n_folds, self.valid_size, self.n_steps_predict
+        )
+        # Avoid oversubscribing the cores with LightGBM threads
+        lgbm_defaults = {"verbosity": -1, "num_threads": 1 if self.n_jobs > 1 else 0}
+
+        scores = np.full((len(trials), self.n_folds), np.nan)
+        alive = list(range(len(trials)))
+
+        with tempfile.TemporaryDirectory() as tmp_dir, ProcessPoolExecutor(
+            max_workers=self.n_jobs, initializer=_init_worker, initargs=(df,)
+        ) as executor:
+            dataset_cache_dir = self.dataset_cache_dir or Path(tmp_dir)
+
+            for fold, valid_range in enumerate(splits):
+                logger.info(
+                    f"Evaluating {len(alive)} trials on fold {fold} "
+                    f"(validation range {valid_range})."
+                )
+                fold_args = (
+                    valid_range,
+                    self.n_steps_predict,
+                    dataset_cache_dir,
+                    lgbm_defaults,
+                )
+
+                # Build the datasets of each feature configuration once, so that
+                # the trials sharing it only load them from the cache
+                feature_trials = {
+                    self._get_feature_key(trials[i]): trials[i] for i in alive
+                }
+                list(
+                    executor.map(
+                        _build_trial_datasets,
+                        feature_trials.values(),
+                        *[itertools.repeat(arg) for arg in fold_args],
+                    )
+                )
+
+                fold_scores = executor.map(
+                    _evaluate_trial,
+                    [trials[i] for i in alive],
+                    *[itertools.repeat(arg) for arg in fold_args],
+                )
+                scores[alive, fold] = list(fold_scores)
+
+                if fold < self.n_folds - 1:
+                    n_keep = max(1, math.ceil(len(alive) / self.reduction_factor))
+                    mean_scores = scores[alive, : fold + 1].mean(axis=1)
+                    alive = [alive[i] for i in np.argsort(mean_scores)[:n_keep]]
+
+        self.results = self._make_results(trials, scores)
+
+        return self.results
+
+    def _get_feature_key(self, trial: dict) -> str:
+        model_kwargs = get_model_kwargs(trial)
+        return json.dumps(
+            [
+                [model_kwargs.get(name) for name in FEATURE_SETTINGS],
+                get_dataset_params(model_kwargs["lgbm_hpts"]),
+            ],
+            sort_keys=True,
+        )
+
+    def _make_results(self, trials: list[dict], scores: np.ndarray) -> pd.DataFrame:
+        df_results = pd.DataFrame(trials)
+        for fold in range(self.n_folds):
+            df_results[f"fold_{fold}"] = scores[:, fold]
+
+        n_folds_evaluated = (~np.isnan(scores)).sum(axis=1)
+        df_results[self.N_FOLDS_COL] = n_folds_evaluated
+        df_results[self.PRUNED_COL] = n_folds_evaluated < self.n_folds
+        df_results[self.SCORE_COL] = np.nanmean(scores, axis=1)
+
+        return df_results.sort_values(by=[self.PRUNED_COL, self.SCORE_COL]).reset_index(
+            drop=True
+        )
+
+    @property
+    def best_model_kwargs(self) -> dict:
+        """
+        The keyword arguments of the UnivariateLightGBMs of the best trial.
+        """
+        if self.results is None:
+            raise ValueError("The search must be run before getting the best trial.")
+
+        # Round trip through json to get python (rather than numpy) values
+        best_trial = json.loads(self.results.iloc[[0]].to_json(orient="records"))[0]
+        return get_model_kwargs(
+            {name: best_trial[name] for name in self.search_space.keys()}
+        )
+
+    def save_best_model_kwargs(self, path: Path):
+        with open(path, "w") as f:
+            json.dump(self.best_model_kwargs, f, indent=2)
+
+
+if __name__ == "__main__":
+    from stock_prediction.etl.ticker_data_extractors import (
+        extract_ticker_data,
+        load_cleaned_dataset,
+    )
+
+    parser = argparse.ArgumentParser(
+        description="Searches the hyperparameters and features of UnivariateLightGBMs"
+    )
+    parser.add_argument("--n_trials", type=int, default=20, help="Number of trials")
+    parser.add_argument("--n_folds", type=int, default=3, help="Number of folds")
+    parser.add_argument(
+        "--valid_size", type=int, default=250, help="Number of days per fold"
+    )
+    parser.add_argument("--n_jobs", type=int, default=1, help="Number of processes")
+    parser.add_argument(
+        "--output",
+        type=Path,
+        default=Path("model_config.json"),
+        help="Path of the json file with the best model configuration",
+    )
+
+    args = parser.parse_args()
+
+    df_all_symbols = load_cleaned_dataset(extract_ticker_data())
+
+    search = HyperparameterSearch(
+        n_trials=args.n_trials,
+        n_folds=args.n_folds,
+        valid_size=args.valid_size,
+        n_jobs=args.n_jobs,
+    )
+    print(search.run(df_all_symbols))
+    search.save_best_model_kwargs(args.output)
+
+    logger.info(f"Best model configuration saved to {args.output}")
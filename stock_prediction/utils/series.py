@@ -1,14 +1,26 @@
+from typing import Optional
+
 import numpy as np
 import pandas as pd
+from numpy.lib.stride_tricks import sliding_window_view
+from numpy.typing import DTypeLike
 
 
 def get_normalized_nsteps_ahead_predictions_array(
-    df: pd.DataFrame, n_steps_ahead: int, index_start: int, index_end: int
+    df: pd.DataFrame,
+    n_steps_ahead: int,
+    index_start: int,
+    index_end: int,
+    out: Optional[np.ndarray] = None,
+    dtype: DTypeLike = np.float64,
 ) -> np.ndarray:
-
     """
     Gets a 3D array of normalized predictions n steps ahead for all symbols in the dataframe.
 
+    The values n steps after every origin are divided by the values at the origin,
+    as in n_steps_ahead_normalized_slice_df, but for all the origins at once from
+    sliding windows (strided views) over the values of df.
+
     Parameters
     ----------
     df : pd.DataFrame
@@ -19,21 +31,35 @@ def get_normalized_nsteps_ahead_predictions_array(
         The index to start the predictions at.
     index_end : int
         The index to end the predictions at.
+    out : np.ndarray, optional
+        The array the predictions are written to, e.g. to reuse a buffer across
+        calls. If None, a new array is allocated.
+    dtype : DTypeLike, optional
+        The dtype of the new array, e.g. np.float32 to halve the memory of long
+        backtests. Ignored if out is given. Default is np.float64.
 
     Returns
     -------
     np.ndarray
-        A 3D array of normalized predictions with shape (index_end - index_start + 1, df.shape[1], n_steps_ahead).
+        A 3D array of normalized predictions with shape (index_end - index_start, df.shape[1], n_steps_ahead).
 
     """
-    predictions = np.zeros((index_end - index_start, df.shape[1], n_steps_ahead))
+    n_origins = index_end - index_start
+    if index_end + n_steps_ahead > df.shape[0]:
+        raise ValueError(
+            f"The last origin ({index_end - 1}) needs {n_steps_ahead} rows after it, "
+            f"but df only has {df.shape[0]} rows."
+        )
 
-    for i in range(index_start, index_end):
-        predictions[i - index_start, :, :] = n_steps_ahead_normalized_slice_df(
-            df, n_steps_ahead, i
-        ).T.to_numpy()
+    if out is None:
+        out = np.empty((n_origins, df.shape[1], n_steps_ahead), dtype=dtype)
 
-    return predictions
+    values = df.iloc[index_start : index_end + n_steps_ahead].to_numpy(dtype=out.dtype)
+    # Windows of shape (n_origins, n_symbols, n_steps_ahead + 1) starting at origins
+    windows = sliding_window_view(values, n_steps_ahead + 1, axis=0)
+    np.divide(windows[..., 1:], windows[..., :1], out=out)
+
+    return out
 
 
 def n_steps_ahead_normalized_slice_df(
@@ -60,3 +86,67 @@ def n_steps_ahead_normalized_slice_df(
     return (
         df.iloc[i_start + 1 : i_start + n_steps_ahead + 1] / df.iloc[i_start]
     ).reset_index(drop=True)
+
+
+def assemble_cumulative_predictions(
+    initial_index: np.ndarray,
+    n_forecast: np.ndarray,
+    predictions: np.ndarray,
+    index_start: int,
+    out: np.ndarray,
+) -> np.ndarray:
+    """
+    Assembles flat per-row return predictions into cumulative return forecasts.
+
+    Each row of a horizon expanded features dataset predicts the return ``n_forecast``
+    steps after the origin ``initial_index``. The rows are scattered into the
+    (origins x horizons) block and compounded along the horizon axis, without any
+    per-origin Python work.
+
+    Parameters
+    ----------
+    initial_index : np.ndarray
+        The origin index of each row.
+    n_forecast : np.ndarray
+        The forecast horizon of each row, starting at 1.
+    predictions : np.ndarray
+        The predicted return of each row.
+    index_start : int
+        The index of the first origin, which is written to the first row of ``out``.
+    out : np.ndarray
+        The array of shape (n_origins, n_steps_ahead) the cumulative returns are
+        written to, e.g. the view ``predictions[:, i, :]`` of a predictions tensor.
+        Rows with a horizon beyond ``n_steps_ahead`` are ignored.
+
+    Returns
+    -------
+    np.ndarray
+        The ``out`` array.
+
+    Raises
+    ------
+    ValueError
+        If some origin and horizon of ``out`` has no row, e.g. an origin without
+        features, rather than forecasting a 0% return for it.
+    """
+    initial_index = np.asarray(initial_index)
+    n_forecast = np.asarray(n_forecast)
+    predictions = np.asarray(predictions)
+
+    in_horizon = n_forecast <= out.shape[1]
+    rows = initial_index[in_horizon] - index_start
+    columns = n_forecast[in_horizon] - 1
+
+    is_written = np.zeros(out.shape, dtype=bool)
+    is_written[rows, columns] = True
+    if not is_written.all():
+        i_origin, i_horizon = np.argwhere(~is_written)[0]
+        raise ValueError(
+            f"No prediction for the origin {index_start + i_origin} at the horizon "
+            f"{i_horizon + 1}, e.g. because its features are missing."
+        )
+
+    out[rows, columns] = 1.0 + predictions[in_horizon]
+    np.cumprod(out, axis=1, out=out)
+
+    return out
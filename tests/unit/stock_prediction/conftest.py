@@ -0,0 +1,77 @@
+"""Fixtures shared by the tests of the stock_prediction package."""
+import string
+from typing import Optional
+
+import numpy as np
+import pandas as pd
+import pytest
+
+
+def make_returns(
+    n_days: int = 300,
+    n_symbols: int = 4,
+    seed: int = 0,
+    mean: float = 0.0,
+    n_groups: Optional[int] = None,
+    missing: Optional[dict[int, tuple[int, int]]] = None,
+    dates: bool = False,
+) -> pd.DataFrame:
+    """
+    Makes a panel of random daily returns, with a volatility of 1%.
+
+    Parameters
+    ----------
+    n_days : int, optional
+        The number of days. Default is 300.
+    n_symbols : int, optional
+        The number of symbols, named A, B, C, ... Default is 4.
+    seed : int, optional
+        The random seed. Default is 0.
+    mean : float, optional
+        The mean daily return. Default is 0.
+    n_groups : int, optional
+        If set, the symbols are split in n_groups contiguous groups of correlated
+        symbols, which are the returns of their group plus a small noise. Default
+        is None (independent symbols).
+    missing : dict[int, tuple[int, int]], optional
+        The (start, stop) rows of the missing values of some symbols, by position.
+        Default is None (no missing values).
+    dates : bool, optional
+        Whether the returns are indexed by business days, as the cleaned dataset.
+        Default is False (range index).
+
+    Returns
+    -------
+    pd.DataFrame
+        The returns of the symbols, one column each.
+    """
+    rng = np.random.default_rng(seed)
+    if n_groups is None:
+        values = rng.normal(mean, 0.01, size=(n_days, n_symbols))
+    else:
+        groups = rng.normal(mean, 0.01, size=(n_days, n_groups))
+        values = groups[:, np.arange(n_symbols) * n_groups // n_symbols]
+        values += rng.normal(0, 0.003, size=(n_days, n_symbols))
+
+    for column, (start, stop) in (missing or {}).items():
+        values[start:stop, column] = np.nan
+
+    return pd.DataFrame(
+        values,
+        index=pd.bdate_range("2020-01-01", periods=n_days, name="Date")
+        if dates
+        else None,
+        columns=list(string.ascii_uppercase[:n_symbols]),
+    )
+
+
+@pytest.fixture
+def df_returns(request) -> pd.DataFrame:
+    """
+    Returns a panel of daily returns, see make_returns.
+
+    A module or test sets the keyword arguments of make_returns with the returns
+    marker, e.g. pytestmark = pytest.mark.returns(n_days=120, dates=True).
+    """
+    marker = request.node.get_closest_marker("returns")
+    return make_returns(**(marker.kwargs if marker is not None else {}))
@@ -0,0 +1,54 @@
+"""Tests for the synthetic data generator."""
+import numpy as np
+import pandas as pd
+
+from stock_prediction.etl.synthetic_data import (
+    generate_synthetic_returns,
+    write_synthetic_dataset,
+)
+
+
+def test_generate_synthetic_returns():
+    """
+    Tests the stylized facts of the returns and the leveraged ETFs.
+    """
+    df = generate_synthetic_returns(n_symbols=120, n_days=2000)
+
+    assert df.shape == (2000, 120)
+    assert df.columns[0] == "TQQQ" and df.columns[-1] == "SYN00019"
+    assert isinstance(df.index, pd.DatetimeIndex)
+
+    # Staggered starts, with no missing values after the start
+    starts = df.notna().to_numpy().argmax(axis=0)
+    assert (starts > 0).any() and (starts == 0).any()
+    assert df.notna().sum().to_numpy().tolist() == (2000 - starts).tolist()
+    # The cleaned dataset starts when all the symbols have started
+    assert starts.max() < 200
+    starts = (
+        generate_synthetic_returns(n_days=2000, max_late_start_fraction=0.7)
+        .notna()
+        .to_numpy()
+        .argmax(axis=0)
+    )
+    assert 200 <= starts.max() < 1400
+
+    df_leveraged = df[["TQQQ", "QQQ"]].dropna()
+    np.testing.assert_allclose(
+        df_leveraged["TQQQ"].std() / df_leveraged["QQQ"].std(), 3, rtol=0.01
+    )
+
+    spy = df["SPY"].dropna()
+    assert spy.kurt() > 1
+    assert (spy**2).autocorr() > 0.05
+    assert df.corr().to_numpy().mean() > 0.2
+
+
+def test_write_synthetic_dataset(tmp_path):
+    """
+    Tests that the csv has the format of the extracted data.
+    """
+    df = write_synthetic_dataset(tmp_path / "returns.csv", n_symbols=5, n_days=50)
+
+    df_read = pd.read_csv(tmp_path / "returns.csv")
+    assert list(df_read.columns) == ["Date", "TQQQ", "SOXL", "TECL", "RETL", "QLD"]
+    np.testing.assert_allclose(df_read.iloc[:, 1:], df.iloc[:, 1:])
@@ -0,0 +1,47 @@
+"""Tests for the walk-forward backtests."""
+import numpy as np
+import pytest
+
+from stock_prediction.evaluation.backtest import (
+    WalkForwardBacktest,
+    walk_forward_schedule,
+)
+from stock_prediction.modeling.autoregressive import UnivariateARs
+
+pytestmark = pytest.mark.returns(n_days=400, missing={3: (0, 60)})
+
+
+def test_walk_forward_schedule():
+    """
+    Tests the folds of expanding and rolling training windows.
+    """
+    assert walk_forward_schedule(100, 350, refit_every=100) == [
+        (0, 100, 200),
+        (0, 200, 300),
+        (0, 300, 350),
+    ]
+    assert walk_forward_schedule(100, 350, train_size=80) == [(20, 100, 350)]
+
+
+@pytest.mark.parametrize("n_jobs", [1, 2])
+def test_backtest_matches_refits(df_returns, n_jobs):
+    """
+    Tests the predictions against a model refit before each fold.
+    """
+    backtest = WalkForwardBacktest(
+        UnivariateARs(p=2), n_steps_predict=3, refit_every=50, n_jobs=n_jobs
+    )
+    predictions = backtest.run(df_returns, index_start=200)
+
+    assert predictions.shape == (197, 4, 3)
+    assert len(backtest.fold_metrics) == 4
+    for _, origin_start, origin_end in backtest.folds:
+        model = UnivariateARs(p=2)
+        model.fit(df_returns.iloc[:origin_start])
+        np.testing.assert_allclose(
+            predictions[origin_start - 200 : origin_end - 200],
+            model.predict(df_returns, 3, origin_start, origin_end),
+        )
+    np.testing.assert_allclose(
+        backtest.actuals[0, :, 0], 1 + df_returns.iloc[201].to_numpy()
+    )
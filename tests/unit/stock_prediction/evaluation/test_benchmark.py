@@ -0,0 +1,98 @@
+"""Tests for the benchmark harness."""
+import pytest
+
+from stock_prediction.evaluation.benchmark import (
+    BENCHMARK_MODELS,
+    compare_results,
+    load_results,
+    run_benchmarks,
+    run_case,
+    save_results,
+)
+from stock_prediction.modeling.baselines import EWMADrift
+
+
+class BrokenPredictions(EWMADrift):
+    def predict(self, *args, **kwargs):
+        raise ValueError("Broken predictions")
+
+
+def test_benchmarks_round_trip_and_comparison(tmp_path):
+    """
+    Tests a small benchmark run, its results file and a comparison with itself.
+    """
+    df_results = run_benchmarks(
+        ["EWMADrift", "actuals"],
+        sizes=[(3, 1)],
+        n_steps_predict=5,
+        n_origins=20,
+        n_repeats=1,
+        isolate=False,
+    )
+    assert list(df_results["stage"]) == ["fit", "predict", "actuals"]
+    assert (df_results[["wall_time", "peak_traced_mb", "throughput"]] > 0).all().all()
+
+    save_results(df_results, tmp_path / "results.json")
+    df_baseline = load_results(tmp_path / "results.json")
+    assert not compare_results(df_results, df_baseline)["regression"].any()
+
+    df_baseline["wall_time"] /= 2
+    df_comparison = compare_results(df_results, df_baseline, tolerance=0.5)
+    assert df_comparison["regression"].all()
+
+
+def test_failed_and_missing_cases_are_regressions(monkeypatch):
+    """
+    Tests that a failed stage is kept in the results with its error, and that the
+    failed and missing cases of the baseline are regressions.
+    """
+    kwargs = dict(
+        sizes=[(3, 1)],
+        n_steps_predict=5,
+        n_origins=20,
+        n_repeats=1,
+        trace_memory=False,
+        isolate=False,
+    )
+    df_baseline = run_benchmarks(["EWMADrift", "actuals"], **kwargs)
+    monkeypatch.setitem(BENCHMARK_MODELS, "EWMADrift", (BrokenPredictions, {}))
+
+    df_results = run_benchmarks(["EWMADrift"], **kwargs)
+
+    assert list(df_results["stage"]) == ["fit", "predict"]
+    assert df_results["error"].isna().tolist() == [True, False]
+    assert "Broken predictions" in df_results["error"].iloc[1]
+    assert df_results["wall_time"].isna().tolist() == [False, True]
+    df_comparison = compare_results(df_results, df_baseline, tolerance=100)
+    assert list(df_comparison["stage"]) == ["fit", "predict", "actuals"]
+    assert df_comparison["regression"].tolist() == [False, True, True]
+    assert df_comparison["error"].iloc[2] == "Missing from the results"
+
+
+@pytest.mark.parametrize(
+    "name",
+    ["MultivariateLightGBM", "MultivariateSklearnRidge", "UnivariateAutoARIMAs"],
+)
+def test_multivariate_and_auto_arima_cases(name):
+    """
+    Tests that the multivariate and AutoARIMA models run with their benchmark
+    configurations, one stage at a time.
+    """
+    assert name in BENCHMARK_MODELS
+    results = [
+        result
+        for stage in ("fit", "predict")
+        for result in run_case(
+            name,
+            n_symbols=2,
+            n_years=1,
+            n_steps_predict=3,
+            n_origins=5,
+            n_repeats=1,
+            trace_memory=False,
+            stages=[stage],
+        )
+    ]
+
+    assert [result["stage"] for result in results] == ["fit", "predict"]
+    assert all(result["wall_time"] > 0 for result in results)
@@ -0,0 +1,105 @@
+"""Tests for the conformal prediction intervals."""
+import numpy as np
+import pandas as pd
+import pytest
+
+from stock_prediction.evaluation.conformal import (
+    ConformalIntervals,
+    calibrate_intervals,
+)
+from stock_prediction.utils.series import get_normalized_nsteps_ahead_predictions_array
+
+
+@pytest.fixture
+def predictions_actuals():
+    """
+    Returns predicted and actual cumulative returns with a few missing actuals.
+    """
+    rng = np.random.default_rng(0)
+    actuals = np.exp(rng.normal(0, 0.01, size=(4000, 2, 3)).cumsum(axis=2))
+    predictions = actuals * np.exp(rng.normal(0, 0.02, size=actuals.shape))
+    actuals[:50, 1] = np.nan
+    return predictions, actuals
+
+
+def test_intervals_coverage(predictions_actuals):
+    """
+    Tests that the quantiles match numpy and that the intervals cover the actuals
+    of new predictions at the requested rate.
+    """
+    predictions, actuals = predictions_actuals
+    intervals = calibrate_intervals(
+        predictions[:2000], actuals[:2000], ["A", "B"], chunk_size=300
+    )
+
+    residuals = actuals[:2000] / predictions[:2000] - 1
+    np.testing.assert_allclose(
+        intervals.get_residual_quantiles()[..., 1],
+        np.nanquantile(residuals, 0.95, axis=0),
+        atol=2e-3,
+    )
+
+    lower, upper = intervals.get_intervals(predictions[2000:])
+    coverage = np.mean((actuals[2000:] >= lower) & (actuals[2000:] <= upper))
+    assert coverage == pytest.approx(0.9, abs=0.02)
+
+    assert np.isnan(ConformalIntervals(["A"], 3).get_residual_quantiles()).all()
+
+
+def test_decayed_updates(predictions_actuals):
+    """
+    Tests that updates by chunks are the same as a single update, with decay.
+    """
+    predictions, actuals = predictions_actuals
+    intervals = calibrate_intervals(
+        predictions, actuals, ["A", "B"], chunk_size=7, half_life=100
+    )
+    intervals_single = ConformalIntervals(["A", "B"], 3, half_life=100)
+    intervals_single.update(predictions, actuals)
+
+    np.testing.assert_allclose(intervals.histograms, intervals_single.histograms)
+    assert intervals.histograms.sum(axis=2)[0, 0] == pytest.approx(
+        1 / (1 - 0.5 ** (1 / 100)), rel=1e-6
+    )
+
+
+def test_pending_predictions(tmp_path):
+    """
+    Tests that the pending predictions are added once observed, across save and
+    load, and that new symbols have no intervals.
+    """
+    rng = np.random.default_rng(0)
+    df = pd.DataFrame(
+        rng.normal(0, 0.01, size=(30, 2)),
+        index=pd.bdate_range("2024-01-01", periods=30, name="Date"),
+        columns=["A", "B"],
+    )
+    predictions = np.exp(rng.normal(0, 0.01, size=(10, 2, 3)).cumsum(axis=2))
+
+    intervals = ConformalIntervals(["A", "B"], 3)
+    for i, position in enumerate(range(20, 30)):
+        intervals.add_pending(df.index[position], predictions[i])
+    intervals.save(tmp_path / "intervals.npz")
+
+    intervals = ConformalIntervals(["A", "B"], 3, half_life=50)
+    intervals.load(tmp_path / "intervals.npz")
+    # The saved decay replaces the decay of the new intervals
+    assert intervals.decay == 1.0
+    intervals.update_pending(df)
+
+    # The origins 20 to 26 have their 3 horizons observed
+    expected = ConformalIntervals(["A", "B"], 3)
+    expected.update(
+        predictions[:7],
+        get_normalized_nsteps_ahead_predictions_array((1 + df).cumprod(), 3, 20, 27),
+    )
+    np.testing.assert_allclose(intervals.histograms, expected.histograms)
+    assert list(intervals.pending_dates) == list(df.index[27:])
+
+    intervals.align(["B", "C"])
+    np.testing.assert_allclose(intervals.histograms[0], expected.histograms[1])
+    assert intervals.histograms[1].sum() == 0
+    np.testing.assert_allclose(intervals.pending_predictions[:, 0], predictions[7:, 1])
+
+    intervals.set_half_life(100)
+    assert intervals.decay == pytest.approx(0.5 ** (1 / 100))
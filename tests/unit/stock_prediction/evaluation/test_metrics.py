@@ -0,0 +1,162 @@
+"""Tests for the metrics of the predictions."""
+import numpy as np
+import pandas as pd
+import pytest
+
+from stock_prediction.evaluation.metrics import (
+    MetricsAccumulator,
+    compute_metrics,
+    get_histogram_quantiles,
+    search_sorted_rows,
+)
+
+
+@pytest.fixture
+def predictions_actuals():
+    """
+    Returns predicted and actual cumulative returns with a few missing actuals.
+    """
+    rng = np.random.default_rng(0)
+    actuals = np.exp(rng.normal(0, 0.01, size=(500, 3, 4)).cumsum(axis=2))
+    predictions = actuals * np.exp(rng.normal(0, 0.02, size=actuals.shape))
+    actuals[:50, 1] = np.nan
+    return predictions, actuals
+
+
+def test_metrics_match_numpy(predictions_actuals):
+    """
+    Tests the metrics per symbol and the error bands against numpy.
+    """
+    predictions, actuals = predictions_actuals
+    accumulator = compute_metrics(predictions, actuals, ["A", "B", "C"])
+
+    df_metrics = accumulator.get_metrics(by="symbol")
+    errors = np.abs(predictions - actuals)
+    np.testing.assert_allclose(df_metrics["mae"], np.nanmean(errors, axis=(0, 2)))
+    np.testing.assert_allclose(
+        df_metrics["mape"], np.nanmean(errors / actuals, axis=(0, 2))
+    )
+    np.testing.assert_allclose(
+        df_metrics["directional_accuracy"],
+        np.nanmean(
+            np.where(np.isnan(actuals), np.nan, (predictions > 1) == (actuals > 1)),
+            axis=(0, 2),
+        ),
+    )
+    assert df_metrics.loc["B", "count"] == 450 * 4
+
+    relative_errors = predictions[:, 1, 2] / actuals[:, 1, 2] - 1
+    np.testing.assert_array_equal(
+        accumulator.histograms[1, 2],
+        np.histogram(relative_errors[50:], bins=accumulator.bin_edges)[0],
+    )
+    assert accumulator.histograms.dtype == np.int32
+
+    # The quantiles are interpolated within bins of width 0.001
+    expected_bands = np.nanquantile(
+        predictions / actuals - 1, accumulator.quantiles, axis=0
+    )
+    np.testing.assert_allclose(
+        accumulator.get_error_quantiles(),
+        expected_bands.transpose(1, 2, 0),
+        atol=1e-3,
+    )
+
+
+def test_streaming_matches_single_update(predictions_actuals):
+    """
+    Tests that updating with chunks, or merging accumulators, changes nothing.
+    """
+    predictions, actuals = predictions_actuals
+    periods = np.repeat([2020, 2021, 2022], [200, 200, 100])
+    expected = compute_metrics(predictions, actuals, ["A", "B", "C"], periods)
+
+    streamed = MetricsAccumulator(["A", "B", "C"], 4)
+    merged = MetricsAccumulator(["A", "B", "C"], 4)
+    for start in range(0, 500, 150):
+        chunk = slice(start, start + 150)
+        streamed.update(predictions[chunk], actuals[chunk], periods[chunk])
+        other = MetricsAccumulator(["A", "B", "C"], 4)
+        other.update(predictions[chunk], actuals[chunk], periods[chunk])
+        merged.merge(other)
+
+    for accumulator in (streamed, merged):
+        for by in ("overall", "horizon", "symbol_horizon", "period"):
+            pd.testing.assert_frame_equal(
+                accumulator.get_metrics(by=by), expected.get_metrics(by=by)
+            )
+        np.testing.assert_array_equal(accumulator.histograms, expected.histograms)
+
+
+def dense_histogram_quantiles(histograms, quantiles, bin_edges):
+    """
+    Estimates the quantiles by comparing the targets with every cumulative count,
+    as get_histogram_quantiles did before it searched the sorted counts.
+    """
+    n_bins = histograms.shape[-1]
+    cumulative_counts = np.cumsum(histograms, axis=-1)
+    n_errors = cumulative_counts[..., -1:]
+    targets = quantiles * n_errors
+    i_bins = np.minimum(
+        (cumulative_counts[..., np.newaxis, :] < targets[..., np.newaxis]).sum(axis=-1),
+        n_bins - 1,
+    )
+    counts_below = np.where(
+        i_bins > 0,
+        np.take_along_axis(cumulative_counts, np.maximum(i_bins - 1, 0), axis=-1),
+        0,
+    )
+    counts_bin = np.take_along_axis(histograms, i_bins, axis=-1)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        fractions = np.clip((targets - counts_below) / counts_bin, 0.0, 1.0)
+    quantiles = bin_edges[i_bins] + np.nan_to_num(fractions) * (
+        bin_edges[1] - bin_edges[0]
+    )
+    return np.where(n_errors > 0, quantiles, np.nan)
+
+
+@pytest.mark.parametrize("dtype", [np.int32, np.float64])
+def test_histogram_quantiles_match_dense(dtype):
+    """
+    Tests the searched quantiles against comparing with every cumulative count,
+    on sparse histograms with empty rows, exact targets and NaN quantiles.
+    """
+    rng = np.random.default_rng(0)
+    histograms = rng.poisson(0.3, size=(40, 5, 200)).astype(dtype)
+    if dtype == np.float64:
+        histograms *= rng.random(histograms.shape)
+    histograms[3, 2] = 0
+    bin_edges = np.linspace(-1, 1, 201)
+
+    quantiles = np.array([0.0, 0.05, 0.5, 0.95, 1.0])
+    np.testing.assert_allclose(
+        get_histogram_quantiles(histograms, quantiles, bin_edges),
+        dense_histogram_quantiles(histograms, quantiles, bin_edges),
+        rtol=0,
+        atol=1e-12,
+    )
+
+    levels = rng.random((40, 5, 2))
+    levels[0, 0] = np.nan
+    np.testing.assert_allclose(
+        get_histogram_quantiles(histograms, levels, bin_edges),
+        dense_histogram_quantiles(histograms, levels, bin_edges),
+        rtol=0,
+        atol=1e-12,
+    )
+
+
+def test_search_sorted_rows_blocks():
+    """
+    Tests that searching blocks of rows gives the same positions as a single
+    block.
+    """
+    rng = np.random.default_rng(1)
+    sorted_rows = np.cumsum(rng.poisson(1, size=(50, 30)), axis=1)
+    values = rng.uniform(-5, 40, size=(50, 4))
+
+    expected = (sorted_rows[:, np.newaxis, :] < values[..., np.newaxis]).sum(-1)
+    for max_block_size in (1, 100, 2**22):
+        np.testing.assert_array_equal(
+            search_sorted_rows(sorted_rows, values, max_block_size), expected
+        )
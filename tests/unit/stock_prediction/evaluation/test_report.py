@@ -0,0 +1,116 @@
+"""Tests for the generation of evaluation reports."""
+import matplotlib.pyplot as plt
+import numpy as np
+import pandas as pd
+import pytest
+
+from stock_prediction.evaluation.report import SYMBOLS_DIR, ReportGenerator
+from stock_prediction.evaluation.tensor_store import TensorStore
+
+
+@pytest.fixture
+def report_inputs():
+    """
+    Returns returns, predictions and actuals of 3 symbols on 60 origins.
+    """
+    rng = np.random.default_rng(0)
+    df = pd.DataFrame(
+        rng.normal(0, 0.01, size=(100, 3)),
+        index=pd.bdate_range("2020-12-01", periods=100, name="Date"),
+        columns=["A", "B", "C"],
+    )
+    actuals = np.exp(rng.normal(0, 0.01, size=(60, 3, 5)).cumsum(axis=2))
+    predictions = actuals * np.exp(rng.normal(0, 0.02, size=actuals.shape))
+    return df, predictions, actuals
+
+
+def test_report_bundle(tmp_path, report_inputs):
+    """
+    Tests that the report has the index page, the aggregate figure and one figure
+    per symbol, from arrays or tensor stores.
+    """
+    df, predictions, actuals = report_inputs
+    stores = []
+    for name, values in [("predictions", predictions), ("actuals", actuals)]:
+        store = TensorStore.create(
+            tmp_path / name, values.shape, list(df.columns), chunk_origins=16
+        )
+        store[:] = values
+        stores.append(store)
+
+    for output_dir, inputs in [("arrays", (predictions, actuals)), ("stores", stores)]:
+        index_path = ReportGenerator(tmp_path / output_dir).generate(
+            df, *inputs, 20, 80
+        )
+        page = index_path.read_text()
+        assert (tmp_path / output_dir / "aggregate.png").exists()
+        for symbol in df.columns:
+            assert (tmp_path / output_dir / SYMBOLS_DIR / f"{symbol}.png").exists()
+            assert f"{SYMBOLS_DIR}/{symbol}.png" in page
+
+    assert (tmp_path / "arrays" / "manifest.json").read_text() == (
+        tmp_path / "stores" / "manifest.json"
+    ).read_text()
+
+
+def test_report_skips_unchanged_symbols(tmp_path, report_inputs):
+    """
+    Tests that only the figures of the symbols whose inputs changed are drawn
+    again, in worker processes.
+    """
+    df, predictions, actuals = report_inputs
+    generator = ReportGenerator(tmp_path, n_jobs=2, batch_size=1)
+    generator.generate(df, predictions, actuals, 20, 80)
+    figure_paths = {
+        symbol: tmp_path / SYMBOLS_DIR / f"{symbol}.png" for symbol in df.columns
+    }
+    mtimes = {symbol: path.stat().st_mtime_ns for symbol, path in figure_paths.items()}
+
+    predictions[:, 1] *= 1.01
+    generator.generate(df, predictions, actuals, 20, 80)
+
+    assert figure_paths["A"].stat().st_mtime_ns == mtimes["A"]
+    assert figure_paths["B"].stat().st_mtime_ns != mtimes["B"]
+    assert figure_paths["C"].stat().st_mtime_ns == mtimes["C"]
+
+
+def test_batches_follow_store_chunks(tmp_path, report_inputs, monkeypatch):
+    """
+    Tests that, by default, the symbols of stores are read one chunk at a time.
+    """
+    df, predictions, actuals = report_inputs
+    stores = []
+    for name, values in [("predictions", predictions), ("actuals", actuals)]:
+        store = TensorStore.create(
+            tmp_path / name, values.shape, list(df.columns), chunk_symbols=2
+        )
+        store[:] = values
+        stores.append(store)
+
+    keys = []
+    get_item = TensorStore.__getitem__
+
+    def record_get_item(store, key):
+        keys.append(key)
+        return get_item(store, key)
+
+    monkeypatch.setattr(TensorStore, "__getitem__", record_get_item)
+    ReportGenerator(tmp_path / "report").generate(df, *stores, 20, 80)
+
+    # The reads of batches of symbols, the others are chunks of origins
+    symbol_batches = [key[1] for key in keys if isinstance(key, tuple)]
+    assert symbol_batches == [slice(0, 2)] * 2 + [slice(2, 4)] * 2
+
+
+def test_symbol_figure_settings(tmp_path, report_inputs):
+    """
+    Tests that the figure reused across symbols is redrawn when its size or
+    resolution change.
+    """
+    df, predictions, actuals = report_inputs
+    for dpi, shape in [(50, (500, 600)), (80, (800, 960))]:
+        ReportGenerator(tmp_path, figsize=(12, 10), dpi=dpi).generate(
+            df, predictions, actuals * dpi, 20, 80
+        )
+        image = plt.imread(tmp_path / SYMBOLS_DIR / "A.png")
+        assert image.shape[:2] == shape
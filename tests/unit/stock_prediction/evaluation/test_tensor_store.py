@@ -0,0 +1,73 @@
+"""Tests for the chunked tensor store."""
+import numpy as np
+import pandas as pd
+import pytest
+
+from stock_prediction.evaluation.backtest import WalkForwardBacktest
+from stock_prediction.evaluation.tensor_store import TensorStore
+from stock_prediction.modeling.baselines import EWMADrift
+
+
+@pytest.mark.parametrize("compression", ["none", "zlib"])
+def test_round_trip_and_slicing(tmp_path, compression):
+    """
+    Tests writing rows out of chunk order and reading selections lazily.
+    """
+    rng = np.random.default_rng(0)
+    values = rng.normal(1, 0.01, size=(100, 7, 4))
+    values[:10, 2] = np.nan
+    symbols = [f"S{i}" for i in range(7)]
+
+    store = TensorStore.create(
+        tmp_path / "store",
+        values.shape,
+        symbols=symbols,
+        dates=pd.bdate_range("2020-01-01", periods=100),
+        chunk_origins=16,
+        chunk_symbols=3,
+        compression=compression,
+        metadata={"model": "EWMADrift"},
+    )
+    for start, end in [(40, 75), (0, 40), (75, 100)]:
+        store[start:end] = values[start:end]
+    assert not store._buffers
+
+    store = TensorStore(tmp_path / "store")
+    assert store.metadata == {"model": "EWMADrift"}
+    assert store.dates[0] == pd.Timestamp("2020-01-01")
+    np.testing.assert_array_equal(store[:], values)
+    np.testing.assert_array_equal(store[5:90:3, [1, 6], -1], values[5:90:3, [1, 6], -1])
+    np.testing.assert_array_equal(store[17, 4], values[17, 4])
+    np.testing.assert_array_equal(
+        store.select(["S5", "S0"], horizons=[2]), values[:, [5, 0]][:, :, [1]]
+    )
+
+
+def test_backtest_writes_to_store(tmp_path):
+    """
+    Tests that stores can be the outputs of a backtest, for the predictions and
+    the actuals.
+    """
+    rng = np.random.default_rng(0)
+    df = pd.DataFrame(rng.normal(0, 0.01, size=(300, 3)), columns=["A", "B", "C"])
+    backtest = WalkForwardBacktest(EWMADrift(), n_steps_predict=5, refit_every=30)
+
+    store = TensorStore.create(tmp_path / "store", (195, 3, 5), chunk_origins=64)
+    actuals_store = TensorStore.create(
+        tmp_path / "actuals", (195, 3, 5), chunk_origins=64
+    )
+    backtest.run(df, index_start=100, out=store, actuals_out=actuals_store)
+    assert backtest.actuals is actuals_store
+    fold_metrics = backtest.fold_metrics
+
+    np.testing.assert_array_equal(
+        TensorStore(tmp_path / "store")[:], backtest.run(df, index_start=100)
+    )
+    np.testing.assert_array_equal(
+        TensorStore(tmp_path / "actuals")[:], backtest.actuals
+    )
+    pd.testing.assert_frame_equal(fold_metrics, backtest.fold_metrics)
+
+    # Without a store of the actuals, they are not kept
+    backtest.run(df, index_start=100, out=store)
+    assert backtest.actuals is None
@@ -0,0 +1,238 @@
+"""Tests for the ARIMA forecast model."""
+import warnings
+
+import numpy as np
+import pandas as pd
+import pytest
+from statsmodels.tsa.arima.model import ARIMA
+
+from stock_prediction.modeling import arima
+from stock_prediction.modeling.arima import (
+    CompactARIMA,
+    UnivariateARIMAs,
+    fit_arima_params,
+    rolling_forecasts,
+)
+
+pytestmark = pytest.mark.returns(n_days=200, seed=3, n_groups=2)
+
+
+@pytest.mark.parametrize("order", [(2, 1, 1), (1, 0, 1)])
+def test_rolling_forecasts(order):
+    """
+    Tests that the rolling forecasts match appending the observations one at a time.
+    """
+    rng = np.random.default_rng(0)
+    endog = rng.normal(0.0005, 0.01, size=230)
+    n_fit, n_steps = 200, 4
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore")
+        results = ARIMA(endog[:n_fit], order=order).fit()
+
+    forecasts = rolling_forecasts(results, endog[n_fit:], n_steps)
+
+    assert forecasts.shape == (len(endog) - n_fit, n_steps)
+    for i in range(len(endog) - n_fit):
+        results = results.append(endog[n_fit + i : n_fit + i + 1])
+        expected = results.forecast(steps=n_steps)
+        # Refiltering from the approximate diffuse initialization differs slightly
+        np.testing.assert_allclose(forecasts[i], (1 + expected).cumprod(), rtol=1e-6)
+
+
+@pytest.fixture(params=[(2, 1, 1), (1, 0, 1)])
+def arima_results(request):
+    """
+    Returns fitted ARIMA results and the observations following their data.
+    """
+    rng = np.random.default_rng(1)
+    endog = rng.normal(0.0005, 0.01, size=260)
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore")
+        results = ARIMA(endog[:200], order=request.param).fit()
+
+    endog_new = endog[200:].copy()
+    endog_new[5] = np.nan
+    return results, endog_new
+
+
+def test_compact_arima_parity(arima_results):
+    """
+    Tests that the compact ARIMA forecasts as the full results.
+    """
+    results, endog_new = arima_results
+    compact = CompactARIMA.from_results(results)
+
+    np.testing.assert_allclose(
+        compact.rolling_forecasts(endog_new, 5),
+        rolling_forecasts(results, endog_new, 5),
+        rtol=1e-9,
+    )
+
+    # Extending the compact ARIMA is the same as filtering the observations
+    np.testing.assert_allclose(
+        compact.extend(endog_new[:20]).rolling_forecasts(endog_new[20:], 5),
+        compact.rolling_forecasts(endog_new, 5)[20:],
+    )
+
+
+def test_save_and_load_models(tmp_path):
+    """
+    Tests that the saved compact models predict as the fitted models.
+    """
+    rng = np.random.default_rng(2)
+    df = pd.DataFrame(rng.normal(0, 0.01, size=(250, 3)), columns=["A", "B", "C"])
+    model = UnivariateARIMAs(p=2, d=1, q=1)
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore")
+        model.fit(df.iloc[:200])
+    expected = model.predict(df, 5, index_start=200, index_end=245)
+
+    path = tmp_path / "arimas.npz"
+    model.save_models(path)
+    model_loaded = UnivariateARIMAs(p=2, d=1, q=1)
+    model_loaded.load_models(path)
+
+    assert all(isinstance(m, CompactARIMA) for m in model_loaded.models.values())
+    assert path.stat().st_size < 10_000
+    np.testing.assert_allclose(
+        model_loaded.predict(df, 5, index_start=200, index_end=245),
+        expected,
+        rtol=1e-9,
+    )
+
+
+def test_parallel_fit_matches_serial(df_returns):
+    """
+    Tests that the symbols fit in the process pool have the parameters of the
+    serial fits.
+    """
+    models = [
+        UnivariateARIMAs(p=2, d=0, q=1, n_jobs=n_jobs, warm_start="centroid")
+        for n_jobs in (1, 2)
+    ]
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore")
+        for model in models:
+            model.fit(df_returns)
+
+    for symbol in df_returns.columns:
+        np.testing.assert_array_equal(
+            models[1].models[symbol].params, models[0].models[symbol].params
+        )
+        assert models[1].fit_info[symbol]["aic"] == models[0].fit_info[symbol]["aic"]
+
+
+def test_warm_start_previous(df_returns, monkeypatch):
+    """
+    Tests that a second fit starts from the parameters of the first one.
+    """
+    model = UnivariateARIMAs(p=2, d=0, q=1, warm_start="previous")
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore")
+        model.fit(df_returns.iloc[:150])
+        previous_params = {
+            symbol: np.asarray(results.params)
+            for symbol, results in model.models.items()
+        }
+
+        start_params = []
+
+        def record_fit(endog, order, params=None, time_limit=None):
+            start_params.append(params)
+            return fit_arima_params(endog, order, params, time_limit)
+
+        monkeypatch.setattr(arima, "fit_arima_params", record_fit)
+        model.fit(df_returns)
+
+    # No centroid is fit, every symbol starts from its previous parameters
+    assert len(start_params) == df_returns.shape[1]
+    for symbol, params in zip(df_returns.columns, start_params):
+        np.testing.assert_array_equal(params, previous_params[symbol])
+        assert model.fit_info[symbol]["warm_start"]
+
+
+def test_time_limit_stops_fit():
+    """
+    Tests that a fit exceeding its time limit stops and keeps its starting
+    parameters.
+    """
+    rng = np.random.default_rng(4)
+    endog = rng.normal(0, 0.01, size=300)
+    # The constant, 2 AR and 1 MA coefficients, and the variance
+    start_params = np.array([0.0, 0.1, -0.1, 0.1, 0.0001])
+
+    params, info = fit_arima_params(endog, (2, 0, 1), start_params, time_limit=0.0)
+
+    assert info["timed_out"] and not info["converged"]
+    assert np.isinf(info["aic"])
+    np.testing.assert_array_equal(params, start_params)
+
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore")
+        params, info = fit_arima_params(endog, (2, 0, 1), time_limit=None)
+    assert not info["timed_out"] and np.isfinite(info["aic"])
+    assert not np.array_equal(params, start_params)
+
+
+def test_centroid_clusters(df_returns):
+    """
+    Tests that the correlated symbols share the parameters of their centroid.
+    """
+    model = UnivariateARIMAs(p=1, d=0, q=0, n_clusters=2, warm_start="centroid")
+
+    labels = model.cluster_symbols(df_returns)
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore")
+        centroid_params = model.get_centroid_params(df_returns)
+
+    assert labels[0] == labels[1] != labels[2] == labels[3]
+    np.testing.assert_array_equal(centroid_params["A"], centroid_params["B"])
+    assert not np.array_equal(centroid_params["A"], centroid_params["C"])
+
+
+def test_order_selection_cache(df_returns, tmp_path, monkeypatch):
+    """
+    Tests that the order with the lowest criterion is selected for each symbol,
+    then reloaded from the cache without selecting it again.
+    """
+    candidate_orders = [(1, 0, 0), (2, 0, 1), (0, 0, 1)]
+    kwargs = dict(
+        p=1,
+        d=0,
+        q=0,
+        candidate_orders=candidate_orders,
+        order_cache_path=tmp_path / "orders.json",
+    )
+    model = UnivariateARIMAs(**kwargs)
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore")
+        model.fit(df_returns.iloc[:150])
+
+        for symbol in df_returns.columns:
+            aics = [
+                fit_arima_params(df_returns[symbol].to_numpy()[:150], order)[1]["aic"]
+                for order in candidate_orders
+            ]
+            assert model.orders[symbol] == candidate_orders[int(np.argmin(aics))]
+
+        def fail_select_orders(df):
+            raise AssertionError("The cached orders should be reused.")
+
+        model_cached = UnivariateARIMAs(**kwargs)
+        monkeypatch.setattr(model_cached, "select_orders", fail_select_orders)
+        model_cached.fit(df_returns.iloc[:150])
+
+    assert model_cached.orders == model.orders
+    for symbol in df_returns.columns:
+        np.testing.assert_array_equal(
+            model_cached.cached_params[symbol], model.models[symbol].params
+        )
+        assert model_cached.fit_info[symbol]["warm_start"]
+
+
+def test_candidate_orders_share_d():
+    """
+    Tests that candidate orders with another differencing order are rejected.
+    """
+    with pytest.raises(ValueError):
+        UnivariateARIMAs(p=1, d=0, q=0, candidate_orders=[(1, 0, 0), (0, 1, 1)])
@@ -0,0 +1,85 @@
+"""Tests for the batched autoregressive model."""
+import numpy as np
+import pandas as pd
+import pytest
+
+from stock_prediction.modeling.autoregressive import UnivariateARs
+
+
+@pytest.fixture
+def df_ar():
+    """
+    Returns AR(2) returns of three symbols, one starting later than the others.
+    """
+    rng = np.random.default_rng(0)
+    ar_coef = np.array([[0.3, -0.2], [-0.1, 0.1], [0.5, 0.0]])
+    values = np.zeros((3000, 3))
+    noise = rng.normal(0, 0.01, size=values.shape)
+    for t in range(2, len(values)):
+        values[t] = (
+            0.001 + ar_coef[:, 0] * values[t - 1] + ar_coef[:, 1] * values[t - 2]
+        )
+        values[t] += noise[t]
+    values[:100, 2] = np.nan
+
+    return pd.DataFrame(
+        values,
+        index=pd.bdate_range("2010-01-01", periods=len(values), name="Date"),
+        columns=["A", "B", "C"],
+    )
+
+
+def test_fit_recovers_coefficients(df_ar):
+    """
+    Tests that the batched least squares recover the AR coefficients.
+    """
+    model = UnivariateARs(p=2)
+    model.fit(df_ar)
+
+    np.testing.assert_allclose(
+        model.coefficients[["lag_1", "lag_2"]].to_numpy(),
+        [[0.3, -0.2], [-0.1, 0.1], [0.5, 0.0]],
+        atol=0.05,
+    )
+
+
+@pytest.mark.parametrize("calendar_features", [False, True])
+def test_predict_matches_recursion(df_ar, calendar_features):
+    """
+    Tests the vectorized forecasts against a per-origin recursion.
+    """
+    p, n_steps, index_start, index_end = 3, 4, 2900, 2997
+    model = UnivariateARs(p=p, calendar_features=calendar_features, ridge=1e-3)
+    model.fit(df_ar.iloc[:index_start])
+    predictions = model.predict(df_ar, n_steps, index_start, index_end)
+
+    dates = df_ar.index.append(
+        pd.bdate_range(df_ar.index[-1] + pd.Timedelta(days=1), periods=n_steps)
+    )
+    coefficients = model.coefficients
+    assert predictions.shape == (index_end - index_start, 3, n_steps)
+    for origin in range(index_start, index_end, 7):
+        for i, symbol in enumerate(df_ar.columns):
+            history = list(df_ar[symbol].iloc[origin - p + 1 : origin + 1])
+            expected = []
+            for step in range(1, n_steps + 1):
+                forecast = coefficients.loc[symbol, "intercept"] + sum(
+                    coefficients.loc[symbol, f"lag_{j}"] * history[-j]
+                    for j in range(1, p + 1)
+                )
+                if calendar_features:
+                    date = dates[origin + step]
+                    frac_month = date.day / date.days_in_month
+                    forecast += (
+                        coefficients.loc[symbol, "frac_week"] * (date.weekday() + 1) / 5
+                        + coefficients.loc[symbol, "frac_month"] * frac_month
+                        + coefficients.loc[symbol, "frac_year"]
+                        * (date.month - 1 + frac_month)
+                        / 12
+                    )
+                history.append(forecast)
+                expected.append(forecast)
+
+            np.testing.assert_allclose(
+                predictions[origin - index_start, i], np.cumprod(1 + np.array(expected))
+            )
@@ -0,0 +1,84 @@
+"""Tests for the baseline models."""
+import numpy as np
+import pytest
+
+from stock_prediction.modeling.baselines import (
+    DriftForecast,
+    EWMADrift,
+    RollingGeometricAverage,
+    RollingMedianDrift,
+    SeasonalNaive,
+    VolatilityScaledDrift,
+)
+
+pytestmark = pytest.mark.returns(missing={1: (100, 103)})
+
+
+def test_rolling_geometric_average(df_returns):
+    """
+    Tests the closed form forecasts against pandas' rolling windows.
+    """
+    window, n_steps, index_start, index_end = 20, 5, 50, 280
+    predictions = RollingGeometricAverage(window=window).predict(
+        df_returns, n_steps, index_start, index_end
+    )
+
+    geometric_average = (
+        (1 + df_returns)
+        .rolling(window)
+        .apply(np.prod, raw=True)
+        .pow(1 / window)
+        .iloc[index_start:index_end]
+        .to_numpy()
+    )
+    np.testing.assert_allclose(
+        predictions,
+        geometric_average[:, :, np.newaxis] ** np.arange(1, n_steps + 1),
+    )
+
+
+@pytest.mark.parametrize(
+    "model, get_drift",
+    [
+        (EWMADrift(halflife=10), lambda df: df.ewm(halflife=10).mean()),
+        (RollingMedianDrift(window=15), lambda df: df.rolling(15).median()),
+        (
+            VolatilityScaledDrift(window=15),
+            lambda df: df.rolling(15).mean()
+            * df.rolling(15).mean() ** 2
+            / (df.rolling(15).mean() ** 2 + df.rolling(15).var() / 15),
+        ),
+    ],
+)
+def test_drift_forecasts(df_returns, model, get_drift):
+    """
+    Tests the drift baselines against pandas' rolling and exponential windows.
+    """
+    n_steps, index_start, index_end = 4, 40, 290
+    predictions = model.predict(df_returns, n_steps, index_start, index_end)
+
+    drift = get_drift(df_returns).iloc[index_start:index_end].to_numpy()
+    np.testing.assert_allclose(
+        predictions, (1 + drift[:, :, np.newaxis]) ** np.arange(1, n_steps + 1)
+    )
+
+
+def test_drift_forecast_is_abstract():
+    """
+    Tests that a drift baseline must implement get_drift.
+    """
+    with pytest.raises(TypeError):
+        DriftForecast()
+
+
+def test_seasonal_naive(df_returns):
+    """
+    Tests that the last season of returns is repeated.
+    """
+    model = SeasonalNaive(season_length=3)
+    predictions = model.predict(df_returns, 7, index_start=200, index_end=210)
+
+    for origin in range(200, 210):
+        returns = df_returns.iloc[origin - 2 : origin + 1].to_numpy()
+        expected = np.cumprod(1 + np.concatenate([returns] * 3)[:7], axis=0)
+        np.testing.assert_allclose(predictions[origin - 200], expected.T)
@@ -0,0 +1,137 @@
+"""Tests for the construction and caching of LightGBM datasets."""
+import numpy as np
+import pytest
+
+from stock_prediction.modeling.lightgbm_datasets import (
+    LightGBMDatasetCache,
+    get_dataset_params,
+    make_dataset_key,
+)
+from stock_prediction.modeling.lightgbm_model import UnivariateLightGBMs
+
+pytestmark = pytest.mark.returns(n_symbols=2, mean=0.0005, dates=True)
+
+
+def make_build(features, labels, calls):
+    """
+    Returns a build function of the cache that counts its calls.
+    """
+
+    def build():
+        calls.append(1)
+        return features, labels, [f"feature_{i}" for i in range(features.shape[1])]
+
+    return build
+
+
+def test_dataset_key(df_returns):
+    """
+    Tests that the key changes with the data and the dataset configuration only.
+    """
+    key = make_dataset_key(df_returns, windows=[5], dataset_params={"max_bin": 63})
+
+    assert key == make_dataset_key(
+        df_returns.copy(), windows=[5], dataset_params={"max_bin": 63}
+    )
+    assert key != make_dataset_key(
+        df_returns * 2, windows=[5], dataset_params={"max_bin": 63}
+    )
+    assert key != make_dataset_key(
+        df_returns, windows=[5], dataset_params={"max_bin": 31}
+    )
+    assert key != make_dataset_key(
+        df_returns[["B", "A"]], windows=[5], dataset_params={"max_bin": 63}
+    )
+    assert get_dataset_params(
+        {"max_bin": 63, "learning_rate": 0.1, "max_depth": 3}
+    ) == {"max_bin": 63}
+
+
+def test_cache_hit_and_miss(tmp_path):
+    """
+    Tests that a dataset is built and saved once, then loaded, and that no
+    temporary files are left behind.
+    """
+    rng = np.random.default_rng(0)
+    features = rng.normal(size=(200, 3))
+    labels = rng.normal(size=(200, 2))
+    calls: list = []
+    cache = LightGBMDatasetCache(tmp_path, params={"max_bin": 15})
+
+    assert not cache.contains("key")
+    dataset, dataset_labels = cache.get("key", make_build(features, labels, calls))
+    assert cache.contains("key")
+    assert sorted(path.name for path in tmp_path.iterdir()) == [
+        "key.bin",
+        "key.labels.npy",
+    ]
+
+    loaded, loaded_labels = cache.get("key", make_build(features, labels, calls))
+    assert len(calls) == 1
+    np.testing.assert_array_equal(loaded_labels, labels)
+    assert loaded_labels.flags.f_contiguous
+    # LightGBM stores the labels in single precision
+    np.testing.assert_array_equal(loaded.get_label(), labels[:, 0].astype(np.float32))
+    assert loaded.num_data() == dataset.num_data() == 200
+    assert [loaded.feature_num_bin(i) for i in range(3)] == [
+        dataset.feature_num_bin(i) for i in range(3)
+    ]
+
+    # Without a cache directory, the datasets are always built
+    cache = LightGBMDatasetCache()
+    cache.get("key", make_build(features, labels, calls))
+    assert len(calls) == 2
+    assert not cache.contains("key")
+
+
+def test_reference_bin_mappers(tmp_path):
+    """
+    Tests that a dataset built or loaded with a reference reuses its bin mappers.
+    """
+    rng = np.random.default_rng(0)
+    train_features = rng.normal(size=(500, 2))
+    # Few distinct values, which would have fewer bins if binned on their own
+    valid_features = np.round(rng.normal(size=(100, 2)))
+    labels = rng.normal(size=(500, 1))
+    calls: list = []
+    cache = LightGBMDatasetCache(tmp_path, params={"max_bin": 31})
+
+    for _ in range(2):
+        train_set, _ = cache.get("train", make_build(train_features, labels, calls))
+        valid_set, _ = cache.get(
+            "valid",
+            make_build(valid_features, labels[:100], calls),
+            reference=train_set,
+        )
+        for i in range(2):
+            assert valid_set.feature_num_bin(i) == train_set.feature_num_bin(i)
+
+    assert len(calls) == 2
+
+
+def test_get_datasets_loads_binary(tmp_path, df_returns, monkeypatch):
+    """
+    Tests that a second fit loads the cached datasets without preprocessing, and
+    gives the same predictions.
+    """
+    kwargs = dict(
+        lgbm_hpts={"num_iterations": 10, "max_depth": 2, "verbosity": -1},
+        windows=[5, 10],
+        n_shifts=5,
+        n_steps_predict=3,
+        dataset_cache_dir=tmp_path,
+    )
+    model = UnivariateLightGBMs(**kwargs)
+    model.fit(df_returns.iloc[:250], valid_range=(200, 250))
+    predictions = model.predict(df_returns, 3, 250, 297)
+    assert len(list(tmp_path.glob("*.bin"))) == 4
+
+    def fail_preprocess(series):
+        raise AssertionError("The cached datasets should be loaded.")
+
+    model = UnivariateLightGBMs(**kwargs)
+    monkeypatch.setattr(model, "preprocess", fail_preprocess)
+    model.fit(df_returns.iloc[:250], valid_range=(200, 250))
+    monkeypatch.undo()
+
+    np.testing.assert_array_equal(model.predict(df_returns, 3, 250, 297), predictions)
@@ -0,0 +1,110 @@
+"""Tests for the LightGBM forecast models."""
+import numpy as np
+import pandas as pd
+import pytest
+
+from stock_prediction.modeling.lightgbm_model import (
+    MultivariateLightGBM,
+    UnivariateLightGBMs,
+)
+
+pytestmark = pytest.mark.returns(n_days=120, n_symbols=3, mean=0.0005, dates=True)
+
+
+def merge_preprocess(model, df):
+    """
+    Builds the multivariate features by merging the symbols one at a time, as
+    MultivariateLightGBM.preprocess did before the design matrix was concatenated.
+    """
+    key_columns = [model.INITIAL_INDEX_COL, model.N_FORECAST_COL]
+    df_all_features = None
+    df_all_labels = dict()
+    for symbol in df.columns:
+        df_symbol = UnivariateLightGBMs.preprocess(model, df[symbol])
+        df_symbol = df_symbol.rename(
+            columns={
+                col: f"{col}_{symbol}"
+                for col in df_symbol.columns
+                if col not in key_columns + [model.LABEL_COL]
+            }
+        )
+        df_features = df_symbol.drop(columns=[model.LABEL_COL])
+        if df_all_features is None:
+            df_all_features = df_features
+        else:
+            df_all_features = df_all_features.merge(
+                df_features, on=key_columns, how="inner"
+            )
+        df_all_labels[symbol] = df_symbol[[model.LABEL_COL] + key_columns]
+
+    return df_all_features, df_all_labels
+
+
+def test_multivariate_preprocess_parity(df_returns):
+    """
+    Tests the concatenated design matrix and its split masks against merging the
+    symbols one at a time.
+    """
+    df_returns = df_returns.copy()
+    df_returns.iloc[:30, 1] = np.nan
+    model = MultivariateLightGBM(windows=[5, 10], n_shifts=5, n_steps_predict=3)
+    valid_range = (80, 100)
+
+    df_all_features, df_all_labels = model.preprocess(df_returns)
+    df_expected, df_expected_labels = merge_preprocess(model, df_returns)
+
+    pd.testing.assert_frame_equal(df_all_features, df_expected)
+    for symbol in df_returns.columns:
+        pd.testing.assert_frame_equal(df_all_labels[symbol], df_expected_labels[symbol])
+
+    masks = model.get_split_masks(
+        df_all_features[model.INITIAL_INDEX_COL].to_numpy(), valid_range
+    )
+    initial_index = df_expected[model.INITIAL_INDEX_COL]
+    np.testing.assert_array_equal(
+        masks["train"], initial_index < valid_range[0] - model.n_steps_predict
+    )
+    np.testing.assert_array_equal(
+        masks["valid"], initial_index.between(*valid_range, inclusive="left")
+    )
+
+
+@pytest.mark.parametrize(
+    "lgbm_hpts, is_compilable",
+    [
+        ({"max_depth": 2}, True),
+        ({"max_depth": 2, "linear_tree": True}, False),
+        ({"max_depth": 2, "objective": "poisson"}, False),
+        ({"max_depth": 2, "reg_sqrt": True}, False),
+        ({"boosting": "rf", "bagging_fraction": 0.5, "bagging_freq": 1}, False),
+    ],
+)
+def test_multivariate_predict_fallback(df_returns, lgbm_hpts, is_compilable):
+    """
+    Tests that the boosters the compiled ensemble does not support predict with
+    booster.predict, with the same results as the boosters in both cases.
+    """
+    model = MultivariateLightGBM(
+        lgbm_hpts=dict(lgbm_hpts, num_iterations=10, verbosity=-1),
+        windows=[5, 10],
+        n_shifts=5,
+        n_steps_predict=3,
+    )
+    # The poisson objective needs positive labels
+    df_fit = df_returns.abs() if "objective" in lgbm_hpts else df_returns
+    model.fit(df_fit.iloc[:100])
+
+    predictions = model.predict(df_fit, 3, 100, 117)
+
+    assert model.is_compilable == is_compilable
+    dict_all_features_dfs = model._get_dict_all_features_dfs(df_fit, 100, 117)
+    for i, symbol in enumerate(df_fit.columns):
+        df_features = dict_all_features_dfs[symbol]
+        expected = model.models[symbol].predict(
+            df_features.drop(columns=[model.INITIAL_INDEX_COL])
+        )
+        # The rows are the origins of each horizon, starting at the last one
+        expected = expected.reshape(-1, 17)[::-1].T
+        np.testing.assert_allclose(
+            predictions[:, i], np.cumprod(1 + expected, axis=1), rtol=1e-10
+        )
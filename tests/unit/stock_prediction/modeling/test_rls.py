@@ -0,0 +1,71 @@
+"""Tests for the recursive least squares forecaster."""
+import numpy as np
+import pytest
+
+from stock_prediction.modeling.rls import UnivariateRLS
+
+pytestmark = pytest.mark.returns(n_days=400, n_symbols=3, missing={2: (50, 53)})
+
+
+def test_fit_matches_least_squares(df_returns):
+    """
+    Tests that without forgetting and with a weak prior, RLS is least squares.
+    """
+    p, n_steps = 2, 3
+    model = UnivariateRLS(
+        p=p, n_steps_predict=n_steps, forgetting_factor=1.0, initial_cov=1e8
+    )
+    model.fit(df_returns.iloc[:, :2])
+
+    values = df_returns.iloc[:, :2].to_numpy()
+    for i in range(2):
+        for step in range(1, n_steps + 1):
+            origins = np.arange(p - 1, len(values) - step)
+            X = np.column_stack(
+                [np.ones(len(origins))] + [values[origins - j, i] for j in range(p)]
+            )
+            expected, *_ = np.linalg.lstsq(X, values[origins + step, i], rcond=None)
+            np.testing.assert_allclose(model.coef[i, step - 1], expected, atol=1e-6)
+
+
+def test_update_and_predict_absorb_days_in_order(df_returns):
+    """
+    Tests that updating or predicting after a fit equals fitting on more days.
+    """
+    model = UnivariateRLS(p=3, n_steps_predict=4)
+    model.fit(df_returns.iloc[:300])
+    predictions = model.predict(df_returns, 4, index_start=320, index_end=330)
+
+    model_updated = UnivariateRLS(p=3, n_steps_predict=4)
+    model_updated.fit(df_returns.iloc[:200])
+    model_updated.update(df_returns.iloc[200:300])
+    np.testing.assert_allclose(model_updated.coef, model.coef)
+
+    for origin in (320, 329):
+        model_full = UnivariateRLS(p=3, n_steps_predict=4)
+        model_full.fit(df_returns.iloc[: origin + 1])
+        np.testing.assert_allclose(
+            predictions[origin - 320],
+            model_full.predict(df_returns, 4, index_start=origin, index_end=origin + 1)[
+                0
+            ],
+        )
+
+
+def test_save_and_load(df_returns, tmp_path):
+    """
+    Tests that a loaded state keeps absorbing days as the original.
+    """
+    model = UnivariateRLS(p=2, n_steps_predict=5)
+    model.fit(df_returns.iloc[:300])
+    model.save(tmp_path / "rls.npz")
+
+    model_loaded = UnivariateRLS()
+    model_loaded.load(tmp_path / "rls.npz")
+    model.update(df_returns.iloc[300:])
+    model_loaded.update(df_returns.iloc[300:])
+
+    np.testing.assert_allclose(model_loaded.coef, model.coef)
+    np.testing.assert_allclose(
+        model_loaded.predict(df_returns, 5), model.predict(df_returns, 5)
+    )
@@ -0,0 +1,110 @@
+"""Tests for the sklearn API based forecast models."""
+import numpy as np
+import pandas as pd
+import pytest
+from sklearn.linear_model import Lasso, LinearRegression, Ridge, SGDRegressor
+
+from stock_prediction.modeling.sklearn_api_based import (
+    MultivariateSklearnAPIBased,
+    UnivariateSklearnAPIBased,
+)
+
+pytestmark = pytest.mark.returns(n_days=120, n_symbols=3, mean=0.0005, dates=True)
+
+
+@pytest.mark.parametrize("batch_size", [3, 20, 1000])
+def test_iter_minibatches(df_returns, batch_size):
+    """
+    Tests that the concatenated minibatches are the preprocessed dataset.
+    """
+    model = UnivariateSklearnAPIBased(
+        SGDRegressor, windows=[5, 10], n_shifts=5, n_steps_predict=3
+    )
+    series = df_returns["A"]
+
+    batches = list(model.iter_minibatches(series, batch_size))
+    df_batches = pd.concat(
+        [features.assign(**{model.LABEL_COL: labels}) for features, labels in batches]
+    )
+
+    # The rows of a minibatch are ordered by horizon, so the rows are compared in
+    # the order of their values
+    df_all = model.preprocess(series).drop(columns=[model.INITIAL_INDEX_COL])
+    pd.testing.assert_frame_equal(
+        df_batches.sort_values(list(df_batches.columns)).reset_index(drop=True),
+        df_all.sort_values(list(df_all.columns)).reset_index(drop=True),
+    )
+
+
+def test_multivariate_rejects_batch_size():
+    """
+    Tests that the multivariate model rejects minibatch training on creation.
+    """
+    with pytest.raises(ValueError, match="batch_size"):
+        MultivariateSklearnAPIBased(Ridge, batch_size=100)
+
+
+@pytest.mark.parametrize("model_class_type", [Ridge, LinearRegression])
+@pytest.mark.parametrize("fit_intercept", [True, False])
+def test_multi_target_fit(df_returns, model_class_type, fit_intercept):
+    """
+    Tests that the single multi-target fit gives the estimators of separate fits
+    per symbol, with and without an intercept.
+    """
+    kwargs = dict(
+        hpts={"fit_intercept": fit_intercept},
+        windows=[5, 10],
+        n_shifts=5,
+        n_steps_predict=3,
+    )
+    model = MultivariateSklearnAPIBased(model_class_type, **kwargs)
+    model.fit(df_returns.iloc[:100])
+
+    df_all_features, df_all_labels = model.preprocess(df_returns.iloc[:100])
+    X = df_all_features.drop(columns=[model.INITIAL_INDEX_COL])
+    for symbol in df_returns.columns:
+        expected = model_class_type(fit_intercept=fit_intercept).fit(
+            X, df_all_labels[symbol][model.LABEL_COL]
+        )
+        np.testing.assert_allclose(
+            model.models[symbol].coef_, expected.coef_, rtol=1e-6, atol=1e-10
+        )
+        assert model.models[symbol].intercept_ == pytest.approx(
+            expected.intercept_, abs=1e-10
+        )
+        np.testing.assert_allclose(
+            model.models[symbol].predict(X), expected.predict(X), atol=1e-10
+        )
+
+
+@pytest.mark.parametrize(
+    "model_class",
+    [UnivariateSklearnAPIBased, MultivariateSklearnAPIBased],
+)
+@pytest.mark.parametrize(
+    "n_jobs, prefer",
+    [(1, "processes"), (2, "processes"), (2, "threads")],
+)
+def test_parallel_matches_serial(df_returns, model_class, n_jobs, prefer):
+    """
+    Tests that the symbols fit and predicted by process or thread workers give the
+    models and predictions of the serial run, in the order of the symbols.
+    """
+    # Lasso is not fit for all the symbols at once, so the multivariate model
+    # fits its symbols in the workers too
+    kwargs = dict(hpts={"alpha": 1e-6}, windows=[5, 10], n_shifts=5, n_steps_predict=3)
+    serial = model_class(Lasso, **kwargs)
+    parallel = model_class(Lasso, n_jobs=n_jobs, prefer=prefer, **kwargs)
+    for model in (serial, parallel):
+        model.fit(df_returns.iloc[:100])
+
+    assert list(parallel.models) == list(serial.models) == list(df_returns.columns)
+    for symbol in df_returns.columns:
+        np.testing.assert_array_equal(
+            parallel.models[symbol].coef_, serial.models[symbol].coef_
+        )
+    assert not np.array_equal(serial.models["A"].coef_, serial.models["B"].coef_)
+    np.testing.assert_array_equal(
+        parallel.predict(df_returns, 3, 100, 117),
+        serial.predict(df_returns, 3, 100, 117),
+    )
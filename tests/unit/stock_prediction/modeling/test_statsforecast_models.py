@@ -0,0 +1,93 @@
+"""Tests for the statsforecast based models."""
+import numpy as np
+import pandas as pd
+import pytest
+from statsforecast import StatsForecast
+from statsforecast.models import Theta
+
+from stock_prediction.modeling.statsforecast_models import (
+    UnivariateThetas,
+    make_long_df,
+)
+
+
+@pytest.fixture
+def df_values():
+    """
+    Returns returns of 3 symbols, one of them starting late.
+    """
+    rng = np.random.default_rng(0)
+    values = rng.normal(0, 0.01, size=(300, 3))
+    values[:30, 1] = np.nan
+    return pd.DataFrame(values, columns=["A", "B", "C"])
+
+
+def to_predictions(df_cv, columns, index_start, n_origins, n_steps):
+    """
+    Arranges the forecasts of a statsforecast cross-validation by origin.
+    """
+    returns = np.zeros((n_origins, len(columns), n_steps))
+    returns[
+        df_cv["cutoff"] - index_start,
+        columns.get_indexer(df_cv["unique_id"]),
+        df_cv["ds"] - df_cv["cutoff"] - 1,
+    ] = df_cv["forecast"]
+    return np.cumprod(1 + returns, axis=2)
+
+
+def test_predict_matches_forecast(df_values):
+    """
+    Tests that the first origin matches a forecast from the fitted data, and the
+    other origins a cross-validation without refits.
+    """
+    df = df_values
+    index_start, index_end, n_steps = 250, 300, 4
+    model = UnivariateThetas()
+    model.fit(df.iloc[: index_start + 1])
+
+    predictions = model.predict(df, n_steps, index_start, index_end)
+
+    assert predictions.shape == (index_end - index_start, 3, n_steps)
+    df_forecast = StatsForecast(models=[Theta(alias="forecast")], freq=1).forecast(
+        df=make_long_df(df.iloc[: index_start + 1]), h=n_steps
+    )
+    expected = df_forecast.pivot(index="ds", columns="unique_id", values="forecast")
+    np.testing.assert_allclose(
+        predictions[0], np.cumprod(1 + expected[df.columns].to_numpy().T, axis=1)
+    )
+
+    df_cv = StatsForecast(models=[Theta(alias="forecast")], freq=1).cross_validation(
+        df=make_long_df(df, n_rows_padding=n_steps),
+        h=n_steps,
+        step_size=1,
+        n_windows=index_end - index_start,
+        refit=False,
+    )
+    np.testing.assert_allclose(
+        predictions,
+        to_predictions(
+            df_cv, df.columns, index_start, index_end - index_start, n_steps
+        ),
+    )
+
+
+def test_predict_uses_fitted_models(df_values):
+    """
+    Tests that the predictions use the models fitted by fit, which must be called
+    first.
+    """
+    df = df_values
+    model = UnivariateThetas()
+    with pytest.raises(RuntimeError):
+        model.predict(df, 4, 250, 260)
+
+    model.fit(df.iloc[:100])
+    predictions = model.predict(df, 4, 250, 260)
+
+    models = model.get_fitted_models()
+    assert sorted(models) == ["A", "B", "C"]
+    y = df["A"].to_numpy()
+    np.testing.assert_allclose(
+        predictions[3, 0],
+        np.cumprod(1 + models["A"].forward(y=y[:254], h=4)["mean"]),
+    )
@@ -0,0 +1,117 @@
+"""Tests for the compiled tree ensemble evaluator."""
+import lightgbm as lgb
+import numpy as np
+import pandas as pd
+import pytest
+
+from stock_prediction.modeling.tree_ensemble import (
+    CompiledTreeEnsemble,
+    UncompilableBoosterError,
+)
+
+
+@pytest.fixture
+def df_features():
+    """
+    Returns features with missing values and exact zeros.
+    """
+    rng = np.random.default_rng(0)
+    X = rng.normal(size=(1000, 6))
+    X[rng.random(X.shape) < 0.05] = np.nan
+    X[rng.random(X.shape) < 0.05] = 0.0
+    return pd.DataFrame(X, columns=[f"feature_{i}" for i in range(X.shape[1])])
+
+
+def train_boosters(df_features, params, n_boosters=5, num_boost_round=30):
+    """
+    Trains boosters on the same features with different labels.
+    """
+    rng = np.random.default_rng(1)
+    boosters = []
+    for _ in range(n_boosters):
+        label = np.nan_to_num(df_features.to_numpy()) @ rng.normal(size=6)
+        boosters.append(
+            lgb.train(
+                dict(params, verbosity=-1),
+                lgb.Dataset(df_features, label=label + rng.normal(size=len(label))),
+                num_boost_round=num_boost_round,
+            )
+        )
+    return boosters
+
+
+@pytest.mark.parametrize(
+    "params",
+    [
+        {"max_depth": 3, "learning_rate": 0.01},
+        {"num_leaves": 31, "min_data_in_leaf": 5},
+        {"max_depth": 3, "zero_as_missing": True},
+        {"max_depth": 2, "use_missing": False},
+        {"objective": "huber", "max_depth": 4},
+    ],
+)
+def test_parity_with_booster_predict(df_features, params):
+    """
+    Tests that the compiled ensemble reproduces booster.predict for every booster.
+    """
+    boosters = train_boosters(df_features, params)
+    ensemble = CompiledTreeEnsemble.from_boosters(boosters)
+
+    predictions = ensemble.predict(df_features, max_block_size=1000)
+
+    assert predictions.shape == (len(df_features), len(boosters))
+    for i, booster in enumerate(boosters):
+        np.testing.assert_allclose(
+            predictions[:, i], booster.predict(df_features), rtol=1e-12, atol=1e-12
+        )
+
+
+@pytest.mark.parametrize(
+    "params",
+    [
+        {"reg_sqrt": True, "max_depth": 3},
+        {"boosting": "rf", "bagging_fraction": 0.5, "bagging_freq": 1},
+        {"linear_tree": True, "max_depth": 2},
+    ],
+)
+def test_uncompilable_boosters(df_features, params):
+    """
+    Tests that the boosters whose predictions are not the sums of their trees are
+    rejected, instead of being predicted wrongly.
+    """
+    boosters = train_boosters(df_features, params, n_boosters=2, num_boost_round=20)
+
+    with pytest.raises(UncompilableBoosterError):
+        CompiledTreeEnsemble.from_boosters(boosters)
+
+
+def test_single_leaf_trees(df_features):
+    """
+    Tests boosters whose trees have a single leaf.
+    """
+    boosters = train_boosters(
+        df_features, {"min_data_in_leaf": 10000}, n_boosters=2, num_boost_round=3
+    )
+    ensemble = CompiledTreeEnsemble.from_boosters(boosters)
+
+    for i, booster in enumerate(boosters):
+        np.testing.assert_allclose(
+            ensemble.predict(df_features)[:, i], booster.predict(df_features)
+        )
+
+
+def test_save_and_load(df_features, tmp_path):
+    """
+    Tests that a saved ensemble predicts the same after loading.
+    """
+    ensemble = CompiledTreeEnsemble.from_boosters(
+        train_boosters(df_features, {"max_depth": 3}, n_boosters=3)
+    )
+    ensemble.save(tmp_path / "ensemble.npz")
+    ensemble_loaded = CompiledTreeEnsemble.load(tmp_path / "ensemble.npz")
+
+    assert ensemble_loaded.feature_names == ensemble.feature_names
+    np.testing.assert_array_equal(
+        ensemble_loaded.predict(df_features.iloc[:, ::-1]),
+        ensemble.predict(df_features),
+    )
@@ -0,0 +1,102 @@
+"""Tests for the hyperparameter search of UnivariateLightGBMs."""
+import itertools
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from stock_prediction.modeling.lightgbm_model import UnivariateLightGBMs
+from stock_prediction.modeling.tuning import (
+    HyperparameterSearch,
+    get_model_kwargs,
+    sample_trials,
+    walk_forward_splits,
+)
+
+
+def test_walk_forward_splits():
+    """
+    Tests that the folds are consecutive and end at the last labelled row.
+    """
+    splits = walk_forward_splits(1000, 3, 100, 20)
+
+    assert splits == [(680, 780), (780, 880), (880, 980)]
+    with pytest.raises(ValueError):
+        walk_forward_splits(320, 3, 100, 20)
+
+
+def test_split_masks_gap():
+    """
+    Tests that the training rows stop n_steps_predict rows before the validation
+    range, so that their labels do not overlap it.
+    """
+    model = UnivariateLightGBMs(n_steps_predict=5)
+
+    masks = model.get_split_masks(np.arange(100), (50, 60))
+
+    np.testing.assert_array_equal(np.flatnonzero(masks["train"]), np.arange(45))
+    np.testing.assert_array_equal(np.flatnonzero(masks["valid"]), np.arange(50, 60))
+
+
+def test_sample_trials():
+    """
+    Tests that the trials are distinct grid points, reproducible with the seed,
+    and the whole grid if there are fewer points than trials.
+    """
+    search_space = {"a": [1, 2, 3], "b": ["x", "y"], "c": [[5], [5, 20]]}
+    grid = [
+        dict(zip(search_space.keys(), values))
+        for values in itertools.product(*search_space.values())
+    ]
+
+    trials = sample_trials(search_space, 5, seed=1)
+
+    assert len(trials) == 5
+    assert all(trial in grid for trial in trials)
+    assert len({str(trial) for trial in trials}) == 5
+    assert trials == sample_trials(search_space, 5, seed=1)
+    assert sample_trials(search_space, 20) == grid
+
+    assert get_model_kwargs({"c": [5], "n_shifts": 3, "max_depth": 2}) == {
+        "n_shifts": 3,
+        "lgbm_hpts": {"c": [5], "max_depth": 2},
+    }
+
+
+def test_successive_halving():
+    """
+    Tests that the pruned trials are not evaluated on the next folds, and that the
+    best trials of each fold are kept.
+    """
+    rng = np.random.default_rng(0)
+    df = pd.DataFrame(
+        rng.normal(0.0005, 0.01, size=(300, 2)),
+        index=pd.bdate_range("2020-01-01", periods=300, name="Date"),
+        columns=["A", "B"],
+    )
+    search = HyperparameterSearch(
+        search_space={
+            "windows": [[5]],
+            "stats": [["mean"]],
+            "n_shifts": [3],
+            "num_leaves": [3, 7],
+            "learning_rate": [0.01, 0.3],
+            "n_estimators": [5],
+        },
+        n_trials=4,
+        n_folds=3,
+        valid_size=30,
+        n_steps_predict=3,
+        reduction_factor=2,
+    )
+
+    df_results = search.run(df)
+
+    assert sorted(df_results[search.N_FOLDS_COL]) == [1, 1, 2, 3]
+    df_evaluated = df_results[df_results[search.N_FOLDS_COL] > 1]
+    df_pruned = df_results[df_results[search.N_FOLDS_COL] == 1]
+    assert df_results["fold_1"].notna().sum() == 2
+    assert df_results["fold_2"].notna().sum() == 1
+    assert df_pruned["fold_0"].min() >= df_evaluated["fold_0"].max()
+    assert not df_results.iloc[0][search.PRUNED_COL]
+    assert search.best_model_kwargs["n_shifts"] == 3
@@ -0,0 +1,84 @@
+"""Tests for the series utilities."""
+import numpy as np
+import pandas as pd
+import pytest
+
+from stock_prediction.utils.series import (
+    assemble_cumulative_predictions,
+    get_normalized_nsteps_ahead_predictions_array,
+    n_steps_ahead_normalized_slice_df,
+)
+
+
+def test_assemble_cumulative_predictions():
+    """
+    Tests that flat horizon expanded predictions are compounded per origin.
+    """
+    index_start, n_origins, n_horizons, n_steps = 10, 6, 5, 3
+    rng = np.random.default_rng(0)
+    # Same row layout as the preprocessed datasets: blocks of origins per horizon
+    n_forecast = np.repeat(np.arange(n_horizons, 0, -1), n_origins)
+    initial_index = np.tile(np.arange(index_start, index_start + n_origins), n_horizons)
+    flat_predictions = rng.normal(0, 0.01, size=n_forecast.shape)
+
+    out = np.zeros((n_origins, 2, n_steps))
+    assemble_cumulative_predictions(
+        initial_index, n_forecast, flat_predictions, index_start, out=out[:, 1, :]
+    )
+
+    df_preds = pd.DataFrame(
+        {"origin": initial_index, "n": n_forecast, "pred": flat_predictions}
+    )
+    for origin, df_origin in df_preds.groupby("origin"):
+        expected = (1 + df_origin.sort_values("n")["pred"].to_numpy()).cumprod()
+        np.testing.assert_allclose(out[origin - index_start, 1], expected[:n_steps])
+    np.testing.assert_array_equal(out[:, 0, :], 0)
+
+
+def test_assemble_cumulative_predictions_missing_origin():
+    """
+    Tests that an origin without rows raises instead of forecasting 0% returns.
+    """
+    index_start, n_origins, n_steps = 10, 4, 3
+    n_forecast = np.repeat(np.arange(1, n_steps + 1), n_origins)
+    initial_index = np.tile(np.arange(index_start, index_start + n_origins), n_steps)
+    # The origin 12 has no features, so no rows
+    is_kept = initial_index != 12
+
+    with pytest.raises(ValueError, match="origin 12"):
+        assemble_cumulative_predictions(
+            initial_index[is_kept],
+            n_forecast[is_kept],
+            np.zeros(is_kept.sum()),
+            index_start,
+            out=np.zeros((n_origins, n_steps)),
+        )
+
+
+def test_get_normalized_nsteps_ahead_predictions_array():
+    """
+    Tests the sliding windows against the normalized slices of every origin.
+    """
+    rng = np.random.default_rng(0)
+    df = pd.DataFrame(
+        np.exp(rng.normal(0, 0.01, size=(100, 3)).cumsum(axis=0)),
+        columns=["A", "B", "C"],
+    )
+    df.iloc[40, 1] = np.nan
+    index_start, index_end, n_steps = 20, 90, 10
+
+    predictions = get_normalized_nsteps_ahead_predictions_array(
+        df, n_steps, index_start, index_end
+    )
+
+    for origin in range(index_start, index_end):
+        np.testing.assert_array_equal(
+            predictions[origin - index_start],
+            n_steps_ahead_normalized_slice_df(df, n_steps, origin).T.to_numpy(),
+        )
+
+    out = np.zeros((index_end - index_start, 3, n_steps), dtype=np.float32)
+    get_normalized_nsteps_ahead_predictions_array(
+        df, n_steps, index_start, index_end, out=out
+    )
+    np.testing.assert_allclose(out, predictions, rtol=1e-6)